@@ -0,0 +1,132 @@
+from argparse import ArgumentParser
+from os import path
+import os
+import sys
+import time
+
+# Nothing is drawn, so never open a window or an audio device
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from pixilib.Batch import (
+    BatchOptions,
+    BatchResult,
+    batch_summary,
+    find_images,
+    output_path,
+    run_batch,
+)
+from pixilib.PixiFile import COMPRESSION_METHODS
+
+
+def parse_args(args: list[str]):
+    parser = ArgumentParser(
+        description="Convert, resize, palette remap and validate images without a display"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="convert images to .pixi or PNG")
+    validate = commands.add_parser("validate", help="check images read correctly")
+    for command in (convert, validate):
+        command.add_argument("paths", nargs="+", help="files and directories")
+        command.add_argument(
+            "-j", "--jobs", type=int, default=None, help="worker processes"
+        )
+        command.add_argument(
+            "--no-recursive",
+            action="store_true",
+            help="do not search subdirectories",
+        )
+        command.add_argument(
+            "-q", "--quiet", action="store_true", help="only print failures"
+        )
+
+    convert.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="output directory, the layout of the inputs is kept. Defaults to next to each input",
+    )
+    convert.add_argument(
+        "-f", "--format", choices=["pixi", "png"], default="pixi", help="output format"
+    )
+    convert.add_argument(
+        "-s", "--scale", type=float, default=1.0, help="nearest neighbour scale"
+    )
+    convert.add_argument("-p", "--palette", help=".gpl, .hex or .pal to snap to")
+    convert.add_argument(
+        "-c",
+        "--colors",
+        type=int,
+        default=0,
+        help="snap each image to this many colors extracted from it",
+    )
+    convert.add_argument(
+        "-i", "--indexed", action="store_true", help="write indexed .pixi files"
+    )
+    convert.add_argument(
+        "--compression",
+        choices=list(COMPRESSION_METHODS),
+        default=None,
+        help="compress .pixi tiles",
+    )
+    convert.add_argument(
+        "--level", type=int, default=6, help="compression level from 0 to 9"
+    )
+    return parser.parse_args(args)
+
+
+def main(args: list[str]) -> int:
+    args = parse_args(args)
+    try:
+        if args.command == "validate":
+            options = BatchOptions(validate=True)
+        else:
+            options = BatchOptions(
+                args.format,
+                args.scale,
+                args.palette,
+                args.colors,
+                args.indexed,
+                args.compression,
+                args.level,
+            )
+    except ValueError as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 2
+
+    jobs = []
+    for source, relative in find_images(args.paths, not args.no_recursive):
+        destination = None
+        if not options.validate:
+            if args.output is None:
+                relative, output = path.basename(source), path.dirname(source)
+            else:
+                output = args.output
+            destination = output_path(relative, output, options.format)
+            if path.abspath(destination) == path.abspath(source):
+                print(f"skipped {source}: would overwrite itself", file=sys.stderr)
+                continue
+        jobs.append((source, destination, options))
+    if not jobs:
+        print("error: no images found", file=sys.stderr)
+        return 2
+
+    def report(result: BatchResult):
+        if not result.ok:
+            print(f"FAILED {result.source}: {result.error}", file=sys.stderr)
+        elif not args.quiet:
+            print(f"ok     {result.destination or result.source}")
+
+    start = time.perf_counter()
+    results = run_batch(jobs, args.jobs, report)
+    print(batch_summary(results, time.perf_counter() - start))
+    return 1 if any(not result.ok for result in results) else 0
+
+
+# e.g. python convert.py convert sprites -o out -f png -s 4
+#      python convert.py convert sprites -o out --indexed --palette db32.gpl -j 8
+#      python convert.py validate out
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -7,6 +7,8 @@ from pygame.font import Font
 
 from pixilib.Camera import GridCamera
 from pixilib.Grid import ComputedLayeredGrid, Grid
+from pixilib.History import History
+from pixilib.Autosave import Autosave, recover_autosave
 from pixilib.DebugView import draw_debug_view
 from pixilib.Tools import *
 from pixilib.Helpers import (
@@ -54,6 +56,12 @@ def main(debug=False):
 
     canvas_size = (64, 64)
 
+    # Pick up the last session's autosave, if any, before sizing the camera
+    autosave_path = path.join(project_root, "autosave.pixp")
+    grid = recover_autosave(autosave_path)
+    if grid is not None:
+        canvas_size = (grid.width, grid.height)
+
     # calc cam proportion, then cam scale according to prop x and prop y
     cam_prop_x = canvas_size[0] / (canvas_size[0] + canvas_size[1])
     cam_prop_y = 1 - cam_prop_x
@@ -64,9 +72,13 @@ def main(debug=False):
     camera_size = (canvas_size[0] * cam_size_scale, canvas_size[1] * cam_size_scale)
 
     # Create a grid and camera
-    layer1 = Grid(canvas_size[0], canvas_size[1])
-    grid = ComputedLayeredGrid(canvas_size[0], canvas_size[1])
-    grid.add_layer(layer1)
+    if grid is None:
+        layer1 = Grid(canvas_size[0], canvas_size[1])
+        grid = ComputedLayeredGrid(canvas_size[0], canvas_size[1])
+        grid.add_layer(layer1)
+    history = History(grid)
+    autosave = Autosave(grid, autosave_path)
+    autosave.start()
 
     overlay_grid = Grid(canvas_size[0], canvas_size[1])
     overlay_transparency = 255
@@ -304,6 +316,14 @@ def main(debug=False):
                     draw_grid_overlay = not draw_grid_overlay
                     debug_text["Draw Grid Overlay"] = draw_grid_overlay
 
+                if event.mod & KMOD_CTRL:
+                    if event.key == K_y or (
+                        event.key == K_z and event.mod & KMOD_SHIFT
+                    ):
+                        debug_text["History"] = history.redo()
+                    elif event.key == K_z:
+                        debug_text["History"] = history.undo()
+
             if event.type == MOUSEBUTTONDOWN:
                 pan_origin = mouse_pos
                 debug_text["Pan Origin"] = pan_origin
@@ -319,6 +339,9 @@ def main(debug=False):
                     click_origin = (grid_x, grid_y)
                     debug_text["Click Origin"] = click_origin
 
+                    # Everything the tool does until the button is released is one undo step
+                    history.begin(toolset[selected_tool].__str__())
+
                     for x, y, widget, h, _, _ in ui_locations:
                         if coords_in(mouse_pos, (x, y, widget, h)):
                             ui_clicked = True
@@ -368,6 +391,7 @@ def main(debug=False):
                                     data=data,
                                     mouse_held=mouse_held[0],
                                 )
+                    history.end()
 
             # Scale camera with mouse wheel
             if event.type == MOUSEWHEEL:
@@ -476,7 +500,21 @@ def main(debug=False):
                 mouse_held=mouse_held[0],
                 grid_type="Grid",
             )
-        if toolset[selected_tool] in mouse_preview_tools:
+        if toolset[selected_tool] == FillTool:
+            if in_grid(grid_x, grid_y, grid.width, grid.height):
+                FillTool.preview(
+                    grid=grid,
+                    overlay=overlay_grid,
+                    x=grid_x,
+                    y=grid_y,
+                    color=(
+                        tool_color[0],
+                        tool_color[1],
+                        tool_color[2],
+                        overlay_transparency,
+                    ),
+                )
+        elif toolset[selected_tool] in mouse_preview_tools:
             if in_grid(grid_x, grid_y, grid.width, grid.height):
                 # overlay_grid[grid_x, grid_y] = (
                 #     tool_color[selected_color][0],
@@ -504,7 +542,6 @@ def main(debug=False):
                     data=data,
                     mouse_held=mouse_held[0],
                     grid_type="Grid",
-                    use_executor=False,
                 )
 
         # Clear the screen
@@ -711,6 +748,7 @@ def main(debug=False):
         # Clear overlay grid
         overlay_grid.clear((0, 0, 0, 0))
 
+    autosave.stop()
     quit()
 
 
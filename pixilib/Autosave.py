@@ -0,0 +1,267 @@
+from os import path
+import os
+import struct
+import threading
+import zlib
+import numpy as np
+from .Grid import ComputedLayeredGrid
+from .PixiFile import _read_exact
+from .PixiProject import open_project, save_project
+
+# Autosaves are a `.pixp` snapshot of the whole document plus a journal next to it,
+# `<snapshot>.journal`, of the tiles written since the snapshot was taken:
+# - Header: magic `pixj`, major and minor version, and the size and modification
+#   time of the snapshot the journal applies to
+# - Records, oldest first: layer, rectangle, size and CRC32 of the zlib compressed
+#   RGBA pixels of one tile, followed by them
+JOURNAL_MAGIC = b"pixj"
+JOURNAL_VERSION = (0, 1)
+
+_JOURNAL_HEADER = struct.Struct(">4sHHQQ")
+_JOURNAL_RECORD = struct.Struct(">HIIIIII")
+
+
+def journal_path(file_path: str) -> str:
+    """Path of the journal of the autosave snapshot at `file_path`"""
+    return f"{file_path}.journal"
+
+
+def _snapshot_token(file_path: str) -> tuple[int, int]:
+    """Internal Method, Size and modification time identifying a snapshot file"""
+    stat = os.stat(file_path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class Autosave:
+    """Background autosave of a grid, journaling only the tiles written since the last flush
+
+    The grid tells the autosave about every write once it lands, which only adds the
+    tile to a set. A daemon thread wakes up every `interval` seconds, appends the
+    dirty tiles to the journal, and compacts the journal into a new snapshot once it
+    grows past `compact_bytes` or the layers are added, removed, shown or hidden.
+    Compression and file writes run on the thread, so the main loop never waits on
+    them. A tile written while it is being read is dirty again and flushed next time.
+    """
+
+    def __init__(
+        self,
+        grid: ComputedLayeredGrid,
+        file_path: str,
+        interval: float = 5.0,
+        tile_size: int = 64,
+        compact_bytes: int = 16 * 1024 * 1024,
+        level: int = 1,
+    ):
+        """Create an Autosave and attach it to `grid`, call `start` to run it
+
+        Args:
+            grid (ComputedLayeredGrid): Grid to autosave
+            file_path (str): Path of the `.pixp` snapshot, the journal is written next to it
+            interval (float, optional): Seconds between flushes. Defaults to 5.0.
+            tile_size (int, optional): Width and height of journaled tiles. Defaults to 64.
+            compact_bytes (int, optional): Journal size past which it is compacted into a snapshot. Defaults to 16 MiB.
+            level (int, optional): zlib level of the snapshot and the journal, 1 is fastest. Defaults to 1.
+        """
+        self.grid: ComputedLayeredGrid = grid
+        self.file_path: str = file_path
+        self.interval: float = interval
+        self.tile_size: int = tile_size
+        self.compact_bytes: int = compact_bytes
+        self.level: int = level
+
+        # Tiles written since the last flush, (layer, tile x, tile y)
+        self._dirty: set[tuple[int, int, int]] = set()
+        # Set when the layers changed, the next flush takes a snapshot instead
+        self._layers_changed: bool = True
+        self._lock = threading.Lock()
+
+        # Serializes flushes of the thread and of `flush`/`stop` callers
+        self._flush_lock = threading.Lock()
+        self._journal_size: int = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        grid.journal = self
+
+    # region Recording
+    def touch(self, layer: int, x: int, y: int):
+        """Mark the tile containing `(x,y)` on `layer` as written
+
+        Args:
+            layer (int): Layer index written
+            x (int): X coordinate written
+            y (int): Y coordinate written
+        """
+        key = (layer, x // self.tile_size, y // self.tile_size)
+        with self._lock:
+            self._dirty.add(key)
+
+    def touch_rect(self, layer: int, x: int, y: int, width: int, height: int):
+        """Mark every tile overlapping a rectangle on `layer` as written
+
+        Args:
+            layer (int): Layer index written
+            x (int): X coordinate of the top left corner
+            y (int): Y coordinate of the top left corner
+            width (int): Width of the rectangle
+            height (int): Height of the rectangle
+        """
+        size = self.tile_size
+        with self._lock:
+            for ty in range(y // size, (y + height - 1) // size + 1):
+                for tx in range(x // size, (x + width - 1) // size + 1):
+                    self._dirty.add((layer, tx, ty))
+
+    def record_layers_changed(self):
+        """Take a snapshot at the next flush, journaled layer indices no longer apply"""
+        with self._lock:
+            self._layers_changed = True
+
+    # endregion
+
+    # region Thread
+    def start(self):
+        """Start flushing in the background, the first flush takes a snapshot"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and flush what it had not flushed yet"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        """Internal Method, Flush every `interval` seconds until stopped"""
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    # endregion
+
+    def flush(self):
+        """Append the dirty tiles to the journal, or take a snapshot if it is due"""
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                layers_changed, self._layers_changed = self._layers_changed, False
+
+            if (
+                layers_changed
+                or self._journal_size > self.compact_bytes
+                or not path.exists(self.file_path)
+            ):
+                self._checkpoint()
+            elif dirty:
+                self._append(dirty)
+
+    def checkpoint(self):
+        """Compact everything written so far into a new snapshot and an empty journal"""
+        with self._flush_lock:
+            with self._lock:
+                self._dirty = set()
+                self._layers_changed = False
+            self._checkpoint()
+
+    def _checkpoint(self):
+        """Internal Method, Save a snapshot, then start a journal applying to it
+
+        A crash in between leaves the old journal, which no longer matches the new
+        snapshot and is ignored by `recover_autosave`.
+        """
+        save_project(self.grid, self.file_path, level=self.level)
+        header = _JOURNAL_HEADER.pack(
+            JOURNAL_MAGIC, *JOURNAL_VERSION, *_snapshot_token(self.file_path)
+        )
+        with open(journal_path(self.file_path), "wb") as file:
+            file.write(header)
+            file.flush()
+            os.fsync(file.fileno())
+        self._journal_size = len(header)
+
+    def _append(self, dirty: set[tuple[int, int, int]]):
+        """Internal Method, Append the current pixels of dirty tiles to the journal"""
+        records = []
+        layers = self.grid.layers
+        for layer, tx, ty in sorted(dirty):
+            if layer >= len(layers):
+                continue
+            x, y = tx * self.tile_size, ty * self.tile_size
+            width = min(self.tile_size, self.grid.width - x)
+            height = min(self.tile_size, self.grid.height - y)
+            if width <= 0 or height <= 0:
+                continue
+            data = zlib.compress(
+                layers[layer].read_rect(x, y, width, height).tobytes(), self.level
+            )
+            records.append(
+                _JOURNAL_RECORD.pack(
+                    layer, x, y, width, height, len(data), zlib.crc32(data)
+                )
+            )
+            records.append(data)
+
+        data = b"".join(records)
+        with open(journal_path(self.file_path), "ab") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        self._journal_size += len(data)
+
+
+def recover_autosave(file_path: str) -> ComputedLayeredGrid | None:
+    """Open an autosave snapshot and replay its journal onto it
+
+    Replay stops at the first incomplete or corrupt record, which a crash while
+    appending leaves at the end of the journal. A journal left from an older snapshot
+    is ignored.
+
+    Args:
+        file_path (str): Path of the `.pixp` snapshot
+
+    Returns:
+        ComputedLayeredGrid | None: The recovered grid, None if there is no snapshot
+    """
+    if not path.exists(file_path):
+        return None
+    grid = open_project(file_path)
+
+    journal = journal_path(file_path)
+    if not path.exists(journal):
+        return grid
+    with open(journal, "rb") as file:
+        header = file.read(_JOURNAL_HEADER.size)
+        if len(header) < _JOURNAL_HEADER.size:
+            return grid
+        magic, major, _, size, mtime = _JOURNAL_HEADER.unpack(header)
+        if (
+            magic != JOURNAL_MAGIC
+            or major != JOURNAL_VERSION[0]
+            or (size, mtime) != _snapshot_token(file_path)
+        ):
+            return grid
+
+        while True:
+            try:
+                layer, x, y, width, height, length, crc = _JOURNAL_RECORD.unpack(
+                    _read_exact(file, _JOURNAL_RECORD.size)
+                )
+                data = _read_exact(file, length)
+            except ValueError:
+                break
+            if (
+                zlib.crc32(data) != crc
+                or layer >= len(grid.layers)
+                or x + width > grid.width
+                or y + height > grid.height
+            ):
+                break
+            pixels = np.frombuffer(zlib.decompress(data), dtype=np.uint8)
+            grid.layers[layer].write_rect(x, y, pixels.reshape(height, width, 4).copy())
+
+    grid.invalidate(0, 0, grid.width, grid.height)
+    return grid
@@ -0,0 +1,399 @@
+from functools import lru_cache
+from multiprocessing import get_context
+from os import path
+from typing import Callable, Iterable, Iterator
+import os
+import time
+import numpy as np
+from .ColorArrays import color_diff_sq_array, pack_rgba, unpack_rgba
+from .Grid import Grid, ComputedLayeredGrid
+from .ImageIO import load_png, write_png
+from .IndexedGrid import IndexedGrid
+from .PaletteIO import read_palette
+from .PixiFile import (
+    PixiColorMode,
+    PixiHeader,
+    PixiWriter,
+    CompressedPixiWriter,
+    load_pixi,
+    _band_rows,
+)
+from .PixiProject import PixiProject, open_project
+from .Quantize import extract_palette
+from .Remap import PaletteRemapper
+
+# Headless conversion of image files, one file per job, spread over worker
+# processes. Sources are memory mapped where possible and outputs are written a
+# band of rows at a time, so a worker never holds more than one copy of an image.
+
+# Extensions picked up when a directory is searched, pygame reads all but the first two
+IMAGE_EXTENSIONS = (".pixi", ".pixp", ".png", ".bmp", ".gif", ".jpg", ".jpeg", ".tga")
+OUTPUT_FORMATS = ("pixi", "png")
+
+
+class BatchOptions:
+    """What every job of a batch does to its file"""
+
+    def __init__(
+        self,
+        format: str = "pixi",
+        scale: float = 1.0,
+        palette: str = None,
+        colors: int = 0,
+        indexed: bool = False,
+        compression: str = None,
+        level: int = 6,
+        validate: bool = False,
+    ):
+        """Create BatchOptions
+
+        Args:
+            format (str, optional): Output format, "pixi" or "png". Defaults to "pixi".
+            scale (float, optional): Nearest neighbour scale of the output. Defaults to 1.0.
+            palette (str, optional): Palette file to snap every image to. Defaults to None.
+            colors (int, optional): Snap each image to a palette of this many colors extracted from it, if no `palette`. Defaults to 0.
+            indexed (bool, optional): Write indexed `.pixi` files, to the image's own palette if it has one and no other is given. Defaults to False.
+            compression (str, optional): "zlib" or "lzma" to write compressed `.pixi` files. Defaults to None.
+            level (int, optional): Compression level from 0 to 9. Defaults to 6.
+            validate (bool, optional): Only read every file through, writing nothing. Defaults to False.
+        """
+        if format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format '{format}'")
+        if scale <= 0:
+            raise ValueError("Scale must be positive")
+        if indexed and format != "pixi":
+            raise ValueError("Only .pixi files can be written indexed")
+        if colors and not 0 < colors <= 255:
+            raise ValueError("Colors must be between 1 and 255")
+
+        self.format: str = format
+        self.scale: float = scale
+        self.palette: str | None = palette
+        self.colors: int = colors
+        self.indexed: bool = indexed
+        self.compression: str | None = compression
+        self.level: int = level
+        self.validate: bool = validate
+
+
+class BatchResult:
+    """Outcome of one job, sent back from the worker that ran it"""
+
+    def __init__(self, source: str, destination: str | None = None):
+        self.source: str = source
+        self.destination: str | None = destination
+        self.error: str | None = None
+        # Pixels of the source image, and bytes read and written
+        self.pixels: int = 0
+        self.bytes_read: int = 0
+        self.bytes_written: int = 0
+        self.seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def find_images(
+    paths: Iterable[str], recursive: bool = True
+) -> Iterator[tuple[str, str]]:
+    """Find the image files among files and directories
+
+    Args:
+        paths (Iterable[str]): Files, used whatever their extension, and directories to search
+        recursive (bool, optional): Search subdirectories too. Defaults to True.
+
+    Yields:
+        tuple[str, str]: Path of every image and its path relative to the directory it was found in
+    """
+    for root in paths:
+        if not path.isdir(root):
+            yield root, path.basename(root)
+            continue
+        for directory, subdirectories, files in os.walk(root):
+            subdirectories.sort()
+            if not recursive:
+                subdirectories.clear()
+            for name in sorted(files):
+                if path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    file_path = path.join(directory, name)
+                    yield file_path, path.relpath(file_path, root)
+
+
+def output_path(relative: str, output: str, format: str) -> str:
+    """Path a source file found at `relative` is written to, with the extension of `format`
+
+    Args:
+        relative (str): Path of the source relative to the directory it was found in
+        output (str): Output directory
+        format (str): Output format, "pixi" or "png"
+
+    Returns:
+        str: Path of the output file
+    """
+    return path.join(output, f"{path.splitext(relative)[0]}.{format}")
+
+
+def load_image(file_path: str) -> Grid | ComputedLayeredGrid:
+    """Open any supported image, memory mapping uncompressed `.pixi` data
+
+    Args:
+        file_path (str): Path of a `.pixi`, `.pixp` or pygame readable image
+
+    Returns:
+        Grid | ComputedLayeredGrid: A layer, or the grid of a project
+    """
+    extension = path.splitext(file_path)[1].lower()
+    if extension == ".pixi":
+        return load_pixi(file_path, mapped=True)
+    if extension == ".pixp":
+        return open_project(file_path, mapped=True)
+    return load_png(file_path)
+
+
+@lru_cache(maxsize=8)
+def _palette_colors(file_path: str) -> tuple[np.ndarray, PaletteRemapper]:
+    """Internal Method, Colors of a palette file and their remapper, built once per process"""
+    _, colors = read_palette(file_path)
+    if len(colors) > 255:
+        raise ValueError("Palettes support at most 255 colors")
+    remapper = PaletteRemapper(colors, bits=5)
+    return remapper.colors, remapper
+
+
+def _nearest(
+    pixels: np.ndarray, colors: np.ndarray, remapper: PaletteRemapper = None
+) -> np.ndarray:
+    """Internal Method, Index of the palette color nearest every pixel by RGB distance
+
+    Without a remapper, only the distinct values of `pixels` are matched, which is
+    cheaper than building a lookup table for a palette used by one image.
+    """
+    if remapper is not None:
+        return remapper.nearest(pixels)
+    keys = pack_rgba(pixels)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    distance = color_diff_sq_array(
+        unpack_rgba(unique)[:, None, :3], colors[None, :, :3]
+    )
+    return distance.argmin(axis=1)[inverse].reshape(keys.shape)
+
+
+def _image_palette(
+    source: Grid | np.ndarray, options: BatchOptions
+) -> tuple[np.ndarray | None, PaletteRemapper | None]:
+    """Internal Method, Palette the image is snapped to, and its remapper if shared"""
+    if options.palette:
+        return _palette_colors(options.palette)
+    if isinstance(source, IndexedGrid):
+        if options.indexed and not options.colors:
+            colors = [color[:4] for color in source.palette.colors]
+            return np.array(colors, np.uint8).reshape(-1, 4), None
+        # Quantizing reads RGBA arrays, not the indexed view
+        source = source.to_array()
+    if options.colors or options.indexed:
+        colors = extract_palette(source, options.colors or 255)
+        return np.array(colors, np.uint8).reshape(-1, 4), None
+    return None, None
+
+
+def _resized_bands(
+    source: Grid, width: int, height: int, rows: int
+) -> Iterator[np.ndarray]:
+    """Internal Method, Read the source as RGBA bands of a nearest neighbour resize"""
+    xs = np.arange(width) * source.width // width
+    for y in range(0, height, rows):
+        count = min(rows, height - y)
+        ys = np.arange(y, y + count) * source.height // height
+        band = source.read_rect(0, int(ys[0]), source.width, int(ys[-1] - ys[0]) + 1)
+        if width != source.width or height != source.height:
+            band = band[ys - ys[0]][:, xs]
+        yield band
+
+
+def convert_image(source_path: str, destination: str, options: BatchOptions) -> int:
+    """Convert one image, writing it a band of rows at a time
+
+    Args:
+        source_path (str): Path of the image to convert
+        destination (str): Path of the file to write, replaced only once complete
+        options (BatchOptions): What to do to the image
+
+    Returns:
+        int: Pixels in the source image
+    """
+    source = load_image(source_path)
+    if isinstance(source, ComputedLayeredGrid):
+        source = source.get_computed_grid()
+    width = max(1, round(source.width * options.scale))
+    height = max(1, round(source.height * options.scale))
+    colors, remapper = _image_palette(source, options)
+    if colors is not None and not len(colors):
+        raise ValueError("Cannot snap to an empty palette")
+    rows = _band_rows(width * 4)
+
+    def bands() -> Iterator[np.ndarray]:
+        for band in _resized_bands(source, width, height, rows):
+            if colors is None:
+                yield band
+                continue
+            nearest = _nearest(band, colors, remapper)
+            if options.indexed:
+                # Index 0 is transparent, `i + 1` is palette color `i`
+                indices = nearest.astype(np.uint8) + 1
+                indices[band[..., 3] == 0] = 0
+                yield indices
+                continue
+            snapped = colors[nearest]
+            snapped[..., 3] = band[..., 3]
+            np.copyto(snapped, band, where=band[..., 3:] == 0)
+            yield snapped
+
+    directory = path.dirname(destination)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{destination}.tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            if options.format == "png":
+                write_png(file, width, height, bands(), options.level)
+            else:
+                mode, palette = PixiColorMode.RGBA, None
+                if options.indexed:
+                    mode = PixiColorMode.INDEXED
+                    palette = np.concatenate([np.zeros((1, 4), np.uint8), colors])
+                header = PixiHeader(width, height, mode, palette=palette)
+                if options.compression:
+                    writer = CompressedPixiWriter(
+                        file, header, options.compression, options.level
+                    )
+                else:
+                    writer = PixiWriter(file, header)
+                for band in bands():
+                    writer.write_rows(band)
+                writer.close()
+        os.replace(temp_path, destination)
+    finally:
+        if path.exists(temp_path):
+            os.remove(temp_path)
+    return source.width * source.height
+
+
+def validate_image(source_path: str) -> int:
+    """Read an image through, raising ValueError if it is malformed
+
+    `.pixi` data is decoded in full and checked against its checksum, and every
+    layer of a `.pixp` project is read the same way.
+
+    Args:
+        source_path (str): Path of the image
+
+    Returns:
+        int: Pixels in the image
+    """
+    extension = path.splitext(source_path)[1].lower()
+    if extension == ".pixi":
+        grid = load_pixi(source_path)
+    elif extension == ".pixp":
+        project = PixiProject(source_path)
+        for index in range(len(project)):
+            layer = project.read_layer(index)
+            if (layer.width, layer.height) != (project.width, project.height):
+                raise ValueError(f"Layer {index} does not match the project size")
+        return project.width * project.height
+    else:
+        try:
+            grid = load_png(source_path)
+        except Exception as error:
+            raise ValueError(f"Unreadable image, {error}") from None
+    return grid.width * grid.height
+
+
+def run_job(job: tuple[str, str | None, BatchOptions]) -> BatchResult:
+    """Convert or validate one file, catching its errors into the result
+
+    Args:
+        job (tuple[str, str | None, BatchOptions]): Source path, destination path or None when validating, and options
+
+    Returns:
+        BatchResult: The outcome
+    """
+    source_path, destination, options = job
+    result = BatchResult(source_path, destination)
+    start = time.perf_counter()
+    try:
+        result.bytes_read = path.getsize(source_path)
+        if options.validate:
+            result.pixels = validate_image(source_path)
+        else:
+            result.pixels = convert_image(source_path, destination, options)
+            result.bytes_written = path.getsize(destination)
+    except Exception as error:
+        result.error = f"{type(error).__name__}: {error}"
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def run_batch(
+    jobs: list[tuple[str, str | None, BatchOptions]],
+    processes: int = None,
+    callback: Callable[[BatchResult], None] = None,
+) -> list[BatchResult]:
+    """Run jobs across a pool of worker processes, in whatever order they finish
+
+    Args:
+        jobs (list[tuple[str, str | None, BatchOptions]]): Jobs, see `run_job`
+        processes (int, optional): Worker processes, 1 runs the jobs in this process. Defaults to the CPU count.
+        callback (Callable[[BatchResult], None], optional): Called with each result as it comes in. Defaults to None.
+
+    Returns:
+        list[BatchResult]: Results, in the order they finished
+    """
+    processes = min(processes or os.cpu_count() or 1, max(len(jobs), 1))
+    results: list[BatchResult] = []
+    if processes == 1:
+        outcomes = map(run_job, jobs)
+        pool = None
+    else:
+        pool = get_context().Pool(processes)
+        # Small chunks keep workers busy when file sizes vary a lot
+        chunksize = max(1, min(16, len(jobs) // (processes * 8)))
+        outcomes = pool.imap_unordered(run_job, jobs, chunksize)
+    try:
+        for result in outcomes:
+            results.append(result)
+            if callback is not None:
+                callback(result)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return results
+
+
+def batch_summary(results: list[BatchResult], seconds: float) -> str:
+    """Describe the throughput of a finished batch
+
+    Args:
+        results (list[BatchResult]): Results of the batch
+        seconds (float): Wall clock time the batch took
+
+    Returns:
+        str: One line per figure
+    """
+    failed = sum(not result.ok for result in results)
+    pixels = sum(result.pixels for result in results)
+    read = sum(result.bytes_read for result in results) / (1 << 20)
+    written = sum(result.bytes_written for result in results) / (1 << 20)
+    busy = sum(result.seconds for result in results)
+    seconds = max(seconds, 1e-9)
+    return "\n".join(
+        [
+            f"Files:      {len(results) - failed} ok, {failed} failed",
+            f"Pixels:     {pixels / 1e6:.2f} MP",
+            f"Data:       {read:.2f} MiB read, {written:.2f} MiB written",
+            f"Time:       {seconds:.2f} s, {busy:.2f} s across workers",
+            f"Throughput: {len(results) / seconds:.1f} files/s, "
+            f"{pixels / 1e6 / seconds:.2f} MP/s, {read / seconds:.2f} MiB/s",
+        ]
+    )
@@ -1,7 +1,7 @@
+import numpy as np
 import pygame
 from .Grid import Grid, ComputedLayeredGrid
 from pygame import Surface
-from .Helpers import rgb_to_packedint, rgba_to_rgb
 from .Types import RGB
 from .Tools import Tool, PaintTool
 
@@ -33,6 +33,10 @@ class GridCamera:
         self.scale_dirty: bool = True
         self.scaled_surface: Surface = Surface((1, 1))
 
+        # Grid rendered without the overlay, only regions the grid marks dirty are redrawn
+        self.grid_surface: Surface = None
+        self.grid_background: RGB = None
+
     def set_position(self, x: float, y: float):
         """Set camera position
 
@@ -68,10 +72,21 @@ class GridCamera:
             background (RGB): The background color to fill the surface with (needed for RGBA to RGB conversion)
         """
 
-        surface.fill(background)
-
-        # Convert grid to surface (performantly)
-        self._generate_surface(surface, background)
+        # Convert grid to surface (performantly), redrawing only what changed
+        if (
+            self.grid_surface is None
+            or self.grid_surface.get_size() != surface.get_size()
+            or self.grid_background != background
+        ):
+            self.grid_surface = Surface(surface.get_size())
+            self.grid_background = background
+            self.grid.pop_dirty_rect()
+            self._generate_surface(self.grid_surface, background)
+        else:
+            rect = self.grid.pop_dirty_rect()
+            if rect is not None:
+                self._generate_surface(self.grid_surface, background, rect=rect)
+        surface.blit(self.grid_surface, (0, 0))
 
         # Draw overlay grid
         self.draw_overlay_grid(screen, surface)
@@ -116,18 +131,23 @@ class GridCamera:
         #                     self.height / self.grid.overlay.height * self.scale,
         #                 ),
         #             )
-        pixel_array = pygame.surfarray.pixels2d(surface)
-        for y in range(self.grid.overlay.height):
-            for x in range(self.grid.overlay.width):
-                if self.grid.overlay.cells[y][x].value[3] == 0:
-                    continue
-                color = rgb_to_packedint(
-                    rgba_to_rgb(
-                        self.grid.overlay.cells[y][x].value,
-                        (0, 0, 0),  # Default background color for overlay
-                    )
-                )
-                pixel_array[x, y] = color
+        overlay = self.grid.overlay.pixels
+        visible = overlay[..., 3] > 0
+        if not visible.any():
+            return
+
+        # Flatten onto black, the default background color for overlay
+        ys, xs = np.nonzero(visible)
+        x0, x1 = xs.min(), xs.max() + 1
+        y0, y1 = ys.min(), ys.max() + 1
+        rgb = np.empty((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+        self.grid.pool.flatten(overlay[y0:y1, x0:x1], rgb, (0, 0, 0))
+
+        pixel_array = pygame.surfarray.pixels3d(surface).transpose(1, 0, 2)
+        region = pixel_array[y0:y1, x0:x1]
+        mask = visible[y0:y1, x0:x1]
+        region[mask] = rgb[mask]
+        del pixel_array, region  # Unlock the surface
 
     def zoom_on(self, origin: tuple[float, float], scale: float):
         """Zoom the camera on a fixed point
@@ -152,7 +172,11 @@ class GridCamera:
         self.set_position(new_real_x, new_real_y)
 
     def _generate_surface(
-        self, surface: Surface, background: RGB, backgrounds: list[RGB] = None
+        self,
+        surface: Surface,
+        background: RGB,
+        backgrounds: np.ndarray = None,
+        rect: tuple[int, int, int, int] = None,
     ):
         """Internal Method, Generate surface from grid data
         Writes pixel data directly to the surface's pixel array for performance
@@ -160,21 +184,16 @@ class GridCamera:
         Args:
             surface (Surface): The Pygame surface to draw the grid onto
             background (RGB): The background color to fill the surface with, used for RGBA to RGB conversion
-            backgrounds (list[RGB], optional): List of background colors for each layer. Will use backgrounds if provided. Defaults to None.
+            backgrounds (np.ndarray, optional): (height, width, 3) array of per-pixel background colors. Will use backgrounds if provided. Defaults to None.
+            rect (tuple[int, int, int, int], optional): Region (x, y, width, height) to redraw. Defaults to the whole grid.
         """
-        pixel_array = pygame.surfarray.pixels2d(surface)
-        grid = self.grid.get_computed_grid()  # Avoid repeated access
-        use_layer_backgrounds = backgrounds is not None
-        height, width = self.grid.height, self.grid.width
-
-        for y in range(height):
-            bg_row = backgrounds[y] if use_layer_backgrounds else None
-            for x in range(width):
-                rgba = grid[x, y].value
-                bg_color = bg_row[x].value if use_layer_backgrounds else background
-                rgb = rgba_to_rgb(rgba, bg_color)
-                pixel_array[x, y] = rgb_to_packedint(rgb)
-
+        pixel_array = pygame.surfarray.pixels3d(surface).transpose(1, 0, 2)
+        self.grid.pool.flatten(
+            self.grid.get_computed_grid().pixels,
+            pixel_array,
+            background if backgrounds is None else backgrounds,
+            rect,
+        )
         del pixel_array  # Unlock the surface
 
     def _scale_surface_to_camera_dimensions(
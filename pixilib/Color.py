@@ -8,8 +8,11 @@ from .Types import (
     COLOR_PICKER_TOLERANCE,
     HUE_PICKER_TOLERANCE,
 )
-from .Helpers import hsva_to_rgba, rgb_to_packedint
+from .ColorArrays import hsv_to_rgb_array
+from .Helpers import hsva_to_rgba
 from pygame import Surface
+from collections import OrderedDict
+import numpy as np
 import pygame
 
 
@@ -40,6 +43,9 @@ class Palette:
         self.colors: list[RGBA] = colors
         self.selected: int = 0
 
+        # Bumped whenever a color changes, used to recolor indexed layers
+        self.version: int = 0
+
         # Pos and Size data
         self.x: int = x
         self.y: int = y
@@ -52,16 +58,20 @@ class Palette:
         )
         self.height: int = int(self.rows * cell_size)
 
-        # Pygame relevant
-        self.palette_surface: Surface = Surface((width, self.height))
-        self.surfaces: list[Surface] = [None for _ in range(len(colors))]
+        # Pygame relevant, every swatch is painted into one atlas surface
+        self.palette_surface: Surface = Surface((width, max(self.height, 1)))
+        self._paint_atlas()
 
     def __getitem__(self, index: int) -> RGBA:
         return self.colors[index]
 
     def __setitem__(self, index: int, value: RGBA):
         self.colors[index] = value
-        self._update_surfaces()
+        self.version += 1
+        self._paint_swatch(index % len(self.colors))
+
+    def __len__(self) -> int:
+        return len(self.colors)
 
     def add_color(self, color: RGBA):
         """Add a new color to the palette
@@ -70,23 +80,79 @@ class Palette:
             color (RGBA): Color to add
         """
         self.colors.append(color)
-        self.surfaces.append(None)
-        self._update_surfaces()
+        self.version += 1
+        if len(self.colors) > self.rows * self.cells_per_row:
+            self._recalculate_height()
+        self._paint_swatch(len(self.colors) - 1)
 
     def _recalculate_height(self):
-        """Recalculate the height of the palette based on the number of colors"""
+        """Recalculate the height of the palette based on the number of colors, keeping painted swatches"""
         self.rows = len(self.colors) // self.cells_per_row + (
             1 if len(self.colors) % self.cells_per_row > 0 else 0
         )
         self.height = self.rows * self.cell_size
-        self.palette_surface = Surface((self.width, self.height))
 
-    def _update_surfaces(self):
-        """Update the surfaces for each color in the palette"""
-        for i, color in enumerate(self.colors):
-            if self.surfaces[i] is None:
-                self.surfaces[i] = Surface((self.width, self.height))
-            self.surfaces[i].fill(color)
+        old_surface = self.palette_surface
+        self.palette_surface = Surface((self.width, max(self.height, 1)))
+        self.palette_surface.blit(old_surface, (0, 0))
+
+    def _paint_atlas(self):
+        """Internal Method, Paint every swatch into the atlas at once"""
+        size = self.cell_size
+        cells = self.rows * self.cells_per_row
+        rgb = np.zeros((cells, 3), dtype=np.uint8)
+        if self.colors:
+            rgb[: len(self.colors)] = [color[:3] for color in self.colors]
+
+        # One pixel per swatch, scaled up to cell_size and laid out as (x, y, RGB)
+        grid = rgb.reshape(self.rows, self.cells_per_row, 3).transpose(1, 0, 2)
+        pixels = np.zeros((self.width, self.height, 3), dtype=np.uint8)
+        pixels[: self.cells_per_row * size] = grid.repeat(size, 0).repeat(size, 1)
+        if self.height > 0:
+            pygame.surfarray.blit_array(self.palette_surface, pixels)
+
+    def _paint_swatch(self, index: int):
+        """Internal Method, Repaint only the swatch at `index` in the atlas"""
+        self.palette_surface.fill(self.colors[index][:3], self.swatch_rect(index))
+
+    def swatch_rect(self, index: int) -> tuple[int, int, int, int]:
+        """Get the rectangle of a swatch, relative to the palette
+
+        Args:
+            index (int): Index of the color
+
+        Returns:
+            tuple[int, int, int, int]: Rectangle (x, y, width, height) of the swatch
+        """
+        row, column = divmod(index, self.cells_per_row)
+        return (
+            column * self.cell_size,
+            row * self.cell_size,
+            self.cell_size,
+            self.cell_size,
+        )
+
+    def index_at(self, x: int, y: int) -> int | None:
+        """Get the index of the color at a screen position
+
+        Args:
+            x (int): X coordinate on the screen
+            y (int): Y coordinate on the screen
+
+        Returns:
+            int | None: Index of the color, None if no swatch is at the position
+        """
+        x -= self.x
+        y -= self.y
+        if x < 0 or y < 0:
+            return None
+
+        column, row = x // self.cell_size, y // self.cell_size
+        if column >= self.cells_per_row:
+            return None
+
+        index = int(row * self.cells_per_row + column)
+        return index if index < len(self.colors) else None
 
     def select(self, index: int):
         """Select a color at the specified index
@@ -110,13 +176,39 @@ class Palette:
         self.selected = index
         setter(self.colors[index])
 
-    def click(self, x: int, y: int):
-        if x < self.x or x > self.width:
-            return
-        if y < self.y or y > self.height:
-            return
+    def click(self, x: int, y: int, setter: callable = None) -> int | None:
+        """Handle a click event on the palette, selecting the clicked color
 
-        # Calculate the index of the clicked color
+        Args:
+            x (int): X coordinate of the click
+            y (int): Y coordinate of the click
+            setter (callable, optional): Function to call with the selected color. Defaults to None.
+
+        Returns:
+            int | None: Index of the clicked color, None if no swatch was clicked
+        """
+        index = self.index_at(x, y)
+        if index is None:
+            return None
+
+        if setter is None:
+            self.select(index)
+        else:
+            self.select_return(index, setter)
+        return index
+
+    def draw(self, surface: Surface):
+        """Draw the palette onto a given surface
+
+        Args:
+            surface (Surface): The Pygame surface to draw the palette onto
+        """
+        surface.blit(self.palette_surface, (self.x, self.y))
+        if self.colors:
+            x, y, width, height = self.swatch_rect(self.selected)
+            pygame.draw.rect(
+                surface, (255, 255, 255), (self.x + x, self.y + y, width, height), 1
+            )
 
 
 class ColorSelector:
@@ -127,6 +219,8 @@ class ColorSelector:
         size: tuple[float, float] = (100.0, 100.0),
         hue_picker_height: float = 10.0,
         hue_picker_padding: float = 5.0,
+        sv_resolution: tuple[int, int] = (SATURATION_MAX + 1, VALUE_MAX + 1),
+        sv_cache_size: int = 64,
     ):
         """Create a ColorSelector pygame object
 
@@ -136,12 +230,20 @@ class ColorSelector:
             size (tuple[float, float], optional): Scale of the color picker. Defaults to (100.0, 100.0)
             hue_picker_height (float, optional): Height of the hue picker. Defaults to 10.0.
             hue_picker_padding (float, optional): Padding between the SV picker and the hue picker. Defaults to 5.0.
+            sv_resolution (tuple[int, int], optional): Pixels of the SV picker before scaling to `size`. Defaults to one per saturation/value step.
+            sv_cache_size (int, optional): Scaled SV pickers to keep, least recently used are evicted first. Defaults to 64.
         """
         self.x: int = x
         self.y: int = y
         self.size: tuple[float, float] = size
         self.color: RGBA = (0, 0, 0, 255)
-        self.sv_surface: Surface = Surface((SATURATION_MAX + 1, VALUE_MAX + 1))
+        self.sv_surface: Surface = Surface(sv_resolution)
+        # Scaled SV pickers keyed by (hue, size), most recently used last
+        self.sv_cache: OrderedDict[tuple[int, tuple[float, float]], Surface] = (
+            OrderedDict()
+        )
+        self.sv_cache_size: int = sv_cache_size
+        self.scaled_hue_surface: Surface | None = None
         self.hue = 0
         self.sat = 0
         self.val = 0
@@ -173,18 +275,17 @@ class ColorSelector:
             y (float): New height of the color picker
         """
         self.size = (x, y)
-        self.calculate_hue_surface()
-        self.update_hue(self.hue)
+        # Scaled surfaces are rebuilt on the next draw
+        self.sv_cache.clear()
+        self.scaled_hue_surface = None
         self.update_color_display()
 
     def calculate_hue_surface(self):
-        pixel_array = pygame.surfarray.pixels2d(self.hue_surface)
-        for x in range(HUE_MAX + 1):
-            hsv: HSV = (x, SATURATION_MAX, VALUE_MAX)
-            rgb: RGB = hsva_to_rgba(hsv, 255)[:3]
-            pos = (x, 0)
-            pixel_array[pos] = rgb_to_packedint(rgb)
-        del pixel_array  # Unlock the surface
+        width = self.hue_surface.get_width()
+        hues = np.linspace(0, HUE_MAX, width)[:, None]
+        rgb = hsv_to_rgb_array(hues, SATURATION_MAX, VALUE_MAX)
+        pygame.surfarray.blit_array(self.hue_surface, rgb)
+        self.scaled_hue_surface = None
 
     def update_hue(self, hue: int):
         """Update the color picker surface with a new hue
@@ -195,24 +296,45 @@ class ColorSelector:
         if hue < 0 or hue > HUE_MAX:
             return
 
-        pixel_array = pygame.surfarray.pixels2d(self.sv_surface)
-        height, width = VALUE_MAX, SATURATION_MAX
-
-        for y in range(height + 1):
-            for x in range(width + 1):
-                hsv: HSV = (hue, x, y)
-                rgb: RGB = hsva_to_rgba(hsv, 255)[:3]
-                pos = (x, VALUE_MAX - y)
-                pixel_array[pos] = rgb_to_packedint(rgb)
-
-        del pixel_array  # Unlock the surface
-
+        # The SV picker itself is rendered on the next draw, or taken from the cache
         self.color = hsva_to_rgba((hue, self.sat, self.val), 255)
         try:
             self.update_color_display()
         except:
             pass
 
+    def render_sv_surface(self, hue: int):
+        """Render the unscaled SV picker of a hue into `sv_surface`
+
+        Args:
+            hue (int): Hue value from 0 to 360
+        """
+        # Saturation increases along x, value decreases along y
+        width, height = self.sv_surface.get_size()
+        saturations = np.linspace(0, SATURATION_MAX, width)[:, None]
+        values = np.linspace(VALUE_MAX, 0, height)[None, :]
+        rgb = hsv_to_rgb_array(hue, saturations, values)
+        pygame.surfarray.blit_array(self.sv_surface, rgb)
+
+    def get_scaled_sv_surface(self) -> Surface:
+        """Get the SV picker of the current hue scaled to `size`, rendering it on a cache miss
+
+        Returns:
+            Surface: The scaled SV picker
+        """
+        key = (self.hue, tuple(self.size))
+        surface = self.sv_cache.get(key)
+        if surface is not None:
+            self.sv_cache.move_to_end(key)
+            return surface
+
+        self.render_sv_surface(min(max(self.hue, 0), HUE_MAX))
+        surface = pygame.transform.scale(self.sv_surface, self.size)
+        self.sv_cache[key] = surface
+        while len(self.sv_cache) > max(1, self.sv_cache_size):
+            self.sv_cache.popitem(last=False)
+        return surface
+
     def update_color_display(self):
         self.color_display: Surface = Surface((self.size[0], self.hue_picker_height))
         self.color_display.fill(self.color)
@@ -225,15 +347,15 @@ class ColorSelector:
         """
 
         # Draw SV Picker
-        scaled_sv_surface = pygame.transform.scale(self.sv_surface, self.size)
-        surface.blit(scaled_sv_surface, (self.x, self.y))
+        surface.blit(self.get_scaled_sv_surface(), (self.x, self.y))
 
         # Draw Hue picker
-        scaled_hue_surface = pygame.transform.scale(
-            self.hue_surface, (self.size[0], self.hue_picker_height)
-        )
+        if self.scaled_hue_surface is None:
+            self.scaled_hue_surface = pygame.transform.scale(
+                self.hue_surface, (self.size[0], self.hue_picker_height)
+            )
         surface.blit(
-            scaled_hue_surface,
+            self.scaled_hue_surface,
             (self.x, self.y + self.size[1] + self.hue_picker_padding),
         )
         surface.blit(
@@ -0,0 +1,184 @@
+import numpy as np
+from .Types import RGB
+
+
+def pack_rgb(rgb: np.ndarray) -> np.ndarray:
+    """Pack an (..., 3) RGB array into one 0xRRGGBB integer per colour (to be used for pixels2d)
+
+    Args:
+        rgb (np.ndarray): RGB array with a trailing channel axis of 3, an RGBA array's alpha is ignored
+
+    Returns:
+        np.ndarray: uint32 array of packed colours with the channel axis removed
+    """
+    rgb = np.asarray(rgb).astype(np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def pack_rgba(pixels: np.ndarray) -> np.ndarray:
+    """Pack an (..., 4) uint8 RGBA array into one 0xRRGGBBAA key per pixel
+
+    Args:
+        pixels (np.ndarray): RGBA array with a trailing channel axis of 4
+
+    Returns:
+        np.ndarray: uint32 array of packed RGBA keys with the channel axis removed
+    """
+    pixels = np.asarray(pixels).astype(np.uint32)
+    return (
+        (pixels[..., 0] << 24)
+        | (pixels[..., 1] << 16)
+        | (pixels[..., 2] << 8)
+        | pixels[..., 3]
+    )
+
+
+def unpack_rgba(keys: np.ndarray) -> np.ndarray:
+    """Unpack keys made by `pack_rgba` back into RGBA
+
+    Args:
+        keys (np.ndarray): uint32 array of packed RGBA keys
+
+    Returns:
+        np.ndarray: uint8 array with a trailing RGBA axis
+    """
+    keys = np.asarray(keys, dtype=np.uint32)
+    shifts = np.array([24, 16, 8, 0], dtype=np.uint32)
+    return ((keys[..., None] >> shifts) & 0xFF).astype(np.uint8)
+
+
+def hsv_to_rgb_array(h: np.ndarray, s: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Convert arrays of HSV components to RGB, matching `hsva_to_rgba` for every element
+
+    Args:
+        h (np.ndarray): Hue (0-360), broadcast against `s` and `v`
+        s (np.ndarray): Saturation (0-100)
+        v (np.ndarray): Value (0-100)
+
+    Returns:
+        np.ndarray: uint8 array with the broadcast shape of the inputs plus a trailing RGB axis
+    """
+    h = np.asarray(h, dtype=np.float64)
+    s = np.asarray(s, dtype=np.float64) / 100.0
+    v = np.asarray(v, dtype=np.float64) / 100.0
+
+    c = v * s
+    x = c * (1 - np.abs((h / 60) % 2 - 1))
+    m = v - c
+    zero = np.zeros(())
+
+    # Same sectors as hsva_to_rgba, hues outside [0, 300) fall into the last one
+    sector = np.floor(h / 60)
+    sector = np.where((sector < 0) | (sector > 5), 5, sector).astype(np.intp)
+    choices = [(c, x, zero), (x, c, zero), (zero, c, x)]
+    choices += [(zero, x, c), (x, zero, c), (c, zero, x)]
+
+    shape = np.broadcast_shapes(h.shape, s.shape, v.shape)
+    rgb = np.empty(shape + (3,), dtype=np.uint8)
+    for channel in range(3):
+        if sector.ndim == 0:
+            # A single hue picks one sector for every element
+            value = choices[sector][channel]
+        else:
+            value = np.choose(
+                sector, [np.broadcast_to(choice[channel], shape) for choice in choices]
+            )
+        rgb[..., channel] = np.round((value + m) * 255)
+    return rgb
+
+
+def hsva_to_rgba_array(hsv: np.ndarray, a: int | np.ndarray = 255) -> np.ndarray:
+    """Convert an (..., 3) HSV array to RGBA, see `hsv_to_rgb_array`
+
+    Args:
+        hsv (np.ndarray): HSV array (Hue:0-360, Saturation:0-100, Value:0-100)
+        a (int | np.ndarray, optional): Alpha (0-255), broadcast against the colours. Defaults to 255.
+
+    Returns:
+        np.ndarray: uint8 array with a trailing RGBA axis
+    """
+    hsv = np.asarray(hsv)
+    rgba = np.empty(hsv.shape[:-1] + (4,), dtype=np.uint8)
+    rgba[..., :3] = hsv_to_rgb_array(hsv[..., 0], hsv[..., 1], hsv[..., 2])
+    rgba[..., 3] = a
+    return rgba
+
+
+def rgba_to_hsva_array(rgba: np.ndarray) -> np.ndarray:
+    """Convert an (..., 3) RGB or (..., 4) RGBA array to HSV, matching `rgba_to_hsva` for every colour
+
+    Args:
+        rgba (np.ndarray): RGB or RGBA array, alpha is ignored
+
+    Returns:
+        np.ndarray: int array with a trailing HSV axis (Hue:0-360, Saturation:0-100, Value:0-100)
+    """
+    rgb = np.asarray(rgba)[..., :3] / 255.0
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+
+    mx = rgb.max(axis=-1)
+    diff = mx - rgb.min(axis=-1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        h = np.select(
+            [diff == 0, mx == r, mx == g],
+            [
+                0.0,
+                (60 * ((g - b) / diff) + 360) % 360,
+                (60 * ((b - r) / diff) + 120) % 360,
+            ],
+            (60 * ((r - g) / diff) + 240) % 360,
+        )
+        s = np.where(mx == 0, 0.0, (diff / mx) * 100)
+    v = mx * 100
+
+    return np.stack([h, s, v], axis=-1).astype(np.int64)
+
+
+def rgba_to_rgb_array(
+    rgba: np.ndarray, background: RGB | np.ndarray = (255, 255, 255)
+) -> np.ndarray:
+    """Flatten an (..., 4) RGBA array onto a background, matching `rgba_to_rgb` for every colour
+
+    Args:
+        rgba (np.ndarray): RGBA array
+        background (RGB | np.ndarray, optional): Background colour, or backgrounds broadcast against the colours. Defaults to (255, 255, 255).
+
+    Returns:
+        np.ndarray: uint8 array with a trailing RGB axis
+    """
+    rgba = np.asarray(rgba, dtype=np.float64)
+    background = np.asarray(background, dtype=np.float64)
+
+    alpha = rgba[..., 3:] / 255.0
+    rgb = np.floor(rgba[..., :3] * alpha + background * (1 - alpha) + 0.5)
+    return rgb.astype(np.uint8)
+
+
+def color_diff_sq_array(c1: np.ndarray, c2: np.ndarray) -> np.ndarray:
+    """Squared Euclidean distance between colours, over the trailing channel axis
+
+    Comparing squared distances against a squared tolerance avoids the square root.
+
+    Args:
+        c1 (np.ndarray): Colours with a trailing channel axis
+        c2 (np.ndarray): Colours broadcast against `c1`
+
+    Returns:
+        np.ndarray: int64 array of squared distances with the channel axis removed
+    """
+    diff = np.asarray(c1, dtype=np.int64) - np.asarray(c2, dtype=np.int64)
+    return np.einsum("...k,...k->...", diff, diff)
+
+
+def color_diff_array(c1: np.ndarray, c2: np.ndarray) -> np.ndarray:
+    """Euclidean distance between colours, over the trailing channel axis
+
+    Args:
+        c1 (np.ndarray): Colours with a trailing channel axis
+        c2 (np.ndarray): Colours broadcast against `c1`
+
+    Returns:
+        np.ndarray: float array of distances with the channel axis removed
+    """
+    return np.sqrt(color_diff_sq_array(c1, c2))
@@ -0,0 +1,165 @@
+import numpy as np
+from .ColorArrays import pack_rgba, unpack_rgba
+from .Types import RGBA
+
+
+def _key(color: RGBA) -> int:
+    """Internal Method, Pack one RGBA color like `pack_rgba`"""
+    r, g, b, a = color
+    return (r << 24) | (g << 16) | (b << 8) | a
+
+
+class ColorUsage:
+    """Pixel count of every color of a grid
+
+    Built with one scan the first time a grid's `usage` is read, then kept up to date
+    by the grid's own writes, including the bulk writes undo and redo replay through,
+    so queries never rescan the canvas.
+    """
+
+    def __init__(self, pixels: np.ndarray):
+        """Count the colors of a grid
+
+        Args:
+            pixels (np.ndarray): (height, width, 4) uint8 RGBA pixels of the grid
+        """
+        self._counts: dict[int, int] = {}
+        self.reset(pixels)
+
+    def reset(self, pixels: np.ndarray):
+        """Recount from scratch, after the whole grid was rewritten
+
+        Args:
+            pixels (np.ndarray): (height, width, 4) uint8 RGBA pixels of the grid
+        """
+        keys, counts = np.unique(pack_rgba(pixels), return_counts=True)
+        self._counts = dict(zip(keys.tolist(), counts.tolist()))
+
+    def fill(self, color: RGBA, count: int):
+        """Record every pixel being set to `color`
+
+        Args:
+            color (RGBA): Color of every pixel
+            count (int): Number of pixels of the grid
+        """
+        self._counts = {_key(color): count} if count else {}
+
+    def _add(self, key: int, count: int):
+        """Internal Method, Change the count of one packed color"""
+        count += self._counts.get(key, 0)
+        if count:
+            self._counts[key] = count
+        else:
+            self._counts.pop(key, None)
+
+    def replace(self, before: RGBA, after: RGBA):
+        """Record one pixel changing from `before` to `after`"""
+        self._add(_key(before), -1)
+        self._add(_key(after), 1)
+
+    def update(self, before: np.ndarray, after: np.ndarray):
+        """Record pixels changing from `before` to `after`
+
+        Args:
+            before (np.ndarray): (..., 4) uint8 RGBA values before the write
+            after (np.ndarray): (..., 4) uint8 RGBA values after the write, same number of pixels
+        """
+        for pixels, sign in ((before, -1), (after, 1)):
+            keys, counts = np.unique(pack_rgba(pixels), return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                self._add(key, sign * count)
+
+    # region Queries
+    def count(self, color: RGBA) -> int:
+        """Number of pixels of `color`"""
+        return self._counts.get(_key(color), 0)
+
+    def counts(self) -> dict[RGBA, int]:
+        """Number of pixels of every used color, most used first"""
+        keys = sorted(self._counts, key=self._counts.get, reverse=True)
+        colors = unpack_rgba(np.array(keys, dtype=np.uint32)).tolist()
+        return {tuple(color): self._counts[key] for color, key in zip(colors, keys)}
+
+    def colors(self) -> list[RGBA]:
+        """Every used color, most used first"""
+        return list(self.counts())
+
+    def unused(self, colors: list[RGBA]) -> list[int]:
+        """Indices of the colors that no pixel uses, e.g. of a Palette's colors
+
+        Args:
+            colors (list[RGBA]): Colors to check
+
+        Returns:
+            list[int]: Indices into `colors` of the unused ones
+        """
+        return [i for i, color in enumerate(colors) if self.count(color) == 0]
+
+    def __contains__(self, color: RGBA) -> bool:
+        return self.count(color) > 0
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    # endregion
+
+
+class IndexUsage(ColorUsage):
+    """Pixel count of every index of an IndexedGrid, reported by the colors the indices map to"""
+
+    def __init__(self, grid: "IndexedGrid"):  # type: ignore
+        """Count the indices of an indexed grid
+
+        Args:
+            grid (IndexedGrid): Grid to count
+        """
+        self.grid = grid
+        self.reset(grid.indices)
+
+    def reset(self, indices: np.ndarray):
+        """Recount from scratch, after the whole grid was rewritten
+
+        Args:
+            indices (np.ndarray): (height, width) uint8 indices of the grid
+        """
+        self.index_counts: np.ndarray = np.bincount(indices.ravel(), minlength=256)
+
+    def fill(self, index: int, count: int):
+        """Record every pixel being set to `index`"""
+        self.index_counts[...] = 0
+        self.index_counts[index] = count
+
+    def replace(self, before: int, after: int):
+        """Record one pixel changing from index `before` to `after`"""
+        self.index_counts[before] -= 1
+        self.index_counts[after] += 1
+
+    def update(self, before: np.ndarray, after: np.ndarray):
+        """Record pixels changing from indices `before` to `after`"""
+        self.index_counts -= np.bincount(before.ravel(), minlength=256)
+        self.index_counts += np.bincount(after.ravel(), minlength=256)
+
+    @property
+    def _counts(self) -> dict[int, int]:
+        """Counts keyed by packed color, indices of the same color are merged"""
+        counts: dict[int, int] = {}
+        keys = pack_rgba(self.grid.lut).tolist()
+        for index in np.nonzero(self.index_counts)[0].tolist():
+            counts[keys[index]] = counts.get(keys[index], 0) + int(
+                self.index_counts[index]
+            )
+        return counts
+
+    def unused(self, colors: list[RGBA] = None) -> list[int]:
+        """Indices of the palette colors that no pixel uses
+
+        Args:
+            colors (list[RGBA], optional): Colors to check. Defaults to the grid's palette, checked by index.
+
+        Returns:
+            list[int]: Indices into the palette, or into `colors`, of the unused ones
+        """
+        if colors is not None:
+            return super().unused(colors)
+        used = self.index_counts[1 : len(self.grid.palette.colors) + 1]
+        return np.nonzero(used == 0)[0].tolist()
@@ -0,0 +1,218 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+import os
+import numpy as np
+from .ColorArrays import rgba_to_rgb_array
+from .Types import RGB, Rect
+
+
+class TilePool:
+    """Long-lived thread pool that runs NumPy kernels over tiles of a canvas
+
+    NumPy releases the GIL inside its array loops, so kernels working on separate
+    tiles run on separate cores. Small regions are processed inline, where handing
+    work to threads would cost more than it saves.
+    """
+
+    def __init__(
+        self,
+        workers: int = None,
+        tile_size: int = 256,
+        serial_threshold: int = 256 * 256,
+    ):
+        """Create a TilePool
+
+        Args:
+            workers (int, optional): Number of worker threads, 1 always runs serially. Defaults to the CPU count.
+            tile_size (int, optional): Width and height of the tiles work is split into. Defaults to 256.
+            serial_threshold (int, optional): Regions with fewer pixels than this run inline. Defaults to 256*256.
+        """
+        self.workers: int = max(1, workers or os.cpu_count() or 1)
+        self.tile_size: int = tile_size
+        self.serial_threshold: int = serial_threshold
+        self._executor: ThreadPoolExecutor = None
+
+    def tiles(self, rect: Rect) -> list[Rect]:
+        """Split a rectangle into tiles aligned to `tile_size`
+
+        Args:
+            rect (Rect): Region (x, y, width, height) to split
+
+        Returns:
+            list[Rect]: Tiles (x, y, width, height) covering `rect`
+        """
+        x, y, width, height = rect
+        size = self.tile_size
+        tiles = []
+        for ty in range(y - y % size, y + height, size):
+            for tx in range(x - x % size, x + width, size):
+                x0, y0 = max(tx, x), max(ty, y)
+                x1, y1 = min(tx + size, x + width), min(ty + size, y + height)
+                tiles.append((x0, y0, x1 - x0, y1 - y0))
+        return tiles
+
+    def map_tiles(self, func: Callable[[Rect], None], rect: Rect):
+        """Call `func(tile)` for every tile of `rect`, in parallel for large regions
+
+        Args:
+            func (Callable[[Rect], None]): Kernel to run, must only write inside the tile it is given
+            rect (Rect): Region (x, y, width, height) to process
+        """
+        if rect[2] <= 0 or rect[3] <= 0:
+            return
+        if rect[2] * rect[3] < self.serial_threshold:
+            func(rect)
+            return
+        if self.workers == 1:
+            # Tile-sized working sets stay in cache, which is faster even serially
+            for tile in self.tiles(rect):
+                func(tile)
+            return
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="pixi-tile"
+            )
+        # Consume the results so exceptions raised by a tile propagate
+        for _ in self._executor.map(func, self.tiles(rect)):
+            pass
+
+    def composite(self, layers: list[np.ndarray], out: np.ndarray, rect: Rect = None):
+        """Stack RGBA layers into `out` on this pool, see `composite`"""
+        composite(layers, out, rect, self)
+
+    def flatten(
+        self,
+        pixels: np.ndarray,
+        out: np.ndarray,
+        background: RGB | np.ndarray,
+        rect: Rect = None,
+    ):
+        """Flatten RGBA pixels onto a background into `out` on this pool, see `flatten`"""
+        flatten(pixels, out, background, rect, self)
+
+    def set_workers(self, workers: int):
+        """Change the number of worker threads
+
+        Args:
+            workers (int): New number of worker threads, 1 always runs serially
+        """
+        self.shutdown()
+        self.workers = max(1, workers)
+
+    def shutdown(self):
+        """Stop the worker threads, they are restarted on the next parallel call"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+_default_pool: TilePool = None
+
+
+def default_pool() -> TilePool:
+    """Returns the TilePool shared by grids and cameras that were not given one"""
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = TilePool()
+    return _default_pool
+
+
+def composite_rect(layers: list[np.ndarray], out: np.ndarray, rect: Rect):
+    """Stack RGBA layers bottom to top into `out` inside a rectangle
+
+    Rounds after every layer exactly like `Helpers.stack_rgba`, so results match the
+    per-cell compositing bit for bit.
+
+    Args:
+        layers (list[np.ndarray]): (height, width, 4) uint8 layers, bottom layer first
+        out (np.ndarray): (height, width, 4) uint8 array to write the result into
+        rect (Rect): Region (x, y, width, height) to composite
+    """
+    x, y, width, height = rect
+    region = (slice(y, y + height), slice(x, x + width))
+    result = np.zeros((height, width, 4), dtype=np.float64)
+
+    for layer in layers:
+        top = layer[region]
+        if not top[..., 3].any():
+            continue
+        if (top[..., 3] == 255).all():
+            # Opaque layers hide everything below them
+            result[...] = top
+            continue
+        top = top.astype(np.float64)
+
+        a1 = top[..., 3:] / 255.0
+        a2 = result[..., 3:] / 255.0
+        out_a = a1 + a2 * (1 - a1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rgb = (top[..., :3] * a1 + result[..., :3] * a2 * (1 - a1)) / out_a
+
+        result[..., :3] = np.floor(rgb + 0.5)
+        result[..., 3:] = np.floor(out_a * 255 + 0.5)
+        result[out_a[..., 0] == 0] = 0
+
+    out[region] = result
+
+
+def flatten_rect(
+    pixels: np.ndarray, out: np.ndarray, rect: Rect, background: RGB | np.ndarray
+):
+    """Flatten RGBA pixels onto a background into `out` inside a rectangle
+
+    Matches `Helpers.rgba_to_rgb` bit for bit.
+
+    Args:
+        pixels (np.ndarray): (height, width, 4) uint8 RGBA pixels
+        out (np.ndarray): (height, width, 3) array to write the RGB result into
+        rect (Rect): Region (x, y, width, height) to flatten
+        background (RGB | np.ndarray): Background colour, or (height, width, 3) per-pixel backgrounds
+    """
+    x, y, width, height = rect
+    region = (slice(y, y + height), slice(x, x + width))
+    background = np.asarray(background)
+    if background.ndim == 3:
+        background = background[region]
+    out[region] = rgba_to_rgb_array(pixels[region], background)
+
+
+def composite(
+    layers: list[np.ndarray], out: np.ndarray, rect: Rect = None, pool: TilePool = None
+):
+    """Stack RGBA layers into `out`, split into tiles across `pool`
+
+    Args:
+        layers (list[np.ndarray]): (height, width, 4) uint8 layers, bottom layer first
+        out (np.ndarray): (height, width, 4) uint8 array to write the result into
+        rect (Rect, optional): Region (x, y, width, height) to composite. Defaults to all of `out`.
+        pool (TilePool, optional): Pool to run on. Defaults to the shared pool.
+    """
+    if rect is None:
+        rect = (0, 0, out.shape[1], out.shape[0])
+    (pool or default_pool()).map_tiles(
+        lambda tile: composite_rect(layers, out, tile), rect
+    )
+
+
+def flatten(
+    pixels: np.ndarray,
+    out: np.ndarray,
+    background: RGB | np.ndarray,
+    rect: Rect = None,
+    pool: TilePool = None,
+):
+    """Flatten RGBA pixels onto a background into `out`, split into tiles across `pool`
+
+    Args:
+        pixels (np.ndarray): (height, width, 4) uint8 RGBA pixels
+        out (np.ndarray): (height, width, 3) array to write the RGB result into
+        background (RGB | np.ndarray): Background colour, or (height, width, 3) per-pixel backgrounds
+        rect (Rect, optional): Region (x, y, width, height) to flatten. Defaults to all of `pixels`.
+        pool (TilePool, optional): Pool to run on. Defaults to the shared pool.
+    """
+    if rect is None:
+        rect = (0, 0, pixels.shape[1], pixels.shape[0])
+    (pool or default_pool()).map_tiles(
+        lambda tile: flatten_rect(pixels, out, tile, background), rect
+    )
@@ -1,7 +1,48 @@
+import numpy as np
+from functools import lru_cache
 from pygame import Surface, Color, draw
 from pygame.font import Font
 from .Types import RGB, RGBA
-from matplotlib.colors import XKCD_COLORS
+
+# (names, (N, 3) int32 RGB values), built the first time a color is named
+_named_colors: tuple[list[str], np.ndarray] | None = None
+
+
+def _load_named_colors() -> tuple[list[str], np.ndarray]:
+    """Internal Method, Build the XKCD color index, importing matplotlib only now"""
+    global _named_colors
+    if _named_colors is None:
+        from matplotlib.colors import XKCD_COLORS
+
+        names = [name.removeprefix("xkcd:") for name in XKCD_COLORS]
+        values = b"".join(bytes.fromhex(value[1:]) for value in XKCD_COLORS.values())
+        values = np.frombuffer(values, dtype=np.uint8).reshape(-1, 3)
+        _named_colors = (names, values.astype(np.int32))
+    return _named_colors
+
+
+@lru_cache(maxsize=1024)
+def nearest_color_name(color: RGB | RGBA) -> str:
+    """Get the XKCD name of the color nearest `color` by RGB distance
+
+    Args:
+        color (RGB | RGBA): Color to name, alpha is ignored
+
+    Returns:
+        str: Name of the nearest XKCD color
+    """
+    names, values = _load_named_colors()
+    diff = values - np.array(color[:3], dtype=np.int32)
+    return names[int(np.einsum("nc,nc->n", diff, diff).argmin())]
+
+
+def _is_color(value) -> bool:
+    """Internal Method, Whether `value` is an RGB or RGBA tuple"""
+    return (
+        isinstance(value, tuple)
+        and len(value) in (3, 4)
+        and all(isinstance(c, int) and 0 <= c <= 255 for c in value)
+    )
 
 
 def draw_debug_view(font: Font, screen: Surface, color: RGB, texts: dict):
@@ -10,8 +51,8 @@ def draw_debug_view(font: Font, screen: Surface, color: RGB, texts: dict):
         if callable(value):
             value = value()
 
-        if isinstance(value, type(RGB)) or isinstance(value, type(RGBA)):
-            value = f"{value} - {XKCD_COLORS.get(value, 'Unknown Color')}"
+        if _is_color(value):
+            value = f"{value} - {nearest_color_name(value)}"
 
         text_surface = font.render(f"{label}: {value.__str__()}", True, color)
         # draw from bottom right to top right
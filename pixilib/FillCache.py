@@ -0,0 +1,129 @@
+from weakref import WeakKeyDictionary
+import numpy as np
+from .ColorArrays import pack_rgba, color_diff_sq_array
+from .Grid import Grid
+
+
+def label_regions(keys: np.ndarray) -> np.ndarray:
+    """Label 4-connected regions of equal keys
+
+    Rows are split into runs of equal keys, then runs touching a run of the same
+    key on the row above are merged. Pixel art has far fewer runs than pixels,
+    so the merge step stays small even on large canvases.
+
+    Args:
+        keys (np.ndarray): (height, width) array of per-pixel keys
+
+    Returns:
+        np.ndarray: (height, width) int array, pixels of one region share a label
+    """
+    height, width = keys.shape
+
+    # A new run starts at the beginning of each row and wherever the key changes
+    starts = np.ones((height, width), dtype=bool)
+    starts[:, 1:] = keys[:, 1:] != keys[:, :-1]
+    run_ids = np.cumsum(starts.ravel()).reshape(height, width) - 1
+    run_count = int(run_ids[-1, -1]) + 1
+
+    # Vertically adjacent runs with equal keys belong to the same region
+    same = keys[1:] == keys[:-1]
+    below = run_ids[1:][same]
+    above = run_ids[:-1][same]
+
+    parent = np.arange(run_count)
+    if below.size:
+        edges = np.unique(np.stack([below, above], axis=1), axis=0)
+        below, above = edges[:, 0], edges[:, 1]
+
+        # Hook every run onto the smallest root it touches, then compress paths
+        while True:
+            roots_below, roots_above = parent[below], parent[above]
+            lowest = np.minimum(roots_below, roots_above)
+            hooked = parent.copy()
+            np.minimum.at(hooked, roots_below, lowest)
+            np.minimum.at(hooked, roots_above, lowest)
+            hooked = hooked[hooked]
+            if np.array_equal(hooked, parent):
+                break
+            parent = hooked
+
+    _, labels = np.unique(parent, return_inverse=True)
+    return labels[run_ids]
+
+
+class FillRegionCache:
+    """Cache of flood fill regions, keyed by layer version, tolerance and connected component
+
+    A label map of equal-colour regions is computed once per layer edit. With zero
+    tolerance a fill region is just one label, and regions for other tolerances are
+    cached per seed label, so every seed inside an already resolved region returns
+    its mask without refilling.
+    """
+
+    def __init__(self, max_regions: int = 32):
+        """Create a FillRegionCache
+
+        Args:
+            max_regions (int, optional): Tolerance regions to keep per layer version. Defaults to 32.
+        """
+        self.max_regions: int = max_regions
+        self._entries: WeakKeyDictionary = WeakKeyDictionary()
+
+    def _entry(self, grid: Grid) -> dict:
+        """Internal Method, Get the cache entry of `grid`, rebuilding it if the grid was edited"""
+        entry = self._entries.get(grid)
+        if entry is None or entry["version"] != grid.version:
+            pixels = grid.to_array()
+            entry = {
+                "version": grid.version,
+                "pixels": pixels,
+                "labels": label_regions(pack_rgba(pixels)),
+                "regions": {},
+            }
+            self._entries[grid] = entry
+        return entry
+
+    def region(self, grid: Grid, x: int, y: int, tolerance: float = 0.0) -> np.ndarray:
+        """Get the region a flood fill from `(x,y)` would fill
+
+        Args:
+            grid (Grid): Layer to fill on
+            x (int): X coordinate to start filling from
+            y (int): Y coordinate to start filling from
+            tolerance (float, optional): Max colour distance from the seed colour. Defaults to 0.0.
+
+        Returns:
+            np.ndarray: (height, width) boolean mask of the fill region
+        """
+        entry = self._entry(grid)
+        labels = entry["labels"]
+        label = labels[y, x]
+
+        if tolerance <= 0:
+            return labels == label
+
+        key = (tolerance, label)
+        mask = entry["regions"].get(key)
+        if mask is None:
+            pixels = entry["pixels"]
+            within = color_diff_sq_array(pixels, pixels[y, x]) <= tolerance * tolerance
+
+            # Connected part of the pixels within tolerance that contains the seed
+            within_labels = label_regions(within)
+            mask = within_labels == within_labels[y, x]
+
+            if len(entry["regions"]) >= self.max_regions:
+                entry["regions"].pop(next(iter(entry["regions"])))
+            entry["regions"][key] = mask
+        return mask
+
+    def invalidate(self, grid: Grid = None):
+        """Drop cached regions for `grid`, or for all grids if None
+
+        Args:
+            grid (Grid, optional): Grid to drop regions for. Defaults to None.
+        """
+        if grid is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(grid, None)
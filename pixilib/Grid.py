@@ -1,18 +1,80 @@
+from contextlib import contextmanager
+import numpy as np
 from .Cell import Cell
-from .Helpers import stack_rgba
+from .ColorUsage import ColorUsage
+from .Compositor import TilePool, default_pool
+from .Helpers import stack_rgba, union_rect
 from .Types import RGBA
 
 
 class Grid:
-    """Grid class for managing a grid of cells with RGBA values"""
+    """Grid class for managing a grid of cells with RGBA values, stored in a (height, width, 4) uint8 array"""
 
     def __init__(
-        self, width: int, height: int, default_value: RGBA = (255, 255, 255, 0)
+        self,
+        width: int,
+        height: int,
+        default_value: RGBA = (255, 255, 255, 0),
+        pixels: np.ndarray = None,
     ):
+        """Create a Grid
+
+        Args:
+            width (int): Width of the grid
+            height (int): Height of the grid
+            default_value (RGBA, optional): Value of every cell. Defaults to (255, 255, 255, 0).
+            pixels (np.ndarray, optional): (height, width, 4) uint8 array to use as storage instead of a new one, filled with `default_value` only if not given. Defaults to None.
+        """
         self.width = width
         self.height = height
-        self.cells = [
-            [Cell(x, y, default_value) for x in range(width)] for y in range(height)
+        if pixels is None:
+            pixels = np.empty((height, width, 4), dtype=np.uint8)
+            pixels[...] = default_value
+        elif pixels.shape != (height, width, 4):
+            raise ValueError("Pixel array dimensions do not match")
+        self.pixels: np.ndarray = pixels
+
+        # Bumped on every write, used to invalidate caches built from this grid
+        self.version: int = 0
+
+        # Color counts, built on first use of `usage` and then updated by writes
+        self._usage: ColorUsage | None = None
+
+        # Layer properties, hidden layers are left out of the composite
+        self.name: str = ""
+        self.visible: bool = True
+
+    @property
+    def usage(self) -> ColorUsage:
+        """Pixel count of every color, counted once and then kept up to date by writes"""
+        if self._usage is None:
+            self._usage = ColorUsage(self.pixels)
+        return self._usage
+
+    def select_color(self, color: RGBA) -> np.ndarray:
+        """Get every cell of `color`, without scanning if the color is not used
+
+        Args:
+            color (RGBA): Color to select
+
+        Returns:
+            np.ndarray: (height, width) boolean mask of the cells of `color`
+        """
+        if self._usage is not None and color not in self._usage:
+            return np.zeros((self.height, self.width), dtype=bool)
+        return (self.pixels == np.asarray(color, dtype=np.uint8)).all(axis=-1)
+
+    @property
+    def palette_version(self) -> tuple[int, int] | None:
+        """Identity and version of the palette the cells are looked up in, None for RGBA grids"""
+        return None
+
+    @property
+    def cells(self) -> list[list[Cell]]:
+        """The grid as rows of Cells, built on every access"""
+        return [
+            [Cell(x, y, tuple(value)) for x, value in enumerate(row)]
+            for y, row in enumerate(self.pixels.tolist())
         ]
 
     def __getitem__(self, index: tuple[int, int]):
@@ -22,7 +84,7 @@ class Grid:
             x, y = index
 
         if 0 <= x < self.width and 0 <= y < self.height:
-            return self.cells[y][x]
+            return Cell(x, y, tuple(self.pixels[y, x].tolist()))
         return None
 
     def __setitem__(self, index: tuple[int, int], value: RGBA):
@@ -32,24 +94,90 @@ class Grid:
             x, y = index
 
         if 0 <= x < self.width and 0 <= y < self.height:
-            self.cells[y][x].set_color(value)
+            if any(map(lambda c: c < 0 or c > 255, value)):
+                raise ValueError("Color values must be between 0 and 255")
+            if self._usage is not None:
+                self._usage.replace(tuple(self.pixels[y, x].tolist()), tuple(value))
+            self.pixels[y, x] = value
+            self.version += 1
         return None
 
     def clear(self, value: RGBA = (0, 0, 0, 0)):
         """Clear the grid by setting all cells to the default value"""
-        for y in range(self.height):
-            for x in range(self.width):
-                self.cells[y][x].set_color(value)
+        self.pixels[...] = value
+        self.version += 1
+        if self._usage is not None:
+            self._usage.fill(
+                tuple(self.pixels[0, 0].tolist()), self.width * self.height
+            )
+
+    @contextmanager
+    def batch(self, label: str = "edit"):
+        """Group writes into one edit, matching `ComputedLayeredGrid.batch` so tools can batch either grid
+
+        Args:
+            label (str, optional): Name of the edit. Defaults to "edit".
+        """
+        yield self
+
+    def fill_mask(self, mask: np.ndarray, value: RGBA):
+        """Set every cell where `mask` is True to `value`
+
+        Args:
+            mask (np.ndarray): Boolean array of shape (height, width)
+            value (RGBA): The value to set the masked cells to
+        """
+        before = self.pixels[mask] if self._usage is not None else None
+        self.pixels[mask] = value
+        self.version += 1
+        if before is not None:
+            self._usage.update(before, self.pixels[mask])
+
+    def to_array(self) -> np.ndarray:
+        """Returns a copy of the grid as a (height, width, 4) uint8 RGBA array"""
+        return self.pixels.copy()
+
+    def read_rect(self, x: int, y: int, width: int, height: int) -> np.ndarray:
+        """Copy a rectangle of cells into a (height, width, 4) uint8 RGBA array
+
+        Args:
+            x (int): X coordinate of the top left corner
+            y (int): Y coordinate of the top left corner
+            width (int): Width of the rectangle
+            height (int): Height of the rectangle
+
+        Returns:
+            np.ndarray: RGBA values of the cells in the rectangle
+        """
+        return self.pixels[y : y + height, x : x + width].copy()
+
+    def write_rect(self, x: int, y: int, pixels: np.ndarray):
+        """Write a (height, width, 4) RGBA array into the cells at `(x,y)`
+
+        Args:
+            x (int): X coordinate of the top left corner
+            y (int): Y coordinate of the top left corner
+            pixels (np.ndarray): RGBA values to write
+        """
+        region = (slice(y, y + pixels.shape[0]), slice(x, x + pixels.shape[1]))
+        before = self.pixels[region].copy() if self._usage is not None else None
+        self.pixels[region] = pixels
+        self.version += 1
+        if before is not None:
+            self._usage.update(before, self.pixels[region])
 
 
 class ComputedLayeredGrid:
     """Layered grid class that computes RGB from stacked RGBA layers of grids"""
 
-    def __init__(self, width: int, height: int):
+    def __init__(self, width: int, height: int, pool: TilePool = None):
         # All layers must match width and height
         self.width = width
         self.height = height
 
+        # Pool compositing is split across, a TilePool or a SharedMemoryEngine
+        self.pool: TilePool = pool or default_pool()
+
         self.overlay: Grid = Grid(width, height)
 
         # All layers
@@ -58,6 +186,22 @@ class ComputedLayeredGrid:
         # Computed Grid (combine RGBA values into RGB since rendering doesn't support RGBA)
         self._computed_grid: Grid = Grid(width, height)
 
+        # Undo/redo history, records edits when set
+        self.history: "History" = None  # type: ignore
+
+        # Autosave journal, told about every write after it lands when set
+        self.journal: "Autosave" = None  # type: ignore
+
+        # Union of regions changed since the camera last redrew, (x, y, width, height)
+        self._dirty_rect: tuple[int, int, int, int] | None = (0, 0, width, height)
+
+        # Open `batch` contexts and the union of regions written inside them
+        self._batch_depth: int = 0
+        self._batch_rect: tuple[int, int, int, int] | None = None
+
+        # Palette versions of the layers at the last full composite
+        self._palette_versions: list[tuple[int, int] | None] = []
+
     def add_layer(self, grid: Grid, insert: int = -1):
         """Add a grid to the layers at index `insert`
 
@@ -76,16 +220,128 @@ class ComputedLayeredGrid:
 
         self.layers.insert(insert, grid)
 
+        if self.history is not None:
+            self.history.record_layer_add(insert)
+        if self.journal is not None:
+            self.journal.record_layers_changed()
+
+        self._update_computed_grid()
+
+    def add_layers(self, grids: list[Grid]):
+        """Add grids on top of the layers, compositing once for all of them
+
+        Args:
+            grids (list[Grid]): The grids to add, bottom to top
+        """
+        if any(g.width != self.width or g.height != self.height for g in grids):
+            raise ValueError("Grid dimensions do not match")
+
+        for grid in grids:
+            self.layers.append(grid)
+            if self.history is not None:
+                self.history.record_layer_add(len(self.layers) - 1)
+        if self.journal is not None:
+            self.journal.record_layers_changed()
+
+        self._update_computed_grid()
+
+    def set_visible(self, index: int, visible: bool):
+        """Show or hide the layer at `index`
+
+        Args:
+            index (int): Index of the layer
+            visible (bool): Whether the layer is part of the composite
+        """
+        if self.layers[index].visible != visible:
+            self.layers[index].visible = visible
+            if self.journal is not None:
+                self.journal.record_layers_changed()
+            self.invalidate(0, 0, self.width, self.height)
+
+    def remove_layer(self, index: int) -> Grid:
+        """Remove the layer at `index` and return it
+
+        Args:
+            index (int): Index of the layer to remove
+
+        Returns:
+            Grid: The removed layer
+        """
+        grid = self.layers.pop(index)
+        if self.journal is not None:
+            self.journal.record_layers_changed()
         self._update_computed_grid()
+        return grid
 
     def _update_computed_grid(self):
-        """Internal Method, Updates computed grid only if calculated values differ from stored values"""
-        for y in range(self.height):
-            for x in range(self.width):
-                # Update only if computed grid is different from actual computed grid
-                computed_cell = self._compute_cell(x, y)
-                if self._computed_grid[x, y].value != computed_cell:
-                    self._computed_grid[x, y] = computed_cell
+        """Internal Method, Recomputes the whole computed grid"""
+        self._palette_versions = [layer.palette_version for layer in self.layers]
+        self.invalidate(0, 0, self.width, self.height)
+
+    def invalidate(self, x: int, y: int, width: int, height: int):
+        """Recompute the computed grid inside a rectangle and mark it dirty for the camera
+
+        Args:
+            x (int): X coordinate of the top left corner
+            y (int): Y coordinate of the top left corner
+            width (int): Width of the rectangle
+            height (int): Height of the rectangle
+        """
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, self.width), min(y + height, self.height)
+        if x1 <= x0 or y1 <= y0:
+            return
+        self.pool.composite(
+            [layer.pixels for layer in self.layers if layer.visible],
+            self._computed_grid.pixels,
+            (x0, y0, x1 - x0, y1 - y0),
+        )
+        self._computed_grid.version += 1
+        self.mark_dirty(x0, y0, x1 - x0, y1 - y0)
+
+    def mark_dirty(self, x: int, y: int, width: int, height: int):
+        """Grow the dirty rectangle to include `(x, y, width, height)`"""
+        self._dirty_rect = union_rect(self._dirty_rect, (x, y, width, height))
+
+    @contextmanager
+    def batch(self, label: str = "edit"):
+        """Defer compositing of writes made inside the context until it exits
+
+        Writes still land in the layers immediately, so reads see them. On exit of the
+        outermost batch, the union of touched regions is recomposited once, marked
+        dirty for the camera once and recorded as one undoable operation.
+
+        Args:
+            label (str, optional): Name of the operation in the history. Defaults to "edit".
+        """
+        if self.history is not None:
+            self.history.begin(label)
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._batch_rect is not None:
+                rect, self._batch_rect = self._batch_rect, None
+                self.invalidate(*rect)
+            if self.history is not None:
+                self.history.end()
+
+    def pop_dirty_rect(self) -> tuple[int, int, int, int] | None:
+        """Returns the region changed since the last call, clipped to the grid, or None"""
+        # Editing the palette of an indexed layer recolors all of it
+        if [layer.palette_version for layer in self.layers] != self._palette_versions:
+            self._update_computed_grid()
+
+        rect, self._dirty_rect = self._dirty_rect, None
+        if rect is None:
+            return None
+        x, y, width, height = rect
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, self.width), min(y + height, self.height)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return (x0, y0, x1 - x0, y1 - y0)
 
     def _compute_cell(self, x: int, y: int) -> RGBA:
         """Internal Method, Stack all RGBA values from all layers at `(x,y)` and return computed RGBA value
@@ -98,9 +354,13 @@ class ComputedLayeredGrid:
             RGBA: stacked RGBA value of all layers at `(x,y)`
         """
         cells = [
-            self.layers[i][x, y].value
-            for i in reversed(range(len(self.layers)))
-            if self.layers[i][x, y].value[3] > 0
+            value
+            for value in (
+                tuple(self.layers[i].pixels[y, x].tolist())
+                for i in reversed(range(len(self.layers)))
+                if self.layers[i].visible
+            )
+            if value[3] > 0
         ]
 
         if not cells:
@@ -118,7 +378,7 @@ class ComputedLayeredGrid:
         return self._computed_grid
 
     def get_computed_grid_cells(self) -> list[list[Cell]]:
-        """Returns the cells in list[list[Cell]] format"""
+        """Returns the cells in list[list[Cell]] format, built on every call"""
         return self._computed_grid.cells
 
     def __getitem__(self, index: tuple[int, int, int]):
@@ -147,12 +407,40 @@ class ComputedLayeredGrid:
             and 0 <= y < self.height
             and 0 <= layer < len(self.layers)
         ):
+            if self.history is not None:
+                self.history.touch(layer, x, y)
             self.layers[layer][x, y] = value
+            if self.journal is not None:
+                self.journal.touch(layer, x, y)
+            if self._batch_depth > 0:
+                self._batch_rect = union_rect(self._batch_rect, (x, y, 1, 1))
+                return
             computed_cell = self._compute_cell(x, y)
             if self._computed_grid[x, y].value != computed_cell:
                 self._computed_grid[x, y] = computed_cell
+                self.mark_dirty(x, y, 1, 1)
         return
 
+    def write_rect(self, layer: int, x: int, y: int, pixels: np.ndarray):
+        """Write a (height, width, 4) RGBA array into a layer at `(x,y)` and recomposite it once
+
+        Args:
+            layer (int): Layer to write to
+            x (int): X coordinate of the top left corner
+            y (int): Y coordinate of the top left corner
+            pixels (np.ndarray): RGBA values to write, must fit inside the grid
+        """
+        height, width = pixels.shape[:2]
+        if self.history is not None:
+            self.history.touch_rect(layer, x, y, width, height)
+        self.layers[layer].write_rect(x, y, pixels)
+        if self.journal is not None:
+            self.journal.touch_rect(layer, x, y, width, height)
+        if self._batch_depth > 0:
+            self._batch_rect = union_rect(self._batch_rect, (x, y, width, height))
+            return
+        self.invalidate(x, y, width, height)
+
     def clear(self, value: RGBA = (0, 0, 0, 0), layer: int = -1):
         """Clear the grid or a specific layer by setting all cells to the default value
 
@@ -165,12 +453,23 @@ class ComputedLayeredGrid:
         """
         if layer == -1:
             # Clear all layers
-            for l in self.layers:
+            for i, l in enumerate(self.layers):
+                if self.history is not None:
+                    self.history.touch_rect(i, 0, 0, self.width, self.height)
                 l.clear(value)
+                if self.journal is not None:
+                    self.journal.touch_rect(i, 0, 0, self.width, self.height)
         else:
             # Clear specific layer
             if 0 <= layer < len(self.layers):
+                if self.history is not None:
+                    self.history.touch_rect(layer, 0, 0, self.width, self.height)
                 self.layers[layer].clear(value)
+                if self.journal is not None:
+                    self.journal.touch_rect(layer, 0, 0, self.width, self.height)
             else:
                 return
+        if self._batch_depth > 0:
+            self._batch_rect = (0, 0, self.width, self.height)
+            return
         self._update_computed_grid()
@@ -1,6 +1,13 @@
 from numbers import Number
 from typing import Iterable
+import math
 import numpy as np
+from .ColorArrays import (
+    pack_rgb,
+    hsv_to_rgb_array,
+    rgba_to_hsva_array,
+    rgba_to_rgb_array,
+)
 from .Types import RGB, RGBA, HSV
 from collections import deque
 
@@ -79,15 +86,7 @@ def rgba_to_rgb(rgba: RGBA, background: RGB = (255, 255, 255)) -> RGB:
     Returns:
         RGB: The RGB color resulting from the conversion
     """
-    r, g, b, a = rgba
-    alpha = a / 255.0
-    inv_alpha = 1 - alpha
-
-    r_out = int(r * alpha + background[0] * inv_alpha + 0.5)
-    g_out = int(g * alpha + background[1] * inv_alpha + 0.5)
-    b_out = int(b * alpha + background[2] * inv_alpha + 0.5)
-
-    return (r_out, g_out, b_out)
+    return tuple(rgba_to_rgb_array(rgba, background).tolist())
 
 
 def rgb_to_packedint(rgb: RGB) -> int:
@@ -99,7 +98,7 @@ def rgb_to_packedint(rgb: RGB) -> int:
     Returns:
         int: Packed integer representation of the RGB color
     """
-    return (rgb[0] << 16) | (rgb[1] << 8) | rgb[2]
+    return int(pack_rgb(rgb))
 
 
 def rgb_to_hex(rgb: RGB | RGBA) -> str:
@@ -125,27 +124,7 @@ def hsva_to_rgba(hsv: HSV, a: int) -> RGBA:
         RGBA: Color in RGBA format
     """
     h, s, v = hsv
-    s /= 100.0
-    v /= 100.0
-
-    c = v * s
-    x = c * (1 - abs((h / 60) % 2 - 1))
-    m = v - c
-
-    if 0 <= h < 60:
-        r, g, b = c, x, 0
-    elif 60 <= h < 120:
-        r, g, b = x, c, 0
-    elif 120 <= h < 180:
-        r, g, b = 0, c, x
-    elif 180 <= h < 240:
-        r, g, b = 0, x, c
-    elif 240 <= h < 300:
-        r, g, b = x, 0, c
-    else:  # 300 <= h < 360
-        r, g, b = c, 0, x
-
-    return (round((r + m) * 255), round((g + m) * 255), round((b + m) * 255), a)
+    return (*hsv_to_rgb_array(h, s, v).tolist(), a)
 
 
 def rgba_to_hsva(rgba: RGBA) -> HSV:
@@ -157,28 +136,7 @@ def rgba_to_hsva(rgba: RGBA) -> HSV:
     Returns:
         HSV: Color in HSV format (Hue:0-360, Saturation:0-100, Value:0-100)
     """
-    r, g, b, a = rgba
-    r /= 255.0
-    g /= 255.0
-    b /= 255.0
-
-    mx = max(r, g, b)
-    mn = min(r, g, b)
-    diff = mx - mn
-
-    if diff == 0:
-        h = 0
-    elif mx == r:
-        h = (60 * ((g - b) / diff) + 360) % 360
-    elif mx == g:
-        h = (60 * ((b - r) / diff) + 120) % 360
-    else:  # mx == b
-        h = (60 * ((r - g) / diff) + 240) % 360
-
-    s = 0 if mx == 0 else (diff / mx) * 100
-    v = mx * 100
-
-    return (int(h), int(s), int(v))
+    return tuple(rgba_to_hsva_array(rgba).tolist())
 
 
 def color_diff(c1: RGBA, c2: RGBA) -> float:
@@ -187,12 +145,26 @@ def color_diff(c1: RGBA, c2: RGBA) -> float:
         c1 (RGBA): First color
         c2 (RGBA): Second color
     """
-    return np.sqrt(
-        (c1[0] - c2[0]) ** 2
-        + (c1[1] - c2[1]) ** 2
-        + (c1[2] - c2[2]) ** 2
-        + (c1[3] - c2[3]) ** 2
-    )
+    return math.dist(c1, c2)
+
+
+def union_rect(
+    a: tuple[int, int, int, int] | None, b: tuple[int, int, int, int]
+) -> tuple[int, int, int, int]:
+    """Smallest rectangle containing both rectangles
+
+    Args:
+        a (tuple[int, int, int, int] | None): First rectangle (x, y, width, height), or None
+        b (tuple[int, int, int, int]): Second rectangle (x, y, width, height)
+
+    Returns:
+        tuple[int, int, int, int]: Bounding rectangle (x, y, width, height), `b` if `a` is None
+    """
+    if a is None:
+        return b
+    x0, y0 = min(a[0], b[0]), min(a[1], b[1])
+    x1, y1 = max(a[0] + a[2], b[0] + b[2]), max(a[1] + a[3], b[1] + b[3])
+    return (x0, y0, x1 - x0, y1 - y0)
 
 
 def coords_in(inside: tuple[int, int], bounds: tuple[int, int, int, int]) -> bool:
@@ -266,32 +238,33 @@ def line(
     sy = 1 if y1 < y2 else -1
     err = dx - dy
 
-    while True:
-        if not in_grid(x1, y1, grid.width, grid.height):
-            break
+    with grid.batch("line"):
+        while True:
+            if not in_grid(x1, y1, grid.width, grid.height):
+                break
 
-        if grid_type == "ComputedLayeredGrid":
-            location = (x1, y1, layer)
-        else:
-            location = (x1, y1)
+            if grid_type == "ComputedLayeredGrid":
+                location = (x1, y1, layer)
+            else:
+                location = (x1, y1)
 
-        grid[location] = color
-        for i in range(-radius, radius):
-            for j in range(-radius, radius):
-                if in_grid(x1 + i, y1 + j, grid.width, grid.height):
-                    grid[x1 + i, y1 + j] = color
+            grid[location] = color
+            for i in range(-radius, radius):
+                for j in range(-radius, radius):
+                    if in_grid(x1 + i, y1 + j, grid.width, grid.height):
+                        grid[x1 + i, y1 + j] = color
 
-        if x1 == x2 and y1 == y2:
-            break
-        err2 = err * 2
+            if x1 == x2 and y1 == y2:
+                break
+            err2 = err * 2
 
-        if err2 > -dy:
-            err -= dy
-            x1 += sx
+            if err2 > -dy:
+                err -= dy
+                x1 += sx
 
-        if err2 < dx:
-            err += dx
-            y1 += sy
+            if err2 < dx:
+                err += dx
+                y1 += sy
 
 
 def flood_fill(
@@ -328,21 +301,22 @@ def flood_fill(
     visited = [[False for _ in range(cols)] for _ in range(rows)]
     queue = deque([(x, y)])
 
-    while queue:
-        cx, cy = queue.popleft()
+    with grid.batch("fill"):
+        while queue:
+            cx, cy = queue.popleft()
 
-        if not (0 <= cx < cols and 0 <= cy < rows):
-            continue
-        if visited[cy][cx]:
-            continue
+            if not (0 <= cx < cols and 0 <= cy < rows):
+                continue
+            if visited[cy][cx]:
+                continue
 
-        cur_color = grid[cx, cy].value
+            cur_color = grid[cx, cy].value
 
-        if color_diff(cur_color, target_color) <= tolerance:
-            grid[cx, cy, layer] = color
-            visited[cy][cx] = True
+            if color_diff(cur_color, target_color) <= tolerance:
+                grid[cx, cy, layer] = color
+                visited[cy][cx] = True
 
-            queue.extend([(cx + 1, cy), (cx - 1, cy), (cx, cy + 1), (cx, cy - 1)])
+                queue.extend([(cx + 1, cy), (cx - 1, cy), (cx, cy + 1), (cx, cy - 1)])
 
 
 def chunks(l: list, batch_size: int) -> Iterable[list]:
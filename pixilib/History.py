@@ -0,0 +1,303 @@
+from collections import deque
+import zlib
+import numpy as np
+from .Grid import Grid, ComputedLayeredGrid
+from .IndexedGrid import IndexedGrid
+
+
+class TileDelta:
+    """Change of one tile of one layer, stored as a compressed XOR of before and after
+
+    XOR-ing the delta onto the tile flips it between its before and after states,
+    so the same delta is used for both undo and redo. Unchanged pixels XOR to zero,
+    which compresses to almost nothing.
+    """
+
+    def __init__(self, layer: int, rect: tuple[int, int, int, int], delta: bytes):
+        self.layer: int = layer
+        self.rect: tuple[int, int, int, int] = rect
+        self.delta: bytes = delta
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.delta)
+
+    def apply(self, grid: ComputedLayeredGrid):
+        """Flip the tile between its before and after states
+
+        Args:
+            grid (ComputedLayeredGrid): Grid the delta was recorded on
+        """
+        x, y, width, height = self.rect
+        delta = np.frombuffer(zlib.decompress(self.delta), dtype=np.uint8)
+        pixels = grid.layers[self.layer].read_rect(x, y, width, height)
+        # Written through the grid so the autosave journal sees undo and redo
+        grid.write_rect(self.layer, x, y, pixels ^ delta.reshape(pixels.shape))
+
+
+class LayerDelta:
+    """Addition of a layer, stored with the compressed pixels of the added layer
+
+    Indexed layers keep their indices and palette, so redo adds back the same kind
+    of layer rather than an RGBA copy of it.
+    """
+
+    def __init__(self, index: int, grid: Grid | IndexedGrid, level: int):
+        self.index: int = index
+        self.width: int = grid.width
+        self.height: int = grid.height
+        self.name: str = grid.name
+        self.visible: bool = grid.visible
+        if isinstance(grid, IndexedGrid):
+            self.palette = grid.palette
+            data = grid.indices
+        else:
+            self.palette = None
+            data = grid.to_array()
+        self.pixels: bytes = zlib.compress(data.tobytes(), level)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.pixels)
+
+    def undo(self, grid: ComputedLayeredGrid):
+        grid.remove_layer(self.index)
+
+    def redo(self, grid: ComputedLayeredGrid):
+        data = np.frombuffer(zlib.decompress(self.pixels), dtype=np.uint8)
+        if self.palette is not None:
+            indices = data.reshape(self.height, self.width).copy()
+            layer = IndexedGrid(self.width, self.height, self.palette, indices)
+        else:
+            layer = Grid(self.width, self.height)
+            layer.write_rect(0, 0, data.reshape(self.height, self.width, 4))
+        layer.name = self.name
+        layer.visible = self.visible
+        grid.add_layer(layer, self.index)
+
+
+class HistoryEntry:
+    """One undoable operation, e.g. a stroke, fill, clear or layer add"""
+
+    def __init__(self, label: str, deltas: list[TileDelta | LayerDelta]):
+        self.label: str = label
+        self.deltas: list[TileDelta | LayerDelta] = deltas
+        self.nbytes: int = sum(d.nbytes for d in deltas)
+
+    def __repr__(self):
+        return f"HistoryEntry({self.label}, {len(self.deltas)} deltas, {self.nbytes} bytes)"
+
+
+class History:
+    """Undo/redo history of a ComputedLayeredGrid that records changed tiles per operation
+
+    The grid calls `touch` before every write, which snapshots the tile being written
+    the first time it is touched in the current operation. `commit` diffs the snapshots
+    against the layers and stores only the tiles that changed.
+    """
+
+    def __init__(
+        self,
+        grid: ComputedLayeredGrid,
+        max_bytes: int = 64 * 1024 * 1024,
+        tile_size: int = 32,
+        compression_level: int = 1,
+    ):
+        """Create a History and attach it to `grid`
+
+        Args:
+            grid (ComputedLayeredGrid): Grid to record edits of
+            max_bytes (int, optional): Byte budget of the stored deltas, oldest entries are evicted first. Defaults to 64 MiB.
+            tile_size (int, optional): Width and height of recorded tiles. Defaults to 32.
+            compression_level (int, optional): zlib level used for deltas. Defaults to 1.
+        """
+        self.grid: ComputedLayeredGrid = grid
+        self.max_bytes: int = max_bytes
+        self.tile_size: int = tile_size
+        self.compression_level: int = compression_level
+
+        self.undo_stack: deque[HistoryEntry] = deque()
+        self.redo_stack: list[HistoryEntry] = []
+        self.nbytes: int = 0
+
+        # Open operation
+        self._label: str | None = None
+        self._depth: int = 0
+        self._before: dict[tuple[int, int, int], np.ndarray] = {}
+        self._deltas: list[TileDelta | LayerDelta] = []
+
+        # Set while undoing/redoing so replayed writes are not recorded
+        self._applying: bool = False
+
+        grid.history = self
+
+    def begin(self, label: str = "edit"):
+        """Open an operation, nested calls are merged into the outermost one
+
+        Args:
+            label (str, optional): Name of the operation. Defaults to "edit".
+        """
+        if self._depth == 0:
+            self.commit()
+            self._label = label
+        self._depth += 1
+
+    def end(self):
+        """Close an operation opened with `begin`, committing it once the outermost is closed"""
+        if self._depth == 0:
+            return
+        self._depth -= 1
+        if self._depth == 0:
+            self.commit()
+
+    def touch(self, layer: int, x: int, y: int):
+        """Snapshot the tile containing `(x,y)` on `layer` if not already snapshotted
+
+        Args:
+            layer (int): Layer index about to be written
+            x (int): X coordinate about to be written
+            y (int): Y coordinate about to be written
+        """
+        if self._applying:
+            return
+        key = (layer, x // self.tile_size, y // self.tile_size)
+        if key not in self._before:
+            self._before[key] = self.grid.layers[layer].read_rect(*self._tile_rect(key))
+
+    def touch_rect(self, layer: int, x: int, y: int, width: int, height: int):
+        """Snapshot every tile overlapping a rectangle on `layer`
+
+        Args:
+            layer (int): Layer index about to be written
+            x (int): X coordinate of the top left corner
+            y (int): Y coordinate of the top left corner
+            width (int): Width of the rectangle
+            height (int): Height of the rectangle
+        """
+        size = self.tile_size
+        for ty in range(y // size, (y + height - 1) // size + 1):
+            for tx in range(x // size, (x + width - 1) // size + 1):
+                self.touch(layer, tx * size, ty * size)
+
+    def record_layer_add(self, index: int):
+        """Record the layer just added at `index`
+
+        Args:
+            index (int): Index the layer was inserted at
+        """
+        if self._applying:
+            return
+        # Tiles touched before the add would be replayed onto the wrong layers
+        self.commit()
+        self._deltas.append(
+            LayerDelta(index, self.grid.layers[index], self.compression_level)
+        )
+        self._label = "add layer"
+        self.commit()
+
+    def commit(self):
+        """Store the open operation as one history entry if it changed anything"""
+        for key, before in self._before.items():
+            rect = self._tile_rect(key)
+            after = self.grid.layers[key[0]].read_rect(*rect)
+            delta = before ^ after
+            if not delta.any():
+                continue
+            self._deltas.append(
+                TileDelta(
+                    key[0],
+                    rect,
+                    zlib.compress(delta.tobytes(), self.compression_level),
+                )
+            )
+
+        if self._deltas:
+            entry = HistoryEntry(self._label or "edit", self._deltas)
+            self.undo_stack.append(entry)
+            self.nbytes += entry.nbytes
+            self._clear_redo()
+            self._evict()
+
+        self._before = {}
+        self._deltas = []
+        self._label = None
+
+    def undo(self) -> HistoryEntry | None:
+        """Undo the last operation
+
+        Returns:
+            HistoryEntry | None: The undone entry, None if there was nothing to undo
+        """
+        self._close()
+        if not self.undo_stack:
+            return None
+
+        entry = self.undo_stack.pop()
+        self._applying = True
+        try:
+            for delta in reversed(entry.deltas):
+                if isinstance(delta, LayerDelta):
+                    delta.undo(self.grid)
+                else:
+                    delta.apply(self.grid)
+        finally:
+            self._applying = False
+        self.redo_stack.append(entry)
+        return entry
+
+    def redo(self) -> HistoryEntry | None:
+        """Redo the last undone operation
+
+        Returns:
+            HistoryEntry | None: The redone entry, None if there was nothing to redo
+        """
+        self._close()
+        if not self.redo_stack:
+            return None
+
+        entry = self.redo_stack.pop()
+        self._applying = True
+        try:
+            for delta in entry.deltas:
+                if isinstance(delta, LayerDelta):
+                    delta.redo(self.grid)
+                else:
+                    delta.apply(self.grid)
+        finally:
+            self._applying = False
+        self.undo_stack.append(entry)
+        return entry
+
+    def clear(self):
+        """Drop all recorded history"""
+        self._close()
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.nbytes = 0
+
+    def _close(self):
+        """Internal Method, Commit any open operation before replaying history"""
+        self._depth = 0
+        self.commit()
+
+    def _clear_redo(self):
+        """Internal Method, Drop redo entries, which a new operation makes unreachable"""
+        for entry in self.redo_stack:
+            self.nbytes -= entry.nbytes
+        self.redo_stack.clear()
+
+    def _evict(self):
+        """Internal Method, Drop the oldest entries until the history fits its byte budget"""
+        while self.nbytes > self.max_bytes and len(self.undo_stack) > 1:
+            self.nbytes -= self.undo_stack.popleft().nbytes
+
+    def _tile_rect(self, key: tuple[int, int, int]) -> tuple[int, int, int, int]:
+        """Internal Method, Rectangle of tile `key`, clipped to the grid"""
+        _, tx, ty = key
+        x, y = tx * self.tile_size, ty * self.tile_size
+        return (
+            x,
+            y,
+            min(self.tile_size, self.grid.width - x),
+            min(self.tile_size, self.grid.height - y),
+        )
@@ -0,0 +1,192 @@
+from os import path
+import struct
+import zlib
+from typing import Iterable
+import numpy as np
+import pygame
+from pygame import Surface
+from .Grid import Grid, ComputedLayeredGrid
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Rows encoded at once when saving, before upscaling
+_PNG_BAND_ROWS = 256
+# Bands whose sampled rows deflate to more than this share of their size are stored
+# uncompressed, deflate is slow on data it barely shrinks, e.g. noise or photos
+_PNG_STORE_RATIO = 0.8
+_PNG_SAMPLE_ROWS = 8
+# Largest stored deflate block
+_DEFLATE_STORED_MAX = 0xFFFF
+
+
+def surface_to_pixels(surface: Surface) -> np.ndarray:
+    """Copy a pygame Surface into a new (height, width, 4) uint8 RGBA array
+
+    Args:
+        surface (Surface): Surface to copy, converted to 32 bit with alpha first if needed
+
+    Returns:
+        np.ndarray: RGBA pixels of the surface
+    """
+    if surface.get_bitsize() != 32 or not surface.get_flags() & pygame.SRCALPHA:
+        converted = Surface(surface.get_size(), pygame.SRCALPHA, 32)
+        converted.blit(surface, (0, 0))
+        surface = converted
+
+    width, height = surface.get_size()
+    pixels = np.empty((height, width, 4), dtype=np.uint8)
+    # surfarray views are (width, height), transposed into rows
+    pixels[..., :3] = pygame.surfarray.pixels3d(surface).transpose(1, 0, 2)
+    pixels[..., 3] = pygame.surfarray.pixels_alpha(surface).T
+    return pixels
+
+
+def pixels_to_surface(pixels: np.ndarray, scale: int = 1) -> Surface:
+    """Copy RGBA pixels into a new 32 bit pygame Surface with alpha
+
+    Args:
+        pixels (np.ndarray): (height, width, 4) uint8 RGBA pixels
+        scale (int, optional): Integer nearest neighbour upscaling. Defaults to 1.
+
+    Returns:
+        Surface: The surface, `scale` times the size of `pixels`
+    """
+    height, width = pixels.shape[:2]
+    surface = Surface((width, height), pygame.SRCALPHA, 32)
+    view = pygame.surfarray.pixels3d(surface)
+    view[...] = pixels[..., :3].transpose(1, 0, 2)
+    del view
+    alpha = pygame.surfarray.pixels_alpha(surface)
+    alpha[...] = pixels[..., 3].T
+    del alpha
+    if scale != 1:
+        surface = pygame.transform.scale(surface, (width * scale, height * scale))
+    return surface
+
+
+def load_png(file_path: str) -> Grid:
+    """Load a PNG, or any image pygame reads, into a new layer named after the file
+
+    Args:
+        file_path (str): Path of the image
+
+    Returns:
+        Grid: The loaded layer
+    """
+    pixels = surface_to_pixels(pygame.image.load(file_path))
+    height, width = pixels.shape[:2]
+    grid = Grid(width, height, pixels=pixels)
+    grid.name = path.splitext(path.basename(file_path))[0]
+    return grid
+
+
+def _write_png_chunk(file, tag: bytes, data: bytes):
+    """Internal Method, Write one PNG chunk with its length and CRC"""
+    file.write(struct.pack(">I", len(data)))
+    file.write(tag)
+    file.write(data)
+    file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(tag))))
+
+
+def _deflate_band(rows: np.ndarray, level: int) -> bytes:
+    """Internal Method, Encode rows as non final raw deflate blocks, ending byte aligned
+
+    A few sampled rows are deflated first, and the band is stored as it is if they
+    shrink by less than a fifth. The blocks of every band start afresh, so stored and deflated
+    bands can follow each other in one stream.
+    """
+    if level > 0:
+        step = max(1, len(rows) // _PNG_SAMPLE_ROWS)
+        sample = np.ascontiguousarray(rows[::step][:_PNG_SAMPLE_ROWS])
+        if len(zlib.compress(sample, 1)) < sample.nbytes * _PNG_STORE_RATIO:
+            deflate = zlib.compressobj(level, zlib.DEFLATED, -15)
+            return deflate.compress(rows) + deflate.flush(zlib.Z_SYNC_FLUSH)
+
+    data = memoryview(rows).cast("B")
+    blocks = []
+    for start in range(0, len(data), _DEFLATE_STORED_MAX):
+        block = data[start : start + _DEFLATE_STORED_MAX]
+        blocks.append(struct.pack("<BHH", 0, len(block), len(block) ^ 0xFFFF))
+        blocks.append(block)
+    return b"".join(blocks)
+
+
+def write_png(
+    file, width: int, height: int, bands: Iterable[np.ndarray], level: int = 1
+):
+    """Write an RGBA PNG into an open file from bands of rows, deflating each as it comes
+
+    Bands that do not compress are stored instead, so noisy images cost little more
+    to write than flat ones.
+
+    Args:
+        file: Binary file to write to
+        width (int): Width of the image
+        height (int): Height of the image
+        bands (Iterable[np.ndarray]): (rows, width, 4) uint8 RGBA bands, top to bottom, `height` rows in total
+        level (int, optional): Deflate level from 0 to 9, 1 is fastest and 0 stores every band. Defaults to 1.
+    """
+    file.write(PNG_SIGNATURE)
+    # 8 bits per channel RGBA, no interlacing
+    _write_png_chunk(
+        file, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    )
+
+    # The zlib stream is assembled by hand around the bands' deflate blocks
+    header = b"\x78\x01"
+    adler = zlib.adler32(b"")
+    # Every row starts with its filter type, 0 for none
+    rows = np.zeros((0, width * 4 + 1), dtype=np.uint8)
+    written = 0
+    for band in bands:
+        count = band.shape[0]
+        if band.shape[1] != width or written + count > height:
+            raise ValueError("Band does not fit the image")
+        if rows.shape[0] < count:
+            rows = np.zeros((count, width * 4 + 1), dtype=np.uint8)
+        rows[:count, 1:] = band.reshape(count, -1)
+        adler = zlib.adler32(rows[:count], adler)
+        _write_png_chunk(file, b"IDAT", header + _deflate_band(rows[:count], level))
+        header = b""
+        written += count
+    if written != height:
+        raise ValueError(f"Only {written} of {height} rows were written")
+    # Empty final stored block, then the checksum of the rows
+    _write_png_chunk(
+        file, b"IDAT", header + b"\x01\x00\x00\xff\xff" + struct.pack(">I", adler)
+    )
+    _write_png_chunk(file, b"IEND", b"")
+
+
+def save_png(
+    source: Grid | ComputedLayeredGrid,
+    file_path: str,
+    scale: int = 1,
+    level: int = 1,
+):
+    """Save a layer, or the composite of a grid, as an RGBA PNG
+
+    Rows are upscaled and deflated a band at a time straight from the layer, so
+    memory stays bounded however large the image or the scale.
+
+    Args:
+        source (Grid | ComputedLayeredGrid): Layer to save, or grid whose composite is saved
+        file_path (str): Path of the PNG
+        scale (int, optional): Integer nearest neighbour upscaling. Defaults to 1.
+        level (int, optional): Deflate level from 0 to 9, 1 is fastest. Defaults to 1.
+    """
+    if isinstance(source, ComputedLayeredGrid):
+        source = source.get_computed_grid()
+    if scale < 1:
+        raise ValueError("Scale must be a positive integer")
+
+    def bands():
+        for y in range(0, source.height, _PNG_BAND_ROWS):
+            count = min(_PNG_BAND_ROWS, source.height - y)
+            band = source.read_rect(0, y, source.width, count)
+            if scale != 1:
+                band = band.repeat(scale, axis=0).repeat(scale, axis=1)
+            yield band
+
+    with open(file_path, "wb") as file:
+        write_png(file, source.width * scale, source.height * scale, bands(), level)
@@ -0,0 +1,310 @@
+import numpy as np
+from .Cell import Cell
+from .Color import Palette
+from .ColorArrays import color_diff_sq_array, pack_rgba, unpack_rgba
+from .ColorUsage import IndexUsage
+from .Grid import Grid
+from .Remap import PaletteRemapper
+from .Types import RGBA
+
+# Index of the fully transparent entry every indexed grid has before its palette
+TRANSPARENT_INDEX = 0
+# Palette colors an index can address after the transparent entry
+MAX_PALETTE_COLORS = 255
+
+
+def _check_palette(palette: Palette):
+    """Internal Method, Check every palette color fits in a uint8 index"""
+    if len(palette.colors) > MAX_PALETTE_COLORS:
+        raise ValueError("Indexed grids support at most 255 palette colors")
+
+
+class IndexedPixels:
+    """Read only (height, width, 4) RGBA view of an IndexedGrid
+
+    Indexing expands only the requested cells through the grid's lookup table, so
+    compositing an indexed layer tile by tile never builds its full RGBA array.
+    """
+
+    def __init__(self, grid: "IndexedGrid"):
+        self.grid: IndexedGrid = grid
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return (self.grid.height, self.grid.width, 4)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(np.uint8)
+
+    @property
+    def ndim(self) -> int:
+        return 3
+
+    def __getitem__(self, key) -> np.ndarray:
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > 2 or any(k is Ellipsis for k in key):
+            return self.grid.to_array()[key]
+        return self.grid.lut[self.grid.indices[key]]
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        array = self.grid.to_array()
+        return array if dtype is None else array.astype(dtype)
+
+    def copy(self) -> np.ndarray:
+        return self.grid.to_array()
+
+    def tolist(self) -> list:
+        return self.grid.to_array().tolist()
+
+
+class IndexedGrid(Grid):
+    """Grid storing one uint8 palette index per cell instead of an RGBA value
+
+    Index 0 is transparent and index `i + 1` is color `i` of the palette, so up to 255
+    colors are supported. Cells are rendered through a 256 entry RGBA lookup table
+    built from the palette, which is rebuilt whenever the palette changes, so editing
+    or swapping the palette recolors the whole grid at the cost of the palette size.
+
+    Written RGBA values are snapped to the nearest palette color.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        palette: Palette,
+        indices: np.ndarray = None,
+    ):
+        """Create an IndexedGrid
+
+        Args:
+            width (int): Width of the grid
+            height (int): Height of the grid
+            palette (Palette): Palette the indices refer to, at most 255 colors
+            indices (np.ndarray, optional): (height, width) uint8 array to use as storage. Defaults to all transparent.
+        """
+        self.width = width
+        self.height = height
+        if indices is None:
+            indices = np.full((height, width), TRANSPARENT_INDEX, dtype=np.uint8)
+        elif indices.shape != (height, width) or indices.dtype != np.uint8:
+            raise ValueError("Index array dimensions do not match")
+        self.indices: np.ndarray = indices
+
+        _check_palette(palette)
+        self.palette: Palette = palette
+        self._lut: np.ndarray = np.zeros((256, 4), dtype=np.uint8)
+        self._lut_version: tuple[int, int] | None = None
+
+        # Bumped on every write and recolor, used to invalidate caches built from this grid
+        self.version: int = 0
+
+        # Index counts, built on first use of `usage` and then updated by writes
+        self._usage: IndexUsage | None = None
+
+        # Layer properties, hidden layers are left out of the composite
+        self.name: str = ""
+        self.visible: bool = True
+
+    @classmethod
+    def from_grid(cls, grid: Grid, palette: Palette) -> "IndexedGrid":
+        """Convert an RGBA grid to an indexed one, snapping it to the nearest palette colors
+
+        Args:
+            grid (Grid): Grid to convert
+            palette (Palette): Palette to index into
+
+        Returns:
+            IndexedGrid: The converted grid, fully transparent cells stay transparent
+        """
+        _check_palette(palette)
+        pixels = grid.to_array()
+        indices = PaletteRemapper(palette).nearest(pixels).astype(np.uint8) + 1
+        indices[pixels[..., 3] == 0] = TRANSPARENT_INDEX
+        return cls(grid.width, grid.height, palette, indices)
+
+    # region Palette
+    @property
+    def lut(self) -> np.ndarray:
+        """(256, 4) uint8 RGBA value of every index, rebuilt if the palette changed
+
+        Tile workers and the autosave thread read through the table, so a rebuilt one
+        is filled before it replaces the old one and readers never see it half built.
+        """
+        version = self.palette_version
+        if self._lut_version != version:
+            colors = self.palette.colors
+            _check_palette(self.palette)
+            lut = np.zeros((256, 4), dtype=np.uint8)
+            if colors:
+                lut[1 : len(colors) + 1] = [color[:4] for color in colors]
+            self._lut = lut
+            self._lut_version = version
+            self.version += 1
+        return self._lut
+
+    @property
+    def palette_version(self) -> tuple[int, int]:
+        return (id(self.palette), self.palette.version)
+
+    def set_palette(self, palette: Palette):
+        """Swap the palette, recoloring every cell without touching the indices
+
+        Args:
+            palette (Palette): New palette, at most 255 colors
+        """
+        _check_palette(palette)
+        self.palette = palette
+
+    def indices_of(self, pixels: np.ndarray) -> np.ndarray:
+        """Get the index of the nearest palette color of every RGBA value
+
+        Args:
+            pixels (np.ndarray): (..., 4) uint8 RGBA values
+
+        Returns:
+            np.ndarray: uint8 indices with the shape of `pixels` without its channel axis, transparent values map to 0
+        """
+        keys = pack_rgba(np.asarray(pixels, dtype=np.uint8))
+        unique, inverse = np.unique(keys, return_inverse=True)
+        colors = unpack_rgba(unique)
+
+        # Only the distinct values written are matched against the palette
+        count = len(self.palette.colors)
+        result = np.full(len(unique), TRANSPARENT_INDEX, dtype=np.uint8)
+        opaque = colors[:, 3] > 0
+        if count and opaque.any():
+            palette = self.lut[1 : count + 1]
+            distance = color_diff_sq_array(colors[opaque, None, :], palette[None])
+            result[opaque] = distance.argmin(axis=1) + 1
+        return result[inverse].reshape(keys.shape)
+
+    # endregion
+
+    @property
+    def usage(self) -> IndexUsage:
+        """Pixel count of every index, counted once and then kept up to date by writes"""
+        if self._usage is None:
+            self._usage = IndexUsage(self)
+        return self._usage
+
+    def select_color(self, color: RGBA) -> np.ndarray:
+        """Get every cell whose index maps to `color`, comparing indices only
+
+        Args:
+            color (RGBA): Color to select
+
+        Returns:
+            np.ndarray: (height, width) boolean mask of the cells of `color`
+        """
+        matches = np.nonzero((self.lut == np.asarray(color, dtype=np.uint8)).all(1))[0]
+        if self._usage is not None:
+            matches = matches[self._usage.index_counts[matches] > 0]
+        if len(matches) == 1:
+            return self.indices == matches[0]
+        return np.isin(self.indices, matches)
+
+    @property
+    def pixels(self) -> IndexedPixels:
+        """RGBA view of the grid, see IndexedPixels"""
+        return IndexedPixels(self)
+
+    @property
+    def cells(self) -> list[list[Cell]]:
+        """The grid as rows of Cells, built on every access"""
+        return [
+            [Cell(x, y, tuple(value)) for x, value in enumerate(row)]
+            for y, row in enumerate(self.to_array().tolist())
+        ]
+
+    def __getitem__(self, index: tuple[int, int]):
+        if len(index) > 2:
+            x, y, _ = index
+        else:
+            x, y = index
+
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return Cell(x, y, tuple(self.lut[self.indices[y, x]].tolist()))
+        return None
+
+    def __setitem__(self, index: tuple[int, int], value: RGBA):
+        if len(index) > 2:
+            x, y, _ = index
+        else:
+            x, y = index
+
+        if 0 <= x < self.width and 0 <= y < self.height:
+            if any(map(lambda c: c < 0 or c > 255, value)):
+                raise ValueError("Color values must be between 0 and 255")
+            index = int(self.indices_of(value))
+            if self._usage is not None:
+                self._usage.replace(int(self.indices[y, x]), index)
+            self.indices[y, x] = index
+            self.version += 1
+        return None
+
+    def clear(self, value: RGBA = (0, 0, 0, 0)):
+        """Clear the grid by setting all cells to the palette color nearest `value`"""
+        index = int(self.indices_of(value))
+        self.indices[...] = index
+        self.version += 1
+        if self._usage is not None:
+            self._usage.fill(index, self.width * self.height)
+
+    def fill_mask(self, mask: np.ndarray, value: RGBA):
+        """Set every cell where `mask` is True to the palette color nearest `value`
+
+        Args:
+            mask (np.ndarray): Boolean array of shape (height, width)
+            value (RGBA): The value to set the masked cells to
+        """
+        before = self.indices[mask] if self._usage is not None else None
+        self.indices[mask] = self.indices_of(value)
+        self.version += 1
+        if before is not None:
+            self._usage.update(before, self.indices[mask])
+
+    def to_array(self) -> np.ndarray:
+        """Returns the grid as a new (height, width, 4) uint8 RGBA array"""
+        return self.lut[self.indices]
+
+    def read_rect(self, x: int, y: int, width: int, height: int) -> np.ndarray:
+        """Expand a rectangle of cells into a new (height, width, 4) uint8 RGBA array
+
+        Args:
+            x (int): X coordinate of the top left corner
+            y (int): Y coordinate of the top left corner
+            width (int): Width of the rectangle
+            height (int): Height of the rectangle
+
+        Returns:
+            np.ndarray: RGBA values of the cells in the rectangle
+        """
+        return self.lut[self.indices[y : y + height, x : x + width]]
+
+    def write_rect(self, x: int, y: int, pixels: np.ndarray):
+        """Write a (height, width, 4) RGBA array into the cells at `(x,y)`, snapped to the palette
+
+        Args:
+            x (int): X coordinate of the top left corner
+            y (int): Y coordinate of the top left corner
+            pixels (np.ndarray): RGBA values to write
+        """
+        self.write_indices(x, y, self.indices_of(pixels))
+
+    def write_indices(self, x: int, y: int, indices: np.ndarray):
+        """Write a (height, width) uint8 array of indices into the cells at `(x,y)`
+
+        Args:
+            x (int): X coordinate of the top left corner
+            y (int): Y coordinate of the top left corner
+            indices (np.ndarray): Indices to write, 0 is transparent and `i + 1` is palette color `i`
+        """
+        region = (slice(y, y + indices.shape[0]), slice(x, x + indices.shape[1]))
+        before = self.indices[region].copy() if self._usage is not None else None
+        self.indices[region] = indices
+        self.version += 1
+        if before is not None:
+            self._usage.update(before, self.indices[region])
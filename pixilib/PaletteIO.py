@@ -0,0 +1,230 @@
+from os import path
+from typing import Callable, Iterable, Iterator
+from .Color import Palette
+from .Types import RGBA
+
+
+# region Readers
+def _components(values: list[str], number: int) -> tuple[int, ...]:
+    """Internal Method, Parse color components of line `number`, each from 0 to 255"""
+    try:
+        components = tuple(int(value) for value in values)
+    except ValueError:
+        raise ValueError(f"Invalid color on line {number}") from None
+    if not all(0 <= component <= 255 for component in components):
+        raise ValueError(f"Color component out of range 0-255 on line {number}")
+    return components
+
+
+def read_gpl(lines: Iterable[str]) -> Iterator[RGBA | str]:
+    """Parse a GIMP `.gpl` palette line by line
+
+    Args:
+        lines (Iterable[str]): Lines of the file
+
+    Yields:
+        RGBA | str: Colors of the palette, and its name as a str if the header has one
+    """
+    lines = iter(lines)
+    if next(lines, "").strip() != "GIMP Palette":
+        raise ValueError("Not a GIMP palette, missing 'GIMP Palette' header")
+
+    for number, line in enumerate(lines, 2):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("Name:"):
+            yield line[5:].strip()
+            continue
+        if line.startswith("Columns:"):
+            continue
+
+        # "R G B<tab>Color name", the name is optional
+        values = line.split(None, 3)[:3]
+        if len(values) < 3:
+            raise ValueError(f"Invalid color on line {number}")
+        yield (*_components(values, number), 255)
+
+
+def read_hex(lines: Iterable[str]) -> Iterator[RGBA]:
+    """Parse a `.hex` palette line by line, one RRGGBB or RRGGBBAA color per line
+
+    Args:
+        lines (Iterable[str]): Lines of the file
+
+    Yields:
+        RGBA: Colors of the palette
+    """
+    for line in lines:
+        line = line.strip().lstrip("#")
+        if not line or line.startswith(";"):
+            continue
+        if len(line) not in (6, 8):
+            raise ValueError(f"Invalid hex color '{line}'")
+
+        value = int(line, 16)
+        if len(line) == 6:
+            value = (value << 8) | 0xFF
+        yield (value >> 24, (value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF)
+
+
+def read_pal(lines: Iterable[str]) -> Iterator[RGBA]:
+    """Parse a JASC `.pal` palette line by line
+
+    Args:
+        lines (Iterable[str]): Lines of the file
+
+    Yields:
+        RGBA: Colors of the palette
+    """
+    lines = iter(lines)
+    if next(lines, "").strip() != "JASC-PAL":
+        raise ValueError("Not a JASC palette, missing 'JASC-PAL' header")
+    # Version and color count, the count is not trusted over the actual lines
+    next(lines, None)
+    next(lines, None)
+
+    for number, line in enumerate(lines, 4):
+        values = line.split()
+        if not values:
+            continue
+        if len(values) < 3:
+            raise ValueError(f"Invalid color on line {number}")
+        components = _components(values[:4], number)
+        yield components if len(components) == 4 else (*components, 255)
+
+
+# endregion
+
+
+# region Writers
+def write_gpl(file, name: str, colors: list[RGBA], columns: int = 0):
+    """Write a GIMP `.gpl` palette
+
+    Args:
+        file: Text file to write to
+        name (str): Name of the palette
+        colors (list[RGBA]): Colors to write, alpha is dropped
+        columns (int, optional): Columns hint for GIMP, 0 leaves it to GIMP. Defaults to 0.
+    """
+    file.write(f"GIMP Palette\nName: {name}\nColumns: {columns}\n#\n")
+    file.writelines(
+        f"{r:3d} {g:3d} {b:3d}\t#{r:02x}{g:02x}{b:02x}\n" for r, g, b, *_ in colors
+    )
+
+
+def write_hex(file, name: str, colors: list[RGBA]):
+    """Write a `.hex` palette, colors with alpha are written as RRGGBBAA
+
+    Args:
+        file: Text file to write to
+        name (str): Name of the palette, not stored by the format
+        colors (list[RGBA]): Colors to write
+    """
+    file.writelines(
+        (f"{r:02x}{g:02x}{b:02x}\n" if a == 255 else f"{r:02x}{g:02x}{b:02x}{a:02x}\n")
+        for r, g, b, a in colors
+    )
+
+
+def write_pal(file, name: str, colors: list[RGBA]):
+    """Write a JASC `.pal` palette
+
+    Args:
+        file: Text file to write to
+        name (str): Name of the palette, not stored by the format
+        colors (list[RGBA]): Colors to write, alpha is dropped
+    """
+    file.write(f"JASC-PAL\n0100\n{len(colors)}\n")
+    file.writelines(f"{r} {g} {b}\n" for r, g, b, *_ in colors)
+
+
+# endregion
+
+# Extension -> (reader, writer)
+PALETTE_FORMATS: dict[str, tuple[Callable, Callable]] = {
+    ".gpl": (read_gpl, write_gpl),
+    ".hex": (read_hex, write_hex),
+    ".pal": (read_pal, write_pal),
+}
+
+
+def _palette_format(file_path: str, format: str = None) -> tuple[Callable, Callable]:
+    """Internal Method, Get the reader and writer for a file from its extension or `format`"""
+    extension = format or path.splitext(file_path)[1]
+    extension = "." + extension.lower().lstrip(".")
+    if extension not in PALETTE_FORMATS:
+        raise ValueError(f"Unsupported palette format '{extension}'")
+    return PALETTE_FORMATS[extension]
+
+
+def read_palette(
+    file_path: str, format: str = None, dedupe: bool = True
+) -> tuple[str, list[RGBA]]:
+    """Read the name and colors of a palette file, streaming it line by line
+
+    Args:
+        file_path (str): Path of the `.gpl`, `.hex` or `.pal` file
+        format (str, optional): Format to read as, e.g. "gpl". Defaults to the file extension.
+        dedupe (bool, optional): Drop repeated colors, keeping the first. Defaults to True.
+
+    Returns:
+        tuple[str, list[RGBA]]: Name of the palette, the file name if it has none, and its colors
+    """
+    reader, _ = _palette_format(file_path, format)
+    name = path.splitext(path.basename(file_path))[0]
+    colors: list[RGBA] = []
+    seen: set[RGBA] = set()
+
+    with open(file_path, "r", encoding="utf-8-sig", errors="replace") as file:
+        for item in reader(file):
+            if isinstance(item, str):
+                name = item
+                continue
+            if dedupe:
+                if item in seen:
+                    continue
+                seen.add(item)
+            colors.append(item)
+
+    return name, colors
+
+
+def load_palette(
+    file_path: str,
+    x: int = 0,
+    y: int = 0,
+    width: int = 160,
+    cell_size: int = 20,
+    format: str = None,
+    dedupe: bool = True,
+) -> Palette:
+    """Load a palette file into a Palette, painting its atlas once
+
+    Args:
+        file_path (str): Path of the `.gpl`, `.hex` or `.pal` file
+        x (int, optional): X position of the palette. Defaults to 0.
+        y (int, optional): Y position of the palette. Defaults to 0.
+        width (int, optional): Width of the palette. Defaults to 160.
+        cell_size (int, optional): Size of each color cell in the palette. Defaults to 20.
+        format (str, optional): Format to read as, e.g. "gpl". Defaults to the file extension.
+        dedupe (bool, optional): Drop repeated colors, keeping the first. Defaults to True.
+
+    Returns:
+        Palette: The loaded palette
+    """
+    name, colors = read_palette(file_path, format, dedupe)
+    return Palette(name, colors, x, y, width, cell_size)
+
+
+def save_palette(palette: Palette, file_path: str, format: str = None):
+    """Save a Palette to a palette file
+
+    Args:
+        palette (Palette): Palette to save
+        file_path (str): Path of the `.gpl`, `.hex` or `.pal` file
+        format (str, optional): Format to write as, e.g. "gpl". Defaults to the file extension.
+    """
+    _, writer = _palette_format(file_path, format)
+    with open(file_path, "w", encoding="utf-8", newline="\n") as file:
+        writer(file, palette.name, palette.colors)
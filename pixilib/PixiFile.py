@@ -0,0 +1,1144 @@
+from enum import Enum
+from os import path
+import hashlib
+import lzma
+import mmap
+import os
+import struct
+import zlib
+from typing import Iterator
+import numpy as np
+from .Color import Palette
+from .Grid import Grid, ComputedLayeredGrid
+from .IndexedGrid import IndexedGrid, TRANSPARENT_INDEX
+
+# `.pixi` v1, see `Docs/pixi-file-spec.html`. Where the spec is ambiguous:
+# - The magic number is the 4 bytes `pixi`, the field is 4 bytes and the version
+#   follows at 0x04, so the trailing 0x0A of the documented value is not stored
+# - Integers are big endian, matching how the magic number is written
+# - Metadata is packed with no gaps, so the creator name starts at 0x18 and every
+#   later offset is 3 bytes below the documented one
+# - Palette entries are 4 byte RGBA values, so the palette is `l * 4` bytes
+# - Indexed images store one byte per pixel, an index into the palette
+# - CMYK channels are stored as bytes, 255 being full ink
+# - The checksum field holds the checksum method, then the digest padded with zeros.
+#   It covers the image data, everything after the palette, with the chunk size
+#   table of compressed files hashed last. All zeros means no checksum
+PIXI_MAGIC = b"pixi"
+PIXI_VERSION = (0, 1)
+
+# Magic, major and minor version, width, height, flags, triplet size, reserved
+_HEADER = struct.Struct(">4sHHIIBBH")
+_LENGTH = struct.Struct(">I")
+CHECKSUM_SIZE = 128
+
+# Flag bit set on compressed files, the low 4 bits hold the color mode
+FLAG_COMPRESSED = 0x10
+
+# Rows are streamed in bands of about this many bytes
+BAND_BYTES = 1 << 22
+
+# Compression method, level, reserved, tile size, ahead of the chunk index
+_COMPRESSION = struct.Struct(">BBHI")
+COMPRESSION_METHODS: dict[str, int] = {"zlib": 1, "lzma": 2}
+
+# First byte of the checksum field, CRC-32 runs at memory speed, SHA-256 resists tampering
+CHECKSUM_METHODS: dict[str, int] = {"crc32": 1, "sha256": 2}
+
+
+class PixiColorMode(Enum):
+    """
+    Enum for the color modes of the low 4 bits of the flags.
+    """
+
+    DEFAULT = 0x00
+    RGB = 0x01
+    RGBA = 0x02
+    CMYK = 0x03
+    CMYKA = 0x04
+    INDEXED = 0x05
+
+
+# Bytes per pixel of every mode, DEFAULT is RGB or RGBA by its triplet size
+TRIPLET_SIZES: dict[PixiColorMode, int] = {
+    PixiColorMode.RGB: 3,
+    PixiColorMode.RGBA: 4,
+    PixiColorMode.CMYK: 4,
+    PixiColorMode.CMYKA: 5,
+    PixiColorMode.INDEXED: 1,
+}
+
+
+class PixiHeader:
+    """Header, metadata and palette of a `.pixi` file, everything before the image data"""
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        mode: PixiColorMode = PixiColorMode.RGBA,
+        creator: str = "",
+        description: str = "",
+        tags: list[str] = None,
+        palette: np.ndarray = None,
+        compressed: bool = False,
+        checksum: bytes = bytes(CHECKSUM_SIZE),
+        version: tuple[int, int] = PIXI_VERSION,
+    ):
+        """Create a PixiHeader
+
+        Args:
+            width (int): Width of the image
+            height (int): Height of the image
+            mode (PixiColorMode, optional): Color mode of the image data. Defaults to PixiColorMode.RGBA.
+            creator (str, optional): Creator name. Defaults to "".
+            description (str, optional): Description. Defaults to "".
+            tags (list[str], optional): Tags, stored comma separated. Defaults to None.
+            palette (np.ndarray, optional): (l, 4) uint8 RGBA palette of indexed images. Defaults to None.
+            compressed (bool, optional): Whether the image data is compressed. Defaults to False.
+            checksum (bytes, optional): Checksum field, all zeros if not computed. Defaults to bytes(CHECKSUM_SIZE).
+            version (tuple[int, int], optional): Major and minor version. Defaults to PIXI_VERSION.
+        """
+        self.width: int = width
+        self.height: int = height
+        self.mode: PixiColorMode = mode
+        self.creator: str = creator
+        self.description: str = description
+        self.tags: list[str] = list(tags or [])
+        self.palette: np.ndarray = (
+            np.zeros((0, 4), dtype=np.uint8)
+            if palette is None
+            else np.asarray(palette, dtype=np.uint8).reshape(-1, 4)
+        )
+        self.compressed: bool = compressed
+        self.checksum: bytes = checksum
+        self.version: tuple[int, int] = version
+        self.triplet_size: int = TRIPLET_SIZES.get(mode, 4)
+
+    @property
+    def flags(self) -> int:
+        return self.mode.value | (FLAG_COMPRESSED if self.compressed else 0)
+
+    @property
+    def row_size(self) -> int:
+        """Bytes of one row of image data"""
+        return self.width * self.triplet_size
+
+    @property
+    def image_size(self) -> int:
+        """Bytes of the uncompressed image data"""
+        return self.height * self.row_size
+
+    @property
+    def data_offset(self) -> int:
+        """Offset of the image data from the start of the file"""
+        return len(self.to_bytes())
+
+    @property
+    def checksum_offset(self) -> int:
+        """Offset of the checksum field from the start of the file"""
+        return self.data_offset - CHECKSUM_SIZE - _LENGTH.size - self.palette.nbytes
+
+    @property
+    def checksum_method(self) -> str | None:
+        """Method of the checksum field, None if the file has no checksum
+
+        Raises:
+            ValueError: The method is unknown
+        """
+        if not self.checksum[0]:
+            return None
+        methods = {value: name for name, value in CHECKSUM_METHODS.items()}
+        if self.checksum[0] not in methods:
+            raise ValueError(f"Unknown .pixi checksum method {self.checksum[0]}")
+        return methods[self.checksum[0]]
+
+    def validate(self):
+        """Check every field against the spec
+
+        Raises:
+            ValueError: A field is out of range or does not match the color mode
+        """
+        if self.version[0] != PIXI_VERSION[0] or self.version[1] < 1:
+            raise ValueError(f"Unsupported .pixi version {self.version}")
+        if self.width <= 0 or self.height <= 0:
+            raise ValueError("Image dimensions must be positive")
+        if self.mode == PixiColorMode.DEFAULT and self.triplet_size not in (3, 4):
+            raise ValueError("Files without a color mode must be RGB or RGBA")
+        if self.mode != PixiColorMode.DEFAULT:
+            if self.triplet_size != TRIPLET_SIZES[self.mode]:
+                raise ValueError(
+                    f"Triplet size {self.triplet_size} does not match {self.mode.name}"
+                )
+        if self.mode == PixiColorMode.INDEXED:
+            if not 0 < len(self.palette) <= 256:
+                raise ValueError("Indexed images need between 1 and 256 colors")
+        elif len(self.palette):
+            raise ValueError("Only indexed images have a palette")
+        if len(self.checksum) != CHECKSUM_SIZE:
+            raise ValueError(f"Checksum must be {CHECKSUM_SIZE} bytes")
+        if any("," in tag for tag in self.tags):
+            raise ValueError("Tags cannot contain commas")
+
+    def to_bytes(self) -> bytes:
+        """Pack the header, metadata and palette"""
+        fields = [
+            _HEADER.pack(
+                PIXI_MAGIC,
+                *self.version,
+                self.width,
+                self.height,
+                self.flags,
+                self.triplet_size,
+                0,
+            )
+        ]
+        for text in (self.creator, self.description, ",".join(self.tags)):
+            encoded = text.encode("utf-8")
+            fields += [_LENGTH.pack(len(encoded)), encoded]
+        fields += [self.checksum, _LENGTH.pack(len(self.palette)), self.palette]
+        return b"".join(bytes(field) for field in fields)
+
+    @classmethod
+    def read(cls, file) -> "PixiHeader":
+        """Read and validate everything before the image data, leaving `file` at its start
+
+        Args:
+            file: Binary file positioned at the start of a `.pixi` file
+
+        Returns:
+            PixiHeader: The header
+        """
+        magic, major, minor, width, height, flags, triplet_size, _ = _HEADER.unpack(
+            _read_exact(file, _HEADER.size)
+        )
+        if magic != PIXI_MAGIC:
+            raise ValueError("Not a .pixi file, bad magic number")
+        try:
+            mode = PixiColorMode(flags & 0x0F)
+        except ValueError:
+            raise ValueError(f"Unknown .pixi color mode {flags & 0x0F:#x}") from None
+        if flags & ~(0x0F | FLAG_COMPRESSED):
+            raise ValueError(f"Unknown .pixi flags {flags:#04x}")
+
+        creator, description, tags = (
+            _read_exact(file, _LENGTH.unpack(_read_exact(file, 4))[0]).decode("utf-8")
+            for _ in range(3)
+        )
+        checksum = _read_exact(file, CHECKSUM_SIZE)
+        count = _LENGTH.unpack(_read_exact(file, 4))[0]
+        if count > 256:
+            raise ValueError("Palettes hold at most 256 colors")
+        palette = np.frombuffer(_read_exact(file, count * 4), dtype=np.uint8)
+
+        header = cls(
+            width,
+            height,
+            mode,
+            creator,
+            description,
+            tags.split(",") if tags else [],
+            palette,
+            bool(flags & FLAG_COMPRESSED),
+            checksum,
+            (major, minor),
+        )
+        header.triplet_size = triplet_size
+        header.validate()
+        return header
+
+
+# region Color conversion
+def _encode(rgba: np.ndarray, header: PixiHeader) -> np.ndarray:
+    """Internal Method, Convert (rows, width, 4) RGBA pixels to rows of image data"""
+    if header.triplet_size == 4 and header.mode in (
+        PixiColorMode.RGBA,
+        PixiColorMode.DEFAULT,
+    ):
+        return rgba
+    if header.triplet_size == 3 and header.mode in (
+        PixiColorMode.RGB,
+        PixiColorMode.DEFAULT,
+    ):
+        return rgba[..., :3]
+    if header.mode == PixiColorMode.INDEXED:
+        raise ValueError("Indexed images are written from indices, not RGBA pixels")
+
+    # CMYK from RGB, K is the darkness of the brightest channel
+    rgb = rgba[..., :3].astype(np.uint16)
+    white = rgb.max(axis=-1, keepdims=True)
+    out = np.empty(rgba.shape[:-1] + (header.triplet_size,), dtype=np.uint8)
+    out[..., 3] = 255 - white[..., 0]
+    scale = np.maximum(white, 1)
+    out[..., :3] = (white - rgb) * 255 // scale
+    if header.mode == PixiColorMode.CMYKA:
+        out[..., 4] = rgba[..., 3]
+    return out
+
+
+def _decode(data: np.ndarray, header: PixiHeader, out: np.ndarray):
+    """Internal Method, Convert rows of image data into (rows, width, 4) RGBA pixels in `out`"""
+    if header.mode == PixiColorMode.INDEXED:
+        if data[..., 0].max(initial=0) >= len(header.palette):
+            raise ValueError("Pixel index outside of the palette")
+        out[...] = header.palette[data[..., 0]]
+    elif header.triplet_size == 3:
+        out[..., :3] = data
+        out[..., 3] = 255
+    elif header.mode in (PixiColorMode.RGBA, PixiColorMode.DEFAULT):
+        out[...] = data
+    else:
+        # RGB = (255 - C) * (255 - K) / 255
+        ink = 255 - data[..., :4].astype(np.uint16)
+        out[..., :3] = (ink[..., :3] * ink[..., 3:4] + 127) // 255
+        out[..., 3] = data[..., 4] if header.mode == PixiColorMode.CMYKA else 255
+
+
+# endregion
+
+
+def _read_exact(file, size: int) -> bytes:
+    """Internal Method, Read exactly `size` bytes"""
+    data = file.read(size)
+    if len(data) != size:
+        raise ValueError("Unexpected end of .pixi file")
+    return data
+
+
+def _band_rows(row_size: int) -> int:
+    """Internal Method, Number of rows streamed at once"""
+    return max(1, BAND_BYTES // max(row_size, 1))
+
+
+class _Checksum:
+    """Running checksum of image data, fed one chunk at a time as it is streamed"""
+
+    def __init__(self, method: str):
+        if method not in CHECKSUM_METHODS:
+            raise ValueError(f"Unknown checksum '{method}'")
+        self.method: str = method
+        self._crc: int = 0
+        self._hash = hashlib.sha256() if method == "sha256" else None
+
+    def update(self, data):
+        """Add the next chunk, any buffer of bytes"""
+        if self._hash is not None:
+            self._hash.update(data)
+        else:
+            self._crc = zlib.crc32(data, self._crc)
+
+    def field(self) -> bytes:
+        """Checksum field of the data added so far"""
+        if self._hash is not None:
+            digest = self._hash.digest()
+        else:
+            digest = _LENGTH.pack(self._crc)
+        field = bytes([CHECKSUM_METHODS[self.method]]) + digest
+        return field.ljust(CHECKSUM_SIZE, b"\0")
+
+
+def _compress(data: np.ndarray, compression: str, level: int) -> bytes:
+    """Internal Method, Compress one chunk of image data"""
+    if compression == "lzma":
+        return lzma.compress(data, preset=level)
+    return zlib.compress(data, level)
+
+
+def _decompress(data: bytes, compression: str, size: int) -> bytes:
+    """Internal Method, Decompress one chunk of image data, checking its size"""
+    try:
+        if compression == "lzma":
+            data = lzma.decompress(data)
+        else:
+            data = zlib.decompress(data, bufsize=size)
+    except (zlib.error, lzma.LZMAError) as error:
+        raise ValueError(f"Corrupt .pixi chunk, {error}") from None
+    if len(data) != size:
+        raise ValueError("Corrupt .pixi chunk, wrong decompressed size")
+    return data
+
+
+class PixiWriter:
+    """Writes a `.pixi` file, the image data streamed out in bands of rows"""
+
+    # Whether the image data is written compressed
+    compressed: bool = False
+
+    def __init__(self, file, header: PixiHeader, checksum: str = "crc32"):
+        """Create a PixiWriter and write the header
+
+        Args:
+            file: Binary file to write to
+            header (PixiHeader): Header of the file, validated first
+            checksum (str, optional): "crc32" or "sha256" to hash the image data as it is written and patch the checksum field on `close`, None for no checksum. Skipped if `file` is not seekable. Defaults to "crc32".
+        """
+        header.validate()
+        if header.compressed and not self.compressed:
+            raise ValueError(
+                "Compressed .pixi files are written by CompressedPixiWriter"
+            )
+        self.file = file
+        self.header: PixiHeader = header
+        self.rows_written: int = 0
+
+        self._checksum: _Checksum | None = None
+        if checksum and file.seekable():
+            self._checksum = _Checksum(checksum)
+            self._start: int = file.tell()
+        header.checksum = bytes(CHECKSUM_SIZE)
+        file.write(header.to_bytes())
+
+    def write_rows(self, pixels: np.ndarray):
+        """Write the next rows of the image
+
+        Args:
+            pixels (np.ndarray): (rows, width, 4) uint8 RGBA pixels, or (rows, width) uint8 palette indices for indexed images
+        """
+        pixels = np.asarray(pixels, dtype=np.uint8)
+        if pixels.shape[1] != self.header.width:
+            raise ValueError("Row width does not match the image")
+        if self.rows_written + pixels.shape[0] > self.header.height:
+            raise ValueError("More rows written than the image height")
+
+        if self.header.mode == PixiColorMode.INDEXED:
+            if pixels.ndim != 2:
+                raise ValueError(
+                    "Indexed images are written from (rows, width) indices"
+                )
+            if pixels.max(initial=0) >= len(self.header.palette):
+                raise ValueError("Pixel index outside of the palette")
+            data = pixels
+        else:
+            data = _encode(pixels, self.header)
+        self._write_data(data.reshape(pixels.shape[:2] + (-1,)))
+        self.rows_written += pixels.shape[0]
+
+    def _write_data(self, data: np.ndarray):
+        """Internal Method, Write (rows, width, triplet size) rows of image data"""
+        self._write(np.ascontiguousarray(data).data)
+
+    def _write(self, data):
+        """Internal Method, Write and hash bytes of image data"""
+        if self._checksum is not None:
+            self._checksum.update(data)
+        self.file.write(data)
+
+    def close(self):
+        """Check every row was written, then patch in the checksum
+
+        Raises:
+            ValueError: Fewer rows were written than the image height
+        """
+        if self.rows_written != self.header.height:
+            raise ValueError(
+                f"Only {self.rows_written} of {self.header.height} rows were written"
+            )
+        if self._checksum is not None:
+            self.header.checksum = self._checksum.field()
+            end = self.file.tell()
+            self.file.seek(self._start + self.header.checksum_offset)
+            self.file.write(self.header.checksum)
+            self.file.seek(end)
+            self._checksum = None
+
+    def __enter__(self) -> "PixiWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+class PixiReader:
+    """Reads a `.pixi` file, the image data streamed in bands of rows or read by region"""
+
+    # Whether the image data is read compressed
+    compressed: bool = False
+
+    def __init__(self, file, header: PixiHeader = None, verify: bool = True):
+        """Create a PixiReader and read the header
+
+        Args:
+            file: Binary file positioned at the start of a `.pixi` file, or after `header`
+            header (PixiHeader, optional): Header already read from `file`. Defaults to reading it.
+            verify (bool, optional): Hash the image data as it is streamed and check it against the checksum field once the last row is read. False opens faster, trusting the data. Defaults to True.
+        """
+        self.file = file
+        self.header: PixiHeader = header or PixiHeader.read(file)
+        if self.header.compressed and not self.compressed:
+            raise ValueError("Compressed .pixi files are read by CompressedPixiReader")
+        self.rows_read: int = 0
+        self._data_offset: int = file.tell()
+        # Set when random access moved the file, streaming seeks back before reading
+        self._moved: bool = False
+
+        self._checksum: _Checksum | None = None
+        if verify and self.header.checksum_method:
+            self._checksum = _Checksum(self.header.checksum_method)
+
+    def read_raw_into(self, out: np.ndarray):
+        """Read the next rows of image data as stored, without conversion
+
+        Args:
+            out (np.ndarray): (rows, width, triplet size) uint8 C contiguous array to fill
+        """
+        if self.rows_read + out.shape[0] > self.header.height:
+            raise ValueError("More rows read than the image height")
+        if self._moved:
+            self.file.seek(self._data_offset + self.rows_read * self.header.row_size)
+            self._moved = False
+        view = memoryview(out).cast("B")
+        if self.file.readinto(view) != len(view):
+            raise ValueError("Unexpected end of .pixi file")
+        self.rows_read += out.shape[0]
+        if self._checksum is not None:
+            self._checksum.update(view)
+            if self.rows_read == self.header.height:
+                self._verify()
+
+    def _verify(self):
+        """Internal Method, Check the hashed image data against the checksum field"""
+        field, self._checksum = self._checksum.field(), None
+        if field != self.header.checksum:
+            raise ValueError("Corrupt .pixi file, checksum does not match")
+
+    def read_into(self, out: np.ndarray, buffer: np.ndarray = None):
+        """Read the next rows into RGBA pixels
+
+        Args:
+            out (np.ndarray): (rows, width, 4) uint8 array to fill, e.g. a slice of a layer's pixels
+            buffer (np.ndarray, optional): (rows, width, triplet size) uint8 scratch array for modes other than RGBA. Defaults to a new one.
+        """
+        header = self.header
+        if header.triplet_size == 4 and header.mode in (
+            PixiColorMode.RGBA,
+            PixiColorMode.DEFAULT,
+        ):
+            if out.flags.c_contiguous:
+                self.read_raw_into(out)
+                return
+        shape = (out.shape[0], header.width, header.triplet_size)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+        self.read_raw_into(buffer)
+        _decode(buffer, header, out)
+
+    def read_raw_rect(self, x: int, y: int, width: int, height: int) -> np.ndarray:
+        """Read a rectangle of image data as stored, seeking to each of its rows
+
+        Args:
+            x (int): X coordinate of the top left corner
+            y (int): Y coordinate of the top left corner
+            width (int): Width of the rectangle
+            height (int): Height of the rectangle
+
+        Returns:
+            np.ndarray: (height, width, triplet size) uint8 image data
+        """
+        header = self.header
+        if x < 0 or y < 0 or x + width > header.width or y + height > header.height:
+            raise ValueError("Rectangle outside of the image")
+        out = np.empty((height, width, header.triplet_size), dtype=np.uint8)
+        self._moved = True
+        for row in range(height):
+            offset = (y + row) * header.row_size + x * header.triplet_size
+            self.file.seek(self._data_offset + offset)
+            if self.file.readinto(memoryview(out[row]).cast("B")) != out[row].nbytes:
+                raise ValueError("Unexpected end of .pixi file")
+        return out
+
+    def read_rect(self, x: int, y: int, width: int, height: int) -> np.ndarray:
+        """Read a rectangle of the image as RGBA pixels, without reading the rest
+
+        Args:
+            x (int): X coordinate of the top left corner
+            y (int): Y coordinate of the top left corner
+            width (int): Width of the rectangle
+            height (int): Height of the rectangle
+
+        Returns:
+            np.ndarray: (height, width, 4) uint8 RGBA pixels
+        """
+        out = np.empty((height, width, 4), dtype=np.uint8)
+        _decode(self.read_raw_rect(x, y, width, height), self.header, out)
+        return out
+
+    def read_raw_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Read chosen rows of image data as stored, seeking to each of them
+
+        Args:
+            rows (np.ndarray): Y coordinates of the rows, ascending reads fastest
+
+        Returns:
+            np.ndarray: (len(rows), width, triplet size) uint8 image data
+        """
+        header = self.header
+        rows = self._check_rows(rows)
+        out = np.empty((len(rows), header.width, header.triplet_size), dtype=np.uint8)
+        self._moved = True
+        for index, y in enumerate(rows.tolist()):
+            self.file.seek(self._data_offset + y * header.row_size)
+            if self.file.readinto(memoryview(out[index]).cast("B")) != header.row_size:
+                raise ValueError("Unexpected end of .pixi file")
+        return out
+
+    def _check_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Internal Method, Check row coordinates are inside the image"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) and (rows.min() < 0 or rows.max() >= self.header.height):
+            raise ValueError("Row outside of the image")
+        return rows
+
+    def sample(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        """Read the pixels where `rows` and `columns` cross, reading only those rows
+
+        Sampling evenly spaced rows and columns downsamples the image by nearest
+        neighbour without reading all of it, e.g. for previews.
+
+        Args:
+            rows (np.ndarray): Y coordinates to sample, ascending reads fastest
+            columns (np.ndarray): X coordinates to sample
+
+        Returns:
+            np.ndarray: (len(rows), len(columns), 4) uint8 RGBA pixels
+        """
+        raw = self.read_raw_rows(rows)[:, columns]
+        out = np.empty(raw.shape[:2] + (4,), dtype=np.uint8)
+        _decode(raw, self.header, out)
+        return out
+
+    def bands(self, rows: int = None) -> Iterator[tuple[int, np.ndarray]]:
+        """Read the remaining rows as RGBA bands, the same array is reused for every band
+
+        Args:
+            rows (int, optional): Rows per band. Defaults to about 4 MiB of pixels.
+
+        Yields:
+            tuple[int, np.ndarray]: Y coordinate of the band and its (rows, width, 4) uint8 pixels
+        """
+        header = self.header
+        rows = rows or _band_rows(header.width * 4)
+        pixels = np.empty((rows, header.width, 4), dtype=np.uint8)
+        buffer = np.empty((rows, header.width, header.triplet_size), dtype=np.uint8)
+        while self.rows_read < header.height:
+            y = self.rows_read
+            count = min(rows, header.height - y)
+            self.read_into(pixels[:count], buffer[:count])
+            yield y, pixels[:count]
+
+
+class CompressedPixiWriter(PixiWriter):
+    """Writes a compressed `.pixi` file, the image split into independently compressed tiles
+
+    After the palette come the compression method, level and tile size, then the
+    compressed size of every tile in row major order, then the tiles. Each tile is
+    its rows of image data as stored uncompressed, so any region is decoded from
+    only the tiles it overlaps. The size table is patched in on `close`, so `file`
+    must be seekable.
+    """
+
+    compressed = True
+
+    def __init__(
+        self,
+        file,
+        header: PixiHeader,
+        compression: str = "zlib",
+        level: int = 6,
+        tile_size: int = 256,
+        checksum: str = "crc32",
+    ):
+        """Create a CompressedPixiWriter and write the header
+
+        Args:
+            file: Seekable binary file to write to
+            header (PixiHeader): Header of the file, marked compressed and validated first
+            compression (str, optional): "zlib", or "lzma" for smaller and slower. Defaults to "zlib".
+            level (int, optional): Compression level from 0 to 9. Defaults to 6.
+            tile_size (int, optional): Width and height of the tiles. Defaults to 256.
+            checksum (str, optional): "crc32" or "sha256" to hash the compressed data as it is written, None for no checksum. Defaults to "crc32".
+        """
+        if compression not in COMPRESSION_METHODS:
+            raise ValueError(f"Unknown compression '{compression}'")
+        if not 0 <= level <= 9:
+            raise ValueError("Compression level must be between 0 and 9")
+        if tile_size <= 0:
+            raise ValueError("Tile size must be positive")
+
+        header.compressed = True
+        super().__init__(file, header, checksum)
+        self.compression: str = compression
+        self.level: int = level
+        self.tile_size: int = tile_size
+
+        columns = -(-header.width // tile_size)
+        rows = -(-header.height // tile_size)
+        self._write(
+            _COMPRESSION.pack(COMPRESSION_METHODS[compression], level, 0, tile_size)
+        )
+        self._index_offset: int = file.tell()
+        self.sizes: np.ndarray = np.zeros(columns * rows, dtype=">u4")
+        file.write(self.sizes.tobytes())
+
+        # One row of tiles is gathered before it is compressed
+        self._band: np.ndarray = np.empty(
+            (min(tile_size, header.height), header.width, header.triplet_size),
+            dtype=np.uint8,
+        )
+        self._band_rows: int = 0
+        self._tiles_written: int = 0
+
+    def _write_data(self, data: np.ndarray):
+        """Internal Method, Gather rows into the current row of tiles"""
+        while len(data):
+            count = min(len(data), len(self._band) - self._band_rows)
+            self._band[self._band_rows : self._band_rows + count] = data[:count]
+            self._band_rows += count
+            data = data[count:]
+            if self._band_rows == len(self._band):
+                self._flush()
+
+    def _flush(self):
+        """Internal Method, Compress and write the gathered row of tiles"""
+        band = self._band[: self._band_rows]
+        for x in range(0, self.header.width, self.tile_size):
+            tile = np.ascontiguousarray(band[:, x : x + self.tile_size])
+            chunk = _compress(tile, self.compression, self.level)
+            self.sizes[self._tiles_written] = len(chunk)
+            self._tiles_written += 1
+            self._write(chunk)
+        self._band_rows = 0
+
+    def close(self):
+        """Compress the last tiles, write the size table, check every row was written and patch in the checksum
+
+        The compressed tiles are hashed as they are written and the size table last,
+        so the file is never read back.
+        """
+        if self._band_rows:
+            self._flush()
+        sizes = self.sizes.tobytes()
+        if self._checksum is not None:
+            self._checksum.update(sizes)
+        end = self.file.tell()
+        self.file.seek(self._index_offset)
+        self.file.write(sizes)
+        self.file.seek(end)
+        super().close()
+
+
+class CompressedPixiReader(PixiReader):
+    """Reads a compressed `.pixi` file, decompressing only the tiles that are read
+
+    Streaming keeps one decompressed row of tiles, regions decompress only the tiles
+    they overlap. `file` must be seekable.
+    """
+
+    compressed = True
+
+    def __init__(self, file, header: PixiHeader = None, verify: bool = True):
+        """Create a CompressedPixiReader and read the header and the chunk index
+
+        Args:
+            file: Seekable binary file positioned at the start of a `.pixi` file, or after `header`
+            header (PixiHeader, optional): Header already read from `file`. Defaults to reading it.
+            verify (bool, optional): Hash the tiles as they are streamed in order and check them against the checksum field once the last row is read. Defaults to True.
+        """
+        super().__init__(file, header, verify)
+        compression = _read_exact(file, _COMPRESSION.size)
+        method, level, _, tile_size = _COMPRESSION.unpack(compression)
+        methods = {value: name for name, value in COMPRESSION_METHODS.items()}
+        if method not in methods:
+            raise ValueError(f"Unknown .pixi compression method {method}")
+        if tile_size <= 0:
+            raise ValueError("Tile size must be positive")
+        self.compression: str = methods[method]
+        self.level: int = level
+        self.tile_size: int = tile_size
+        self.columns: int = -(-self.header.width // tile_size)
+
+        count = self.columns * -(-self.header.height // tile_size)
+        self._sizes: bytes = _read_exact(file, count * 4)
+        sizes = np.frombuffer(self._sizes, dtype=">u4")
+        # Start of every tile, and the end of the last one
+        self.offsets: np.ndarray = np.concatenate(
+            ([0], np.cumsum(sizes, dtype=np.int64))
+        )
+        self.offsets += file.tell()
+
+        self._tile_row: tuple[int, np.ndarray] | None = None
+
+        # Tiles are hashed only when read in file order, this is the next one
+        self._next_hashed: int = 0
+        if self._checksum is not None:
+            self._checksum.update(compression)
+
+    def read_tile(self, column: int, row: int) -> np.ndarray:
+        """Decompress one tile
+
+        Args:
+            column (int): Column of the tile
+            row (int): Row of the tile
+
+        Returns:
+            np.ndarray: (height, width, triplet size) uint8 image data of the tile
+        """
+        header, size = self.header, self.tile_size
+        height = min(size, header.height - row * size)
+        width = min(size, header.width - column * size)
+        index = row * self.columns + column
+        start, end = self.offsets[index], self.offsets[index + 1]
+
+        self.file.seek(start)
+        chunk = _read_exact(self.file, int(end - start))
+        if self._checksum is not None and index == self._next_hashed:
+            self._checksum.update(chunk)
+            self._next_hashed += 1
+        data = _decompress(
+            chunk, self.compression, height * width * header.triplet_size
+        )
+        tile = np.frombuffer(data, dtype=np.uint8)
+        return tile.reshape(height, width, header.triplet_size)
+
+    def _read_tile_row(self, row: int) -> np.ndarray:
+        """Internal Method, Decompress a whole row of tiles, keeping the last one"""
+        if self._tile_row is None or self._tile_row[0] != row:
+            tiles = [self.read_tile(column, row) for column in range(self.columns)]
+            self._tile_row = (row, np.concatenate(tiles, axis=1))
+        return self._tile_row[1]
+
+    def read_raw_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Read chosen rows of image data, decompressing only the rows of tiles they fall in
+
+        Args:
+            rows (np.ndarray): Y coordinates of the rows, ascending decompresses each row of tiles once
+
+        Returns:
+            np.ndarray: (len(rows), width, triplet size) uint8 image data
+        """
+        header = self.header
+        rows = self._check_rows(rows)
+        out = np.empty((len(rows), header.width, header.triplet_size), dtype=np.uint8)
+        for index, y in enumerate(rows.tolist()):
+            out[index] = self._read_tile_row(y // self.tile_size)[y % self.tile_size]
+        return out
+
+    def read_raw_into(self, out: np.ndarray):
+        """Read the next rows of image data as stored, without conversion
+
+        Args:
+            out (np.ndarray): (rows, width, triplet size) uint8 array to fill
+        """
+        if self.rows_read + out.shape[0] > self.header.height:
+            raise ValueError("More rows read than the image height")
+        filled = 0
+        while filled < out.shape[0]:
+            y = self.rows_read + filled
+            band = self._read_tile_row(y // self.tile_size)
+            start = y % self.tile_size
+            count = min(out.shape[0] - filled, len(band) - start)
+            out[filled : filled + count] = band[start : start + count]
+            filled += count
+        self.rows_read += out.shape[0]
+        if self._checksum is not None and self.rows_read == self.header.height:
+            # The size table was written, and so hashed, after the tiles
+            self._checksum.update(self._sizes)
+            self._verify()
+
+    def read_raw_rect(self, x: int, y: int, width: int, height: int) -> np.ndarray:
+        """Read a rectangle of image data, decompressing only the tiles it overlaps
+
+        Args:
+            x (int): X coordinate of the top left corner
+            y (int): Y coordinate of the top left corner
+            width (int): Width of the rectangle
+            height (int): Height of the rectangle
+
+        Returns:
+            np.ndarray: (height, width, triplet size) uint8 image data
+        """
+        header, size = self.header, self.tile_size
+        if x < 0 or y < 0 or x + width > header.width or y + height > header.height:
+            raise ValueError("Rectangle outside of the image")
+        out = np.empty((height, width, header.triplet_size), dtype=np.uint8)
+        for row in range(y // size, -(-(y + height) // size)):
+            for column in range(x // size, -(-(x + width) // size)):
+                tile = self.read_tile(column, row)
+                x0, y0 = max(x, column * size), max(y, row * size)
+                x1 = min(x + width, column * size + tile.shape[1])
+                y1 = min(y + height, row * size + tile.shape[0])
+                out[y0 - y : y1 - y, x0 - x : x1 - x] = tile[
+                    y0 - row * size : y1 - row * size,
+                    x0 - column * size : x1 - column * size,
+                ]
+        return out
+
+
+def open_pixi_reader(file, verify: bool = True) -> PixiReader:
+    """Read the header of a `.pixi` file and create the reader for its image data
+
+    Args:
+        file: Binary file positioned at the start of a `.pixi` file
+        verify (bool, optional): Check the checksum once the image is streamed in full, see PixiReader. Defaults to True.
+
+    Returns:
+        PixiReader: A CompressedPixiReader for compressed files, a PixiReader otherwise
+    """
+    header = PixiHeader.read(file)
+    if header.compressed:
+        return CompressedPixiReader(file, header, verify)
+    return PixiReader(file, header, verify)
+
+
+def read_pixi_rect(
+    file_path: str, x: int, y: int, width: int, height: int, offset: int = 0
+) -> np.ndarray:
+    """Read a rectangle of a `.pixi` file as RGBA pixels, without loading the rest
+
+    Args:
+        file_path (str): Path of the file
+        x (int): X coordinate of the top left corner
+        y (int): Y coordinate of the top left corner
+        width (int): Width of the rectangle
+        height (int): Height of the rectangle
+        offset (int, optional): Position of the `.pixi` data in the file, e.g. a chunk of a project. Defaults to 0.
+
+    Returns:
+        np.ndarray: (height, width, 4) uint8 RGBA pixels
+    """
+    with open(file_path, "rb") as file:
+        file.seek(offset)
+        # Only whole images are verified
+        return open_pixi_reader(file, verify=False).read_rect(x, y, width, height)
+
+
+def read_pixi_header(file_path: str, offset: int = 0) -> PixiHeader:
+    """Read the header, metadata and palette of a `.pixi` file without its image
+
+    Args:
+        file_path (str): Path of the file
+        offset (int, optional): Position of the `.pixi` data in the file, e.g. a chunk of a project. Defaults to 0.
+
+    Returns:
+        PixiHeader: The header
+    """
+    with open(file_path, "rb") as file:
+        file.seek(offset)
+        return PixiHeader.read(file)
+
+
+def _mappable(header: PixiHeader) -> bool:
+    """Internal Method, Whether the image data can be used as a layer's storage as is"""
+    if header.compressed:
+        return False
+    if header.mode == PixiColorMode.INDEXED:
+        return True
+    return header.triplet_size == 4 and header.mode in (
+        PixiColorMode.RGBA,
+        PixiColorMode.DEFAULT,
+    )
+
+
+def _map_image(
+    file_path: str, writable: bool, offset: int = 0
+) -> tuple[PixiHeader, np.ndarray]:
+    """Internal Method, Read the header and memory map the image data behind it"""
+    with open(file_path, "rb") as file:
+        file.seek(offset)
+        header = PixiHeader.read(file)
+        if not _mappable(header):
+            raise ValueError(
+                "Only uncompressed RGBA or indexed .pixi files can be mapped"
+            )
+        offset = file.tell()
+        if path.getsize(file_path) < offset + header.image_size:
+            raise ValueError("Unexpected end of .pixi file")
+        # The map stays valid after the file is closed
+        access = mmap.ACCESS_COPY if writable else mmap.ACCESS_READ
+        mapped = mmap.mmap(file.fileno(), 0, access=access)
+
+    image = np.frombuffer(mapped, np.uint8, header.image_size, offset)
+    if header.mode == PixiColorMode.INDEXED:
+        return header, image.reshape(header.height, header.width)
+    return header, image.reshape(header.height, header.width, 4)
+
+
+def map_pixi(file_path: str, writable: bool = False, offset: int = 0) -> np.ndarray:
+    """Memory map the image of an uncompressed RGBA or indexed `.pixi` file
+
+    Nothing is read up front, the OS pages in only the parts of the image that are
+    accessed. A writable map is copy on write: painting copies just the touched
+    pages into private memory and the file itself is never changed.
+
+    Args:
+        file_path (str): Path of the file
+        writable (bool, optional): Map copy on write instead of read only. Defaults to False.
+        offset (int, optional): Position of the `.pixi` data in the file, e.g. a chunk of a project. Defaults to 0.
+
+    Returns:
+        np.ndarray: (height, width, 4) uint8 RGBA pixels, or (height, width) uint8 indices for indexed files
+    """
+    return _map_image(file_path, writable, offset)[1]
+
+
+def _indexed_palette(header: PixiHeader) -> Palette | None:
+    """Internal Method, Palette of an indexed file if it loads as an IndexedGrid"""
+    if header.mode != PixiColorMode.INDEXED or header.palette[0].any():
+        return None
+    colors = [tuple(color) for color in header.palette[1:].tolist()]
+    return Palette(header.creator or "pixi", colors, 0, 0, 160)
+
+
+def load_pixi(
+    file_path: str, mapped: bool = False, offset: int = 0, verify: bool = True
+) -> Grid:
+    """Load a `.pixi` file into a new layer, streaming the image straight into it
+
+    Indexed files whose first palette entry is transparent load as an IndexedGrid,
+    every other file as an RGBA Grid.
+
+    Args:
+        file_path (str): Path of the file
+        mapped (bool, optional): Back the layer with a copy on write memory map of the file instead of reading it, see `map_pixi`. Files that cannot be mapped are read. Mapped files are never verified, nothing is read up front. Defaults to False.
+        offset (int, optional): Position of the `.pixi` data in the file, e.g. a chunk of a project. Defaults to 0.
+        verify (bool, optional): Check the checksum as the image is read, False opens faster. Defaults to True.
+
+    Returns:
+        Grid: The loaded layer
+    """
+    if mapped and _mappable(read_pixi_header(file_path, offset)):
+        header, image = _map_image(file_path, True, offset)
+        palette = _indexed_palette(header)
+        if palette is not None:
+            return IndexedGrid(header.width, header.height, palette, image)
+        if header.mode != PixiColorMode.INDEXED:
+            return Grid(header.width, header.height, pixels=image)
+
+    with open(file_path, "rb") as file:
+        file.seek(offset)
+        reader = open_pixi_reader(file, verify)
+        header = reader.header
+        width, height = header.width, header.height
+
+        palette = _indexed_palette(header)
+        if palette is not None:
+            grid = IndexedGrid(width, height, palette)
+            rows = _band_rows(width)
+            for y in range(0, height, rows):
+                band = grid.indices[y : y + rows]
+                reader.read_raw_into(band.reshape(band.shape + (1,)))
+            if grid.indices.max(initial=0) >= len(header.palette):
+                raise ValueError("Pixel index outside of the palette")
+            return grid
+
+        grid = Grid(width, height, pixels=np.empty((height, width, 4), np.uint8))
+        rows = _band_rows(header.row_size)
+        buffer = np.empty((rows, width, header.triplet_size), dtype=np.uint8)
+        for y in range(0, height, rows):
+            band = grid.pixels[y : y + rows]
+            reader.read_into(band, buffer[: band.shape[0]])
+        return grid
+
+
+def write_pixi(
+    source: Grid | ComputedLayeredGrid,
+    file,
+    mode: PixiColorMode = None,
+    creator: str = "pixi-painter",
+    description: str = "",
+    tags: list[str] = None,
+    compression: str = None,
+    level: int = 6,
+    checksum: str = "crc32",
+):
+    """Stream a layer, or the composite of a grid, into an open file as `.pixi` data
+
+    Args:
+        source (Grid | ComputedLayeredGrid): Layer to save, or grid whose composite is saved
+        file: Binary file to write to, must be seekable when compressing
+        mode (PixiColorMode, optional): Color mode to store. Defaults to INDEXED for IndexedGrids and RGBA otherwise.
+        creator (str, optional): Creator name. Defaults to "pixi-painter".
+        description (str, optional): Description. Defaults to "".
+        tags (list[str], optional): Tags. Defaults to None.
+        compression (str, optional): "zlib" or "lzma" to write compressed tiles, see CompressedPixiWriter. Defaults to None.
+        level (int, optional): Compression level from 0 to 9. Defaults to 6.
+        checksum (str, optional): "crc32" or "sha256" to checksum the image data as it is written, None for no checksum. Defaults to "crc32".
+    """
+    if isinstance(source, ComputedLayeredGrid):
+        source = source.get_computed_grid()
+    indexed = isinstance(source, IndexedGrid)
+    if mode is None:
+        mode = PixiColorMode.INDEXED if indexed else PixiColorMode.RGBA
+    if mode == PixiColorMode.INDEXED and not indexed:
+        raise ValueError("Only indexed layers can be saved as indexed images")
+
+    palette = None
+    if mode == PixiColorMode.INDEXED:
+        # Entry 0 is the transparent index, then the palette colors in order
+        palette = source.lut[: len(source.palette.colors) + 1].copy()
+        palette[TRANSPARENT_INDEX] = 0
+    header = PixiHeader(
+        source.width, source.height, mode, creator, description, tags, palette
+    )
+
+    if compression:
+        writer = CompressedPixiWriter(
+            file, header, compression, level, checksum=checksum
+        )
+    else:
+        writer = PixiWriter(file, header, checksum)
+    rows = _band_rows(source.width * 4)
+    for y in range(0, source.height, rows):
+        if mode == PixiColorMode.INDEXED:
+            writer.write_rows(source.indices[y : y + rows])
+        else:
+            count = min(rows, source.height - y)
+            writer.write_rows(source.read_rect(0, y, source.width, count))
+    writer.close()
+
+
+def save_pixi(
+    source: Grid | ComputedLayeredGrid,
+    file_path: str,
+    mode: PixiColorMode = None,
+    creator: str = "pixi-painter",
+    description: str = "",
+    tags: list[str] = None,
+    compression: str = None,
+    level: int = 6,
+    checksum: str = "crc32",
+):
+    """Save a layer, or the composite of a grid, to a `.pixi` file
+
+    The image is streamed out in bands of rows into a temporary file that then
+    replaces `file_path`, so a failed save never leaves a half written file.
+
+    Args:
+        source (Grid | ComputedLayeredGrid): Layer to save, or grid whose composite is saved
+        file_path (str): Path of the file
+        mode (PixiColorMode, optional): Color mode to store. Defaults to INDEXED for IndexedGrids and RGBA otherwise.
+        creator (str, optional): Creator name. Defaults to "pixi-painter".
+        description (str, optional): Description. Defaults to "".
+        tags (list[str], optional): Tags. Defaults to None.
+        compression (str, optional): "zlib" or "lzma" to write compressed tiles, see CompressedPixiWriter. Defaults to None.
+        level (int, optional): Compression level from 0 to 9. Defaults to 6.
+        checksum (str, optional): "crc32" or "sha256" to checksum the image data as it is written, None for no checksum. Defaults to "crc32".
+    """
+    temp_path = f"{file_path}.tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            write_pixi(
+                source,
+                file,
+                mode,
+                creator,
+                description,
+                tags,
+                compression,
+                level,
+                checksum,
+            )
+        os.replace(temp_path, file_path)
+    finally:
+        if path.exists(temp_path):
+            os.remove(temp_path)
@@ -0,0 +1,288 @@
+from os import path
+import os
+import struct
+import numpy as np
+from .Grid import Grid, ComputedLayeredGrid
+from .PixiFile import (
+    PixiColorMode,
+    PixiHeader,
+    load_pixi,
+    read_pixi_header,
+    read_pixi_rect,
+    write_pixi,
+    _read_exact,
+)
+
+# `.pixp` projects hold every layer of a ComputedLayeredGrid, next to `.pixi` files:
+# - Header: magic `pixp`, major and minor version, width, height, layer count and
+#   the offset of the table of contents
+# - Chunks: one complete `.pixi` stream per layer, compressed or not
+# - Table of contents, bottom layer first: offset and size of the layer's chunk,
+#   flags, and the length of its UTF-8 name followed by the name
+PROJECT_MAGIC = b"pixp"
+PROJECT_VERSION = (0, 1)
+
+_PROJECT_HEADER = struct.Struct(">4sHHIIIQ")
+_CHUNK_ENTRY = struct.Struct(">QQBI")
+
+# Flag bit of the table of contents set on visible layers
+CHUNK_VISIBLE = 0x01
+
+# Bytes copied at once when a chunk is copied as is
+_COPY_SIZE = 1 << 20
+
+
+class ProjectChunk:
+    """Table of contents entry of one layer of a project file"""
+
+    def __init__(self, name: str, visible: bool, offset: int, size: int):
+        self.name: str = name
+        self.visible: bool = visible
+        self.offset: int = offset
+        self.size: int = size
+
+
+class PixiProject:
+    """Table of contents of a `.pixp` project file, its layers are read on demand"""
+
+    def __init__(self, file_path: str):
+        """Open a project file, reading only its header and table of contents
+
+        Args:
+            file_path (str): Path of the file
+        """
+        self.file_path: str = file_path
+        with open(file_path, "rb") as file:
+            magic, major, minor, width, height, count, toc_offset = (
+                _PROJECT_HEADER.unpack(_read_exact(file, _PROJECT_HEADER.size))
+            )
+            if magic != PROJECT_MAGIC:
+                raise ValueError("Not a .pixp file, bad magic number")
+            if major != PROJECT_VERSION[0]:
+                raise ValueError(f"Unsupported .pixp version {(major, minor)}")
+            if width <= 0 or height <= 0:
+                raise ValueError("Project dimensions must be positive")
+
+            self.width: int = width
+            self.height: int = height
+            self.chunks: list[ProjectChunk] = []
+            file.seek(toc_offset)
+            for _ in range(count):
+                offset, size, flags, length = _CHUNK_ENTRY.unpack(
+                    _read_exact(file, _CHUNK_ENTRY.size)
+                )
+                if offset + size > toc_offset:
+                    raise ValueError("Layer chunk outside of the .pixp file")
+                name = _read_exact(file, length).decode("utf-8")
+                self.chunks.append(
+                    ProjectChunk(name, bool(flags & CHUNK_VISIBLE), offset, size)
+                )
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def read_header(self, index: int) -> PixiHeader:
+        """Read the `.pixi` header of a layer's chunk
+
+        Args:
+            index (int): Index of the layer, 0 is the bottom
+
+        Returns:
+            PixiHeader: Header of the chunk
+        """
+        return read_pixi_header(self.file_path, self.chunks[index].offset)
+
+    def read_layer(self, index: int, mapped: bool = False) -> Grid:
+        """Read a layer, with its name and visibility
+
+        Args:
+            index (int): Index of the layer, 0 is the bottom
+            mapped (bool, optional): Memory map uncompressed chunks instead of reading them, see `load_pixi`. Defaults to False.
+
+        Returns:
+            Grid: The layer, an IndexedGrid for indexed chunks
+        """
+        chunk = self.chunks[index]
+        layer = load_pixi(self.file_path, mapped, chunk.offset)
+        layer.name, layer.visible = chunk.name, chunk.visible
+        return layer
+
+    def read_layer_rect(
+        self, index: int, x: int, y: int, width: int, height: int
+    ) -> np.ndarray:
+        """Read a rectangle of a layer as RGBA pixels, without reading the rest
+
+        Args:
+            index (int): Index of the layer, 0 is the bottom
+            x (int): X coordinate of the top left corner
+            y (int): Y coordinate of the top left corner
+            width (int): Width of the rectangle
+            height (int): Height of the rectangle
+
+        Returns:
+            np.ndarray: (height, width, 4) uint8 RGBA pixels
+        """
+        offset = self.chunks[index].offset
+        return read_pixi_rect(self.file_path, x, y, width, height, offset)
+
+    def copy_chunk(self, index: int, file):
+        """Copy a layer's chunk as is into another file
+
+        Args:
+            index (int): Index of the layer, 0 is the bottom
+            file: Binary file to write to
+        """
+        chunk = self.chunks[index]
+        with open(self.file_path, "rb") as source:
+            source.seek(chunk.offset)
+            remaining = chunk.size
+            while remaining:
+                data = _read_exact(source, min(remaining, _COPY_SIZE))
+                file.write(data)
+                remaining -= len(data)
+
+    def open(self, mapped: bool = False) -> ComputedLayeredGrid:
+        """Build a grid of the project's layers, reading only the visible ones
+
+        Hidden RGBA layers become LazyLayers, read the first time they are shown or
+        their pixels are used. Indexed layers are small and always read.
+
+        Args:
+            mapped (bool, optional): Memory map uncompressed chunks instead of reading them, see `load_pixi`. Defaults to False.
+
+        Returns:
+            ComputedLayeredGrid: The project's layers, bottom to top
+        """
+        layers = []
+        for index, chunk in enumerate(self.chunks):
+            if chunk.visible or self.read_header(index).mode == PixiColorMode.INDEXED:
+                layers.append(self.read_layer(index, mapped))
+            else:
+                layers.append(LazyLayer(self, index, mapped))
+
+        grid = ComputedLayeredGrid(self.width, self.height)
+        grid.add_layers(layers)
+        return grid
+
+
+class LazyLayer(Grid):
+    """RGBA layer of a project file, read from its chunk the first time its pixels are used
+
+    Saving a project copies the chunks of layers that were never read as they are.
+    """
+
+    def __init__(self, project: PixiProject, index: int, mapped: bool = False):
+        """Create a LazyLayer
+
+        Args:
+            project (PixiProject): Project holding the layer
+            index (int): Index of the layer in the project
+            mapped (bool, optional): Memory map the chunk when read, see `load_pixi`. Defaults to False.
+        """
+        chunk = project.chunks[index]
+        self.project: PixiProject = project
+        self.index: int = index
+        self.mapped: bool = mapped
+        self._pixels: np.ndarray | None = None
+
+        self.width = project.width
+        self.height = project.height
+        self.version: int = 0
+        self._usage = None
+        self.name: str = chunk.name
+        self.visible: bool = chunk.visible
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the pixels were read"""
+        return self._pixels is not None
+
+    @property
+    def pixels(self) -> np.ndarray:
+        if self._pixels is None:
+            self._pixels = self.project.read_layer(self.index, self.mapped).pixels
+        return self._pixels
+
+    @pixels.setter
+    def pixels(self, pixels: np.ndarray):
+        self._pixels = pixels
+
+
+def open_project(file_path: str, mapped: bool = False) -> ComputedLayeredGrid:
+    """Open a `.pixp` project file into a grid, see `PixiProject.open`
+
+    Args:
+        file_path (str): Path of the file
+        mapped (bool, optional): Memory map uncompressed chunks instead of reading them. Defaults to False.
+
+    Returns:
+        ComputedLayeredGrid: The project's layers, bottom to top
+    """
+    return PixiProject(file_path).open(mapped)
+
+
+def save_project(
+    grid: ComputedLayeredGrid,
+    file_path: str,
+    compression: str = "zlib",
+    level: int = 6,
+):
+    """Save every layer of a grid to a `.pixp` project file
+
+    Layers are streamed out one chunk at a time into a temporary file that then
+    replaces `file_path`. LazyLayers that were never read are copied as they are.
+
+    Args:
+        grid (ComputedLayeredGrid): Grid to save
+        file_path (str): Path of the file
+        compression (str, optional): "zlib" or "lzma" to compress the chunks, None to store them uncompressed so they can be memory mapped. Defaults to "zlib".
+        level (int, optional): Compression level from 0 to 9. Defaults to 6.
+    """
+    temp_path = f"{file_path}.tmp"
+    chunks: list[ProjectChunk] = []
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(bytes(_PROJECT_HEADER.size))
+            for layer in grid.layers:
+                offset = file.tell()
+                if isinstance(layer, LazyLayer) and not layer.loaded:
+                    layer.project.copy_chunk(layer.index, file)
+                else:
+                    write_pixi(layer, file, compression=compression, level=level)
+                chunks.append(
+                    ProjectChunk(
+                        layer.name, layer.visible, offset, file.tell() - offset
+                    )
+                )
+
+            toc_offset = file.tell()
+            for chunk in chunks:
+                name = chunk.name.encode("utf-8")
+                flags = CHUNK_VISIBLE if chunk.visible else 0
+                file.write(
+                    _CHUNK_ENTRY.pack(chunk.offset, chunk.size, flags, len(name))
+                )
+                file.write(name)
+
+            file.seek(0)
+            file.write(
+                _PROJECT_HEADER.pack(
+                    PROJECT_MAGIC,
+                    *PROJECT_VERSION,
+                    grid.width,
+                    grid.height,
+                    len(chunks),
+                    toc_offset,
+                )
+            )
+        os.replace(temp_path, file_path)
+    finally:
+        if path.exists(temp_path):
+            os.remove(temp_path)
+
+    # Layers still to be read now read from the new file, the old one may be gone
+    project = None
+    for index, layer in enumerate(grid.layers):
+        if isinstance(layer, LazyLayer) and not layer.loaded:
+            project = project or PixiProject(file_path)
+            layer.project, layer.index = project, index
@@ -0,0 +1,202 @@
+import numpy as np
+from .ColorArrays import pack_rgba, unpack_rgba
+from .Grid import Grid, ComputedLayeredGrid
+from .Types import RGBA
+
+
+def _assign(
+    points: np.ndarray, centers: np.ndarray, chunk: int = 1 << 16
+) -> np.ndarray:
+    """Internal Method, Index of the nearest center by RGB of every point"""
+    points = np.asarray(points, dtype=np.float64)
+    centers = np.asarray(centers, dtype=np.float64)
+    labels = np.empty(len(points), dtype=np.intp)
+    for start in range(0, len(points), chunk):
+        diff = points[start : start + chunk, None, :3] - centers[None, :, :3]
+        labels[start : start + chunk] = np.einsum("nkc,nkc->nk", diff, diff).argmin(
+            axis=1
+        )
+    return labels
+
+
+def _bin_colors(
+    colors: np.ndarray, counts: np.ndarray, bits: int = 5
+) -> tuple[np.ndarray, np.ndarray]:
+    """Internal Method, Merge colors sharing their top `bits` of RGB into their weighted mean, opaque"""
+    shift = 8 - bits
+    rgb = colors[:, :3].astype(np.intp)
+    bins = (rgb[:, 0] >> shift) << (2 * bits)
+    bins |= (rgb[:, 1] >> shift) << bits
+    bins |= rgb[:, 2] >> shift
+    bins, inverse = np.unique(bins, return_inverse=True)
+
+    totals = np.bincount(inverse, counts, minlength=len(bins))
+    merged = np.full((len(bins), 4), 255, dtype=np.uint8)
+    for channel in range(3):
+        sums = np.bincount(inverse, counts * rgb[:, channel], minlength=len(bins))
+        merged[:, channel] = np.floor(sums / totals + 0.5)
+    return merged, totals
+
+
+def color_histogram(
+    pixels: np.ndarray, max_samples: int = 1 << 20, seed: int = 0
+) -> tuple[np.ndarray, np.ndarray]:
+    """Count the unique colors of RGBA pixels, ignoring fully transparent ones
+
+    Images with more pixels than `max_samples` are sampled at random instead of
+    counted in full, so large photos and references stay cheap.
+
+    Args:
+        pixels (np.ndarray): (..., 4) uint8 RGBA pixels
+        max_samples (int, optional): Most pixels to count. Defaults to 1 << 20.
+        seed (int, optional): Seed of the sampling, so results are repeatable. Defaults to 0.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (N, 4) uint8 unique colors and their (N,) pixel counts
+    """
+    pixels = np.asarray(pixels, dtype=np.uint8).reshape(-1, 4)
+    if len(pixels) > max_samples:
+        rng = np.random.default_rng(seed)
+        pixels = pixels[rng.integers(0, len(pixels), max_samples)]
+    keys = pack_rgba(pixels)
+    keys = keys[(keys & 0xFF) != 0]
+
+    keys, counts = np.unique(keys, return_counts=True)
+    return unpack_rgba(keys), counts
+
+
+def median_cut(colors: np.ndarray, counts: np.ndarray, count: int) -> np.ndarray:
+    """Reduce weighted colors to at most `count` colors with median cut
+
+    The box with the widest channel range is split at the weighted median of that
+    channel until there are `count` boxes, each box becomes its weighted mean.
+
+    Args:
+        colors (np.ndarray): (N, 3/4) uint8 colors
+        counts (np.ndarray): (N,) weight of each color
+        count (int): Number of colors to produce
+
+    Returns:
+        np.ndarray: (count or fewer, channels) uint8 colors
+    """
+    colors = np.asarray(colors)
+    weights = np.asarray(counts, dtype=np.float64)
+    boxes = [np.arange(len(colors))]
+    # Widest channel range of every box, 0 once a box holds a single color
+    ranges = [np.ptp(colors[:, :3], axis=0)]
+
+    while len(boxes) < count:
+        widest = [r.max() for r in ranges]
+        split = int(np.argmax(widest))
+        if widest[split] == 0:
+            break
+
+        box = boxes[split]
+        channel = int(np.argmax(ranges[split]))
+        box = box[np.argsort(colors[box, channel], kind="stable")]
+
+        # Weighted median, kept strictly inside the box so both halves hold colors
+        cumulative = np.cumsum(weights[box])
+        middle = np.searchsorted(cumulative, cumulative[-1] / 2, side="right")
+        middle = min(max(int(middle), 1), len(box) - 1)
+
+        halves = [box[:middle], box[middle:]]
+        boxes[split : split + 1] = halves
+        ranges[split : split + 1] = [np.ptp(colors[h, :3], axis=0) for h in halves]
+
+    result = np.empty((len(boxes), colors.shape[1]), dtype=np.uint8)
+    for i, box in enumerate(boxes):
+        weight = weights[box]
+        result[i] = np.floor(weight @ colors[box] / weight.sum() + 0.5)
+    return result
+
+
+def kmeans(
+    colors: np.ndarray,
+    counts: np.ndarray,
+    centers: np.ndarray,
+    iterations: int = 8,
+    chunk: int = 1 << 16,
+) -> np.ndarray:
+    """Refine palette centers with weighted k-means over the RGB of unique colors
+
+    Args:
+        colors (np.ndarray): (N, 3/4) uint8 colors
+        counts (np.ndarray): (N,) weight of each color
+        centers (np.ndarray): (K, channels) uint8 starting colors, e.g. from `median_cut`
+        iterations (int, optional): Most refinement passes, stops early once stable. Defaults to 8.
+        chunk (int, optional): Colors assigned at once. Defaults to 1 << 16.
+
+    Returns:
+        np.ndarray: (K, channels) uint8 refined colors
+    """
+    points = np.asarray(colors, dtype=np.float64)
+    weights = np.asarray(counts, dtype=np.float64)
+    centers = np.asarray(centers, dtype=np.float64)
+    labels = np.full(len(points), -1)
+
+    for _ in range(iterations):
+        new_labels = _assign(points, centers, chunk)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+        # Move each center to the weighted mean of its colors, empty ones stay put
+        totals = np.bincount(labels, weights, minlength=len(centers))
+        used = totals > 0
+        for channel in range(points.shape[1]):
+            sums = np.bincount(
+                labels, weights * points[:, channel], minlength=len(centers)
+            )
+            centers[used, channel] = sums[used] / totals[used]
+
+    return np.floor(centers + 0.5).astype(np.uint8)
+
+
+def extract_palette(
+    source: Grid | ComputedLayeredGrid | np.ndarray,
+    count: int = 16,
+    method: str = "median_cut",
+    max_samples: int = 1 << 20,
+    iterations: int = 8,
+) -> list[RGBA]:
+    """Extract a palette of at most `count` colors from a layer, a composite or pixels
+
+    Sources with `count` or fewer unique colors return exactly those colors. Others
+    are merged into 32³ RGB bins first, so median cut and k-means work on at most
+    32768 weighted colors however large the source is.
+
+    Args:
+        source (Grid | ComputedLayeredGrid | np.ndarray): Layer, grid whose composite is used, or (..., 4) uint8 RGBA pixels
+        count (int, optional): Number of colors to extract. Defaults to 16.
+        method (str, optional): "median_cut", or "kmeans" to refine the median cut colors. Defaults to "median_cut".
+        max_samples (int, optional): Most pixels counted, larger sources are sampled. Defaults to 1 << 20.
+        iterations (int, optional): Most k-means passes. Defaults to 8.
+
+    Returns:
+        list[RGBA]: Extracted colors, most common first
+    """
+    if method not in ("median_cut", "kmeans"):
+        raise ValueError(f"Unknown quantization method '{method}'")
+
+    if isinstance(source, ComputedLayeredGrid):
+        pixels = source.get_computed_grid().pixels
+    elif isinstance(source, Grid):
+        pixels = source.pixels
+    else:
+        pixels = np.asarray(source, dtype=np.uint8)
+
+    colors, counts = color_histogram(pixels, max_samples)
+    if len(colors) > count:
+        # Quantize opaque RGB, alpha is not part of the palette
+        colors, counts = _bin_colors(colors, counts)
+        palette = median_cut(colors, counts, count)
+        if method == "kmeans":
+            palette = kmeans(colors, counts, palette, iterations)
+        # Weight each palette color by the pixels nearest to it
+        palette = np.unique(palette, axis=0)
+        labels = _assign(colors, palette)
+        colors, counts = palette, np.bincount(labels, counts, minlength=len(palette))
+
+    order = np.argsort(-counts, kind="stable")
+    return [tuple(color) for color in colors[order].tolist()]
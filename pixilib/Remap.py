@@ -0,0 +1,231 @@
+import sys
+import numpy as np
+from .Color import Palette
+from .Compositor import TilePool, default_pool
+from .Grid import ComputedLayeredGrid
+from .Types import RGBA, Rect
+
+
+def _pack_rgb(rgb: np.ndarray) -> np.ndarray:
+    """Internal Method, Pack (..., 3/4) uint8 colors into R | G << 8 | B << 16 uint32 values"""
+    if rgb.shape[-1] == 4 and rgb.strides[-1] == 1 and sys.byteorder == "little":
+        # RGBA bytes already are that integer, plus alpha in the top byte
+        return rgb.view(np.uint32)[..., 0]
+    packed = rgb[..., 0].astype(np.uint32)
+    packed |= rgb[..., 1].astype(np.uint32) << np.uint32(8)
+    packed |= rgb[..., 2].astype(np.uint32) << np.uint32(16)
+    return packed
+
+
+class PaletteRemapper:
+    """Maps colors to their nearest palette entry through a precomputed RGB lookup table
+
+    RGB space is split into `(2**bits)**3` cells, each pointing at a block holding the
+    nearest entry of every color inside the cell. Cells where one entry is the nearest
+    for the whole cell share a constant block. Cells near a boundary between entries
+    get their own block, resolved exactly against only the entries that can win in
+    that cell the first time a color falls into it. Results are always the exact
+    nearest entry by Euclidean RGB distance, lowest index on ties.
+
+    The table is built from the palette's colors at creation, build a new remapper
+    after the palette changes.
+    """
+
+    def __init__(self, palette: Palette | list[RGBA], bits: int = 6):
+        """Create a PaletteRemapper and build its lookup table
+
+        Args:
+            palette (Palette | list[RGBA]): Palette to map to
+            bits (int, optional): Bits per channel of the table from 4 to 8, 5 is 32³ cells and 6 is 64³. Defaults to 6.
+        """
+        colors = palette.colors if isinstance(palette, Palette) else palette
+        if not colors:
+            raise ValueError("Cannot remap to an empty palette")
+        if not 4 <= bits <= 8:
+            raise ValueError("Bits must be between 4 and 8")
+
+        self.bits: int = bits
+        self.colors: np.ndarray = np.array([color[:4] for color in colors], np.uint8)
+        self._rgb: np.ndarray = self.colors[:, :3].astype(np.int32)
+        self._colors32: np.ndarray = self.colors.view(np.uint32)[:, 0]
+        self._build()
+
+    def _build(self, chunk: int = 4096):
+        """Internal Method, Build the cell table and the candidates of boundary cells"""
+        cells = 1 << self.bits
+        step = 1 << (8 - self.bits)
+        palette_size = len(self.colors)
+
+        # Center of every cell, and the distance from it to the cell's corners
+        axis = np.arange(cells) * step + (step - 1) / 2
+        centers = np.stack(np.meshgrid(axis, axis, axis, indexing="ij"), -1)
+        centers = centers.reshape(-1, 3)
+        radius = np.sqrt(3) * (step - 1) / 2
+
+        rgb = self._rgb.astype(np.float64)
+        nearest = np.empty(len(centers), dtype=np.intp)
+        ambiguous_cells, ambiguous_near = [], []
+
+        for start in range(0, len(centers), chunk):
+            diff = centers[start : start + chunk, None, :] - rgb[None, :, :]
+            distance = np.sqrt(np.einsum("ckj,ckj->ck", diff, diff))
+            best = distance.argmin(axis=1)
+            nearest[start : start + chunk] = best
+
+            # An entry can only be nearest to some color in the cell if its distance
+            # from the center is within the cell's diameter of the best distance
+            best_distance = distance[np.arange(len(best)), best]
+            near = distance <= (best_distance + 2 * radius + 1e-9)[:, None]
+            ambiguous = near.sum(axis=1) > 1
+            ambiguous_cells.append(np.nonzero(ambiguous)[0] + start)
+            ambiguous_near.append(near[ambiguous])
+
+        self._ambiguous_cells: np.ndarray = np.concatenate(ambiguous_cells)
+        near = np.concatenate(ambiguous_near)
+        ambiguous_count = len(self._ambiguous_cells)
+
+        # Candidate indices in ascending order, padded with the first candidate so
+        # padding never wins a tie against a lower index
+        counts = near.sum(axis=1)
+        order = np.argsort(~near, axis=1, kind="stable")[:, : counts.max(initial=1)]
+        padding = np.arange(order.shape[1])[None, :] >= counts[:, None]
+        order[padding] = np.broadcast_to(order[:, :1], order.shape)[padding]
+        self.candidates: np.ndarray = order
+
+        # Block of every cell, boundary cells first, then one constant block per entry
+        self.cell_blocks: np.ndarray = (nearest + ambiguous_count).astype(np.uint32)
+        self.cell_blocks[self._ambiguous_cells] = np.arange(ambiguous_count)
+
+        index_type = np.min_scalar_type(palette_size - 1)
+        self.blocks: np.ndarray = np.empty(
+            (ambiguous_count + palette_size, step**3), dtype=index_type
+        )
+        self.blocks[ambiguous_count:] = np.arange(palette_size)[:, None]
+        self._resolved: np.ndarray = np.zeros(ambiguous_count, dtype=bool)
+
+    def _resolve(self, rows: np.ndarray, budget: int = 1 << 22):
+        """Internal Method, Fill the blocks of the boundary cells in `rows` exactly"""
+        step = 1 << (8 - self.bits)
+        offsets = np.stack(np.meshgrid(*[np.arange(step)] * 3, indexing="ij"), -1)
+        offsets = offsets.reshape(1, -1, 1, 3)
+        chunk = max(1, budget // (step**3 * self.candidates.shape[1]))
+
+        for start in range(0, len(rows), chunk):
+            selected = rows[start : start + chunk]
+            cells = self._ambiguous_cells[selected]
+            corner = np.stack(
+                [cells >> (2 * self.bits), cells >> self.bits, cells], -1
+            ) & ((1 << self.bits) - 1)
+
+            # (cells, colors in a cell, candidates, RGB)
+            colors = (corner * step)[:, None, None, :] + offsets
+            candidates = self.candidates[selected]
+            diff = colors - self._rgb[candidates][:, None, :, :]
+            distance = np.einsum("icku,icku->ick", diff, diff)
+            best = distance.argmin(axis=2)
+            self.blocks[selected] = np.take_along_axis(candidates, best, axis=1)
+            self._resolved[selected] = True
+
+    def nearest(self, rgb: np.ndarray) -> np.ndarray:
+        """Get the index of the nearest palette entry of every color
+
+        Args:
+            rgb (np.ndarray): (..., 3) or (..., 4) uint8 colors, alpha is ignored
+
+        Returns:
+            np.ndarray: Palette indices with the shape of `rgb` without its channel axis
+        """
+        packed = _pack_rgb(np.asarray(rgb, dtype=np.uint8))
+
+        # Cell of each color from the high bits, position inside it from the low bits
+        bits, shift = self.bits, 8 - self.bits
+        high, low = np.uint32((1 << bits) - 1), np.uint32((1 << shift) - 1)
+        keys = ((packed >> np.uint32(shift)) & high) << np.uint32(2 * bits)
+        keys |= ((packed >> np.uint32(8 + shift)) & high) << np.uint32(bits)
+        keys |= (packed >> np.uint32(16 + shift)) & high
+        local = (packed & low) << np.uint32(2 * shift)
+        local |= ((packed >> np.uint32(8)) & low) << np.uint32(shift)
+        local |= (packed >> np.uint32(16)) & low
+
+        blocks = self.cell_blocks[keys]
+        if not self._resolved.all():
+            hit = np.bincount(blocks.ravel(), minlength=len(self.blocks))
+            self._resolve(
+                np.nonzero((hit[: len(self._resolved)] > 0) & ~self._resolved)[0]
+            )
+
+        blocks *= np.uint32(self.blocks.shape[1])
+        blocks += local
+        return self.blocks.reshape(-1)[blocks]
+
+    def remap_rect(self, pixels: np.ndarray, out: np.ndarray, rect: Rect):
+        """Snap RGBA pixels to the palette into `out` inside a rectangle
+
+        Alpha is kept, and fully transparent pixels are copied unchanged.
+
+        Args:
+            pixels (np.ndarray): (height, width, 4) uint8 RGBA pixels
+            out (np.ndarray): (height, width, 4) uint8 array to write the result into, may be `pixels`
+            rect (Rect): Region (x, y, width, height) to remap
+        """
+        x, y, width, height = rect
+        region = (slice(y, y + height), slice(x, x + width))
+        source = pixels[region]
+
+        # Gather whole RGBA entries as one 4 byte value each
+        indices = self.nearest(source)
+        snapped = self._colors32[indices].view(np.uint8).reshape(indices.shape + (4,))
+        snapped[..., 3] = source[..., 3]
+        np.copyto(snapped, source, where=source[..., 3:] == 0)
+        out[region] = snapped
+
+    def remap(
+        self,
+        pixels: np.ndarray,
+        out: np.ndarray = None,
+        rect: Rect = None,
+        pool: TilePool = None,
+    ) -> np.ndarray:
+        """Snap RGBA pixels to the palette, split into tiles across `pool`
+
+        Args:
+            pixels (np.ndarray): (height, width, 4) uint8 RGBA pixels
+            out (np.ndarray, optional): Array to write the result into, may be `pixels`. Defaults to a copy of `pixels`.
+            rect (Rect, optional): Region (x, y, width, height) to remap. Defaults to all of `pixels`.
+            pool (TilePool, optional): Pool to run on. Defaults to the shared pool.
+
+        Returns:
+            np.ndarray: `out`
+        """
+        if out is None:
+            out = pixels.copy()
+        if rect is None:
+            rect = (0, 0, pixels.shape[1], pixels.shape[0])
+        (pool or default_pool()).map_tiles(
+            lambda tile: self.remap_rect(pixels, out, tile), rect
+        )
+        return out
+
+    def remap_layer(
+        self,
+        grid: ComputedLayeredGrid,
+        layer: int = 0,
+        rect: Rect = None,
+        mask: np.ndarray = None,
+    ):
+        """Snap a layer, or a selection of it, to the palette as one undoable edit
+
+        Args:
+            grid (ComputedLayeredGrid): Grid owning the layer
+            layer (int, optional): Layer to remap. Defaults to 0.
+            rect (Rect, optional): Region (x, y, width, height) to remap. Defaults to the whole layer.
+            mask (np.ndarray, optional): (height, width) boolean selection inside `rect`, only True pixels are remapped. Defaults to None.
+        """
+        x, y, width, height = rect or (0, 0, grid.width, grid.height)
+        pixels = grid.layers[layer].read_rect(x, y, width, height)
+        remapped = self.remap(pixels, pool=grid.pool)
+        if mask is not None:
+            remapped = np.where(mask[..., None], remapped, pixels)
+
+        with grid.batch("remap"):
+            grid.write_rect(layer, x, y, remapped)
@@ -0,0 +1,265 @@
+from multiprocessing import get_context, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable
+import numpy as np
+from .Compositor import TilePool, composite_rect, flatten_rect
+from .Grid import Grid, ComputedLayeredGrid
+from .Types import RGB, RGBA, Rect
+
+# (shared memory name, shape, dtype) of an array living in a shared memory block
+type BlockRef = tuple[str, tuple[int, ...], str]
+
+
+# region Worker process
+# Blocks attached by this worker process, kept open between jobs
+_attached: dict[str, tuple[SharedMemory, np.ndarray]] = {}
+
+
+def _attach(block: BlockRef) -> np.ndarray:
+    """Internal Method, Map a shared memory block into this worker process"""
+    name, shape, dtype = block
+    if name not in _attached:
+        try:
+            shm = SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 always registers, which would unlink the block on exit
+            shm = SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+        _attached[name] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+    return _attached[name][1]
+
+
+def _run_job(
+    func: Callable, blocks: list[BlockRef], rect: Rect, args: tuple, alive: set[str]
+):
+    """Internal Method, Run `func(arrays, rect, *args)` in a worker process on shared arrays"""
+    # Let go of blocks the engine has released since the last job
+    for name in [name for name in _attached if name not in alive]:
+        _attached.pop(name)[0].close()
+
+    func([_attach(block) for block in blocks], rect, *args)
+
+
+def _composite_job(arrays: list[np.ndarray], rect: Rect):
+    """Internal Method, `composite_rect` over shared arrays, the last array is the output"""
+    composite_rect(arrays[:-1], arrays[-1], rect)
+
+
+def _flatten_job(arrays: list[np.ndarray], rect: Rect, background: RGB):
+    """Internal Method, `flatten_rect` over shared arrays"""
+    flatten_rect(arrays[0], arrays[1], rect, background)
+
+
+# endregion
+
+
+class SharedMemoryEngine:
+    """Optional engine that composites huge canvases in worker processes over shared memory
+
+    Arrays allocated by the engine live in `multiprocessing.shared_memory` blocks.
+    Jobs only send block names and tile rectangles to the workers, which map the
+    blocks and read and write pixels in place, so no pixel data is copied between
+    processes. The engine has the same `composite`/`flatten`/`map_tiles` interface as
+    TilePool and can be passed as the `pool` of a ComputedLayeredGrid.
+
+    Work on arrays that are not shared, or on small regions, runs on an in-process
+    TilePool instead.
+    """
+
+    def __init__(
+        self,
+        workers: int = None,
+        tile_size: int = 1024,
+        serial_threshold: int = 1024 * 1024,
+        threads: TilePool = None,
+    ):
+        """Create a SharedMemoryEngine and start its worker processes
+
+        Args:
+            workers (int, optional): Number of worker processes. Defaults to the CPU count.
+            tile_size (int, optional): Width and height of the tiles jobs are split into. Defaults to 1024.
+            serial_threshold (int, optional): Regions with fewer pixels than this run in-process. Defaults to 1024*1024.
+            threads (TilePool, optional): In-process pool for small regions and unshared arrays. Defaults to a new TilePool.
+        """
+        self.threads: TilePool = threads or TilePool()
+        self.tiler: TilePool = TilePool(1, tile_size)
+        self.serial_threshold: int = serial_threshold
+
+        # Fork, so the workers don't re-run the entry script on start
+        self._pool = get_context("fork").Pool(workers or self.threads.workers)
+        self._blocks: dict[int, tuple[SharedMemory, np.ndarray]] = {}
+        # Unlinked blocks that could not be unmapped yet because arrays still view them
+        self._orphans: list[SharedMemory] = []
+
+    # region Shared arrays
+    def allocate(self, shape: tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """Allocate a zeroed array in a new shared memory block
+
+        Args:
+            shape (tuple[int, ...]): Shape of the array
+            dtype (optional): Data type of the array. Defaults to np.uint8.
+
+        Returns:
+            np.ndarray: Array backed by shared memory, valid until released
+        """
+        size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        shm = SharedMemory(create=True, size=size)
+        array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        array[...] = 0
+        self._blocks[id(array)] = (shm, array)
+        return array
+
+    def release(self, array: np.ndarray):
+        """Free the shared memory block of an array allocated by this engine
+
+        Args:
+            array (np.ndarray): Array returned by `allocate`, must not be used afterwards
+        """
+        if not self.is_shared(array):
+            return
+        shm = self._blocks.pop(id(array))[0]
+        shm.unlink()
+        self._close_block(shm)
+
+    def is_shared(self, array: np.ndarray) -> bool:
+        """Check if `array` was allocated by this engine"""
+        entry = self._blocks.get(id(array))
+        return entry is not None and entry[1] is array
+
+    def new_layer(
+        self, width: int, height: int, default_value: RGBA = (255, 255, 255, 0)
+    ) -> Grid:
+        """Create a Grid whose pixels live in shared memory
+
+        Args:
+            width (int): Width of the layer
+            height (int): Height of the layer
+            default_value (RGBA, optional): Value of every cell. Defaults to (255, 255, 255, 0).
+
+        Returns:
+            Grid: The shared layer
+        """
+        pixels = self.allocate((height, width, 4))
+        pixels[...] = default_value
+        return Grid(width, height, pixels=pixels)
+
+    def new_grid(self, width: int, height: int) -> ComputedLayeredGrid:
+        """Create a ComputedLayeredGrid that composites on this engine into shared memory
+
+        Args:
+            width (int): Width of the grid
+            height (int): Height of the grid
+
+        Returns:
+            ComputedLayeredGrid: Grid to add layers from `new_layer` or `adopt` to
+        """
+        grid = ComputedLayeredGrid(width, height, pool=self)
+        self.adopt(grid.get_computed_grid())
+        return grid
+
+    def adopt(self, grid: Grid) -> Grid:
+        """Move the pixels of an existing Grid into shared memory, copying them once
+
+        Args:
+            grid (Grid): Grid to move
+
+        Returns:
+            Grid: The same grid, now backed by shared memory
+        """
+        if not self.is_shared(grid.pixels):
+            pixels = self.allocate(grid.pixels.shape)
+            pixels[...] = grid.pixels
+            grid.pixels = pixels
+        return grid
+
+    # endregion
+
+    # region Jobs
+    def run(self, func: Callable, arrays: list[np.ndarray], rect: Rect, *args):
+        """Run `func(arrays, tile, *args)` for every tile of `rect` in the worker processes
+
+        Args:
+            func (Callable): Module level function, so it can be sent to the workers. Must only write inside its tile
+            arrays (list[np.ndarray]): Arrays allocated by this engine
+            rect (Rect): Region (x, y, width, height) to process
+        """
+        blocks = [self._block_ref(array) for array in arrays]
+        alive = {shm.name for shm, _ in self._blocks.values()}
+        self._pool.starmap(
+            _run_job,
+            [(func, blocks, tile, args, alive) for tile in self.tiler.tiles(rect)],
+        )
+
+    def map_tiles(self, func: Callable[[Rect], None], rect: Rect):
+        """Call `func(tile)` for every tile of `rect` on the in-process pool, see `TilePool.map_tiles`"""
+        self.threads.map_tiles(func, rect)
+
+    def composite(self, layers: list[np.ndarray], out: np.ndarray, rect: Rect = None):
+        """Stack RGBA layers into `out`, see `Compositor.composite`
+
+        Runs in the worker processes if every array is shared and the region is large.
+        """
+        if rect is None:
+            rect = (0, 0, out.shape[1], out.shape[0])
+        if self._use_workers([*layers, out], rect):
+            self.run(_composite_job, [*layers, out], rect)
+        else:
+            self.threads.composite(layers, out, rect)
+
+    def flatten(
+        self,
+        pixels: np.ndarray,
+        out: np.ndarray,
+        background: RGB | np.ndarray,
+        rect: Rect = None,
+    ):
+        """Flatten RGBA pixels onto a background into `out`, see `Compositor.flatten`
+
+        Runs in the worker processes if both arrays are shared, the background is a
+        single colour and the region is large, e.g. when exporting into an array from
+        `allocate`.
+        """
+        if rect is None:
+            rect = (0, 0, pixels.shape[1], pixels.shape[0])
+        if np.ndim(background) == 1 and self._use_workers([pixels, out], rect):
+            self.run(_flatten_job, [pixels, out], rect, tuple(background))
+        else:
+            self.threads.flatten(pixels, out, background, rect)
+
+    # endregion
+
+    def close(self):
+        """Stop the worker processes and free every shared memory block"""
+        self._pool.terminate()
+        self._pool.join()
+        self.threads.shutdown()
+        blocks = [shm for shm, _ in self._blocks.values()]
+        self._blocks.clear()
+        for shm in blocks:
+            shm.unlink()
+            self._close_block(shm)
+        for shm in self._orphans:
+            self._close_block(shm)
+
+    def _close_block(self, shm: SharedMemory):
+        """Internal Method, Unmap a block, or keep it until `close` while arrays still view it"""
+        try:
+            shm.close()
+            if shm in self._orphans:
+                self._orphans.remove(shm)
+        except BufferError:
+            if shm not in self._orphans:
+                self._orphans.append(shm)
+
+    def _use_workers(self, arrays: list[np.ndarray], rect: Rect) -> bool:
+        """Internal Method, Check if a job is worth sending to the worker processes"""
+        return rect[2] * rect[3] >= self.serial_threshold and all(
+            self.is_shared(array) for array in arrays
+        )
+
+    def _block_ref(self, array: np.ndarray) -> BlockRef:
+        """Internal Method, Reference to the shared memory block of `array`"""
+        if not self.is_shared(array):
+            raise ValueError("Array was not allocated by this engine")
+        shm, _ = self._blocks[id(array)]
+        return (shm.name, array.shape, array.dtype.str)
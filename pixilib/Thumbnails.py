@@ -0,0 +1,282 @@
+from multiprocessing import get_context
+from os import path
+import hashlib
+import os
+import threading
+import numpy as np
+from .Compositor import composite_rect
+from .ImageIO import load_png, write_png
+from .PixiFile import open_pixi_reader
+from .PixiProject import PixiProject
+
+# Thumbnails are sampled straight from files instead of loading them into grids:
+# `.pixi` images and the visible layers of `.pixp` projects read only the rows the
+# thumbnail samples, compressed ones only the rows of tiles holding them, and
+# project layers are composited at thumbnail size. Other images are read by pygame.
+# None of the formats store mip levels, so every thumbnail is a nearest neighbour
+# sample, which keeps pixel art crisp.
+THUMBNAIL_SIZE = 128
+
+
+def default_cache_dir() -> str:
+    """Directory thumbnails are cached in when no other is given"""
+    return path.join(path.expanduser("~"), ".cache", "pixi-painter", "thumbnails")
+
+
+def thumbnail_size(width: int, height: int, size: int) -> tuple[int, int]:
+    """Fit an image inside a `size` square, keeping its aspect ratio and never upscaling
+
+    Args:
+        width (int): Width of the image
+        height (int): Height of the image
+        size (int): Most pixels on either side of the thumbnail
+
+    Returns:
+        tuple[int, int]: Width and height of the thumbnail
+    """
+    scale = min(1.0, size / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _sample_axes(width: int, height: int, size: int) -> tuple[np.ndarray, np.ndarray]:
+    """Internal Method, Rows and columns at the center of every thumbnail pixel"""
+    thumb_width, thumb_height = thumbnail_size(width, height, size)
+    rows = (np.arange(thumb_height) * 2 + 1) * height // (thumb_height * 2)
+    columns = (np.arange(thumb_width) * 2 + 1) * width // (thumb_width * 2)
+    return rows, columns
+
+
+def make_thumbnail(file_path: str, size: int = THUMBNAIL_SIZE) -> np.ndarray:
+    """Sample a thumbnail of an image or project file
+
+    Args:
+        file_path (str): Path of a `.pixi`, `.pixp` or pygame readable image
+        size (int, optional): Most pixels on either side of the thumbnail. Defaults to THUMBNAIL_SIZE.
+
+    Returns:
+        np.ndarray: (height, width, 4) uint8 RGBA thumbnail
+    """
+    extension = path.splitext(file_path)[1].lower()
+    if extension == ".pixi":
+        with open(file_path, "rb") as file:
+            # Only sampled rows are read, so there is nothing to verify
+            reader = open_pixi_reader(file, verify=False)
+            header = reader.header
+            return reader.sample(*_sample_axes(header.width, header.height, size))
+
+    if extension == ".pixp":
+        project = PixiProject(file_path)
+        rows, columns = _sample_axes(project.width, project.height, size)
+        layers = []
+        with open(file_path, "rb") as file:
+            for chunk in project.chunks:
+                if chunk.visible:
+                    file.seek(chunk.offset)
+                    reader = open_pixi_reader(file, verify=False)
+                    layers.append(reader.sample(rows, columns))
+        out = np.zeros((len(rows), len(columns), 4), dtype=np.uint8)
+        composite_rect(layers, out, (0, 0, len(columns), len(rows)))
+        return out
+
+    pixels = load_png(file_path).pixels
+    rows, columns = _sample_axes(pixels.shape[1], pixels.shape[0], size)
+    return pixels[rows][:, columns]
+
+
+def thumbnail_key(file_path: str, size: int = THUMBNAIL_SIZE) -> str:
+    """Cache key of a file's thumbnail, from a hash of its path, size and modification time
+
+    The key changes whenever the file is written, without reading the file.
+
+    Args:
+        file_path (str): Path of the file
+        size (int, optional): Size of the thumbnail. Defaults to THUMBNAIL_SIZE.
+
+    Returns:
+        str: Hex key
+    """
+    stat = os.stat(file_path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(path.abspath(file_path).encode("utf-8", "surrogateescape"))
+    digest.update(f"\0{stat.st_size}\0{stat.st_mtime_ns}\0{size}".encode())
+    return digest.hexdigest()
+
+
+def render_thumbnail(job: tuple[str, str, int]) -> tuple[str, str | None]:
+    """Make a thumbnail and write it as a PNG, catching its errors, run by workers
+
+    Args:
+        job (tuple[str, str, int]): Path of the file, path of the PNG to write and thumbnail size
+
+    Returns:
+        tuple[str, str | None]: Path of the file, and the error if it failed
+    """
+    file_path, destination, size = job
+    temp_path = f"{destination}.{os.getpid()}.tmp"
+    try:
+        thumbnail = make_thumbnail(file_path, size)
+        os.makedirs(path.dirname(destination), exist_ok=True)
+        with open(temp_path, "wb") as file:
+            height, width = thumbnail.shape[:2]
+            write_png(file, width, height, [thumbnail])
+        os.replace(temp_path, destination)
+        return file_path, None
+    except Exception as error:
+        return file_path, f"{type(error).__name__}: {error}"
+    finally:
+        if path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class ThumbnailCache:
+    """Thumbnails of files cached on disk as PNGs, missing ones made by worker processes
+
+    `request` returns cached thumbnails at once and queues the rest, so a folder
+    seen before shows every preview immediately. Queued thumbnails are picked up
+    with `poll`, e.g. once per frame. A file's cache entry is keyed by
+    `thumbnail_key`, so editing the file makes a new thumbnail.
+    """
+
+    def __init__(
+        self, root: str = None, size: int = THUMBNAIL_SIZE, processes: int = None
+    ):
+        """Create a ThumbnailCache, its worker processes are started on first use
+
+        Args:
+            root (str, optional): Cache directory. Defaults to `default_cache_dir()`.
+            size (int, optional): Most pixels on either side of thumbnails. Defaults to THUMBNAIL_SIZE.
+            processes (int, optional): Worker processes. Defaults to the CPU count.
+        """
+        self.root: str = root or default_cache_dir()
+        self.size: int = size
+        self.processes: int | None = processes
+        # Errors of thumbnails that failed, by file path
+        self.errors: dict[str, str] = {}
+
+        self._pool = None
+        self._pending: dict[str, str] = {}
+        self._finished: list[tuple[str, str | None]] = []
+        self._lock = threading.Lock()
+
+    def cache_path(self, file_path: str) -> str:
+        """Path the thumbnail of the file's current contents is cached at"""
+        key = thumbnail_key(file_path, self.size)
+        return path.join(self.root, key[:2], f"{key}.png")
+
+    def cached(self, file_path: str) -> str | None:
+        """Path of the file's cached thumbnail, None if it is not cached"""
+        cache_path = self.cache_path(file_path)
+        return cache_path if path.exists(cache_path) else None
+
+    def get(self, file_path: str) -> str:
+        """Path of the file's thumbnail, making it in this process if it is not cached
+
+        Raises:
+            ValueError: The thumbnail could not be made
+        """
+        cache_path = self.cache_path(file_path)
+        if not path.exists(cache_path):
+            _, error = render_thumbnail((file_path, cache_path, self.size))
+            if error is not None:
+                raise ValueError(error)
+        return cache_path
+
+    def request(self, file_paths: list[str]) -> dict[str, str]:
+        """Get the cached thumbnails of files, queueing the others on the workers
+
+        Args:
+            file_paths (list[str]): Paths of the files
+
+        Returns:
+            dict[str, str]: File path -> cached thumbnail path, for those already cached
+        """
+        ready, jobs = {}, []
+        for file_path in file_paths:
+            try:
+                cache_path = self.cache_path(file_path)
+            except OSError as error:
+                self.errors[file_path] = str(error)
+                continue
+            if path.exists(cache_path):
+                ready[file_path] = cache_path
+            elif file_path not in self._pending:
+                self._pending[file_path] = cache_path
+                jobs.append((file_path, cache_path, self.size))
+
+        if jobs:
+            if self._pool is None:
+                self._pool = get_context().Pool(self.processes)
+            for job in jobs:
+                self._pool.apply_async(render_thumbnail, (job,), callback=self._done)
+        return ready
+
+    def _done(self, result: tuple[str, str | None]):
+        """Internal Method, Collect a worker's result, called on the pool's result thread"""
+        with self._lock:
+            self._finished.append(result)
+
+    def poll(self) -> dict[str, str]:
+        """Get the thumbnails made since the last call, failures are added to `errors`
+
+        Returns:
+            dict[str, str]: File path -> cached thumbnail path
+        """
+        with self._lock:
+            finished, self._finished = self._finished, []
+        ready = {}
+        for file_path, error in finished:
+            cache_path = self._pending.pop(file_path)
+            if error is None:
+                ready[file_path] = cache_path
+            else:
+                self.errors[file_path] = error
+        return ready
+
+    @property
+    def pending(self) -> int:
+        """Number of thumbnails queued and not polled yet"""
+        return len(self._pending)
+
+    def wait(self):
+        """Wait for every queued thumbnail, `poll` then returns them all"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def close(self):
+        """Stop the workers, dropping queued thumbnails"""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        self._pending.clear()
+        self._finished.clear()
+
+    def prune(self, max_bytes: int = 64 * 1024 * 1024) -> int:
+        """Delete the oldest cached thumbnails until the cache fits `max_bytes`
+
+        Args:
+            max_bytes (int, optional): Byte budget of the cache. Defaults to 64 MiB.
+
+        Returns:
+            int: Number of thumbnails deleted
+        """
+        if not path.isdir(self.root):
+            return 0
+        entries = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".png"):
+                    stat = os.stat(path.join(directory, name))
+                    entries.append((stat.st_mtime, stat.st_size, directory, name))
+
+        total = sum(entry[1] for entry in entries)
+        removed = 0
+        for _, size, directory, name in sorted(entries):
+            if total <= max_bytes:
+                break
+            os.remove(path.join(directory, name))
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,469 @@
+from os import path
+from weakref import WeakKeyDictionary
+import hashlib
+import json
+import os
+import time
+import zlib
+import numpy as np
+from .Color import Palette
+from .Grid import Grid, ComputedLayeredGrid
+from .IndexedGrid import IndexedGrid
+from .Types import Rect
+
+# Content addressed store of document versions, an optional alternative to `.pixp`
+# files for documents kept in many near identical versions:
+# - `tiles/ab/cdef...`: zlib compressed raw data of one tile, named after the
+#   BLAKE2b hash of its kind, shape and data, so identical tiles of any layer,
+#   document or version are stored once
+# - `versions/<document>/<number>.json`: a version, its size and the hashes of
+#   every layer's tiles in row major order
+TILE_HASH_SIZE = 16
+STORE_VERSION = 1
+
+
+class TileLayer:
+    """Layer of a stored version, its properties and the hashes of its tiles"""
+
+    def __init__(
+        self,
+        name: str,
+        visible: bool,
+        hashes: list[str],
+        palette: list[tuple[int, int, int, int]] | None = None,
+        palette_name: str = "",
+    ):
+        self.name: str = name
+        self.visible: bool = visible
+        self.hashes: list[str] = hashes
+        # Colors of indexed layers, whose tiles hold indices, None for RGBA layers
+        self.palette: list[tuple[int, int, int, int]] | None = palette
+        self.palette_name: str = palette_name
+
+    @property
+    def indexed(self) -> bool:
+        return self.palette is not None
+
+
+class TileVersion:
+    """One saved version of a document, read from or written to its manifest"""
+
+    def __init__(
+        self,
+        document: str,
+        number: int,
+        width: int,
+        height: int,
+        tile_size: int,
+        layers: list[TileLayer],
+        parent: int | None = None,
+        message: str = "",
+        created: float = 0.0,
+    ):
+        self.document: str = document
+        self.number: int = number
+        self.width: int = width
+        self.height: int = height
+        self.tile_size: int = tile_size
+        self.layers: list[TileLayer] = layers
+        self.parent: int | None = parent
+        self.message: str = message
+        self.created: float = created
+
+    @property
+    def columns(self) -> int:
+        return -(-self.width // self.tile_size)
+
+    @property
+    def rows(self) -> int:
+        return -(-self.height // self.tile_size)
+
+    def tile_rect(self, index: int) -> Rect:
+        """Rectangle (x, y, width, height) of the tile at `index` in row major order"""
+        x = index % self.columns * self.tile_size
+        y = index // self.columns * self.tile_size
+        return (
+            x,
+            y,
+            min(self.tile_size, self.width - x),
+            min(self.tile_size, self.height - y),
+        )
+
+    def to_json(self) -> dict:
+        return {
+            "store": STORE_VERSION,
+            "width": self.width,
+            "height": self.height,
+            "tile_size": self.tile_size,
+            "parent": self.parent,
+            "message": self.message,
+            "created": self.created,
+            "layers": [
+                {
+                    "name": layer.name,
+                    "visible": layer.visible,
+                    "palette": layer.palette,
+                    "palette_name": layer.palette_name,
+                    "tiles": layer.hashes,
+                }
+                for layer in self.layers
+            ],
+        }
+
+    @classmethod
+    def from_json(cls, document: str, number: int, data: dict) -> "TileVersion":
+        if data.get("store") != STORE_VERSION:
+            raise ValueError(f"Unsupported tile store version {data.get('store')}")
+        layers = [
+            TileLayer(
+                layer["name"],
+                layer["visible"],
+                layer["tiles"],
+                (
+                    None
+                    if layer["palette"] is None
+                    else [tuple(color) for color in layer["palette"]]
+                ),
+                layer.get("palette_name", ""),
+            )
+            for layer in data["layers"]
+        ]
+        version = cls(
+            document,
+            number,
+            data["width"],
+            data["height"],
+            data["tile_size"],
+            layers,
+            data["parent"],
+            data["message"],
+            data["created"],
+        )
+        if any(len(layer.hashes) != version.columns * version.rows for layer in layers):
+            raise ValueError("Tile count does not match the version's size")
+        return version
+
+
+def _tile_hash(data: np.ndarray, indexed: bool) -> str:
+    """Internal Method, Hash of a tile's kind, shape and C contiguous data"""
+    digest = hashlib.blake2b(digest_size=TILE_HASH_SIZE)
+    digest.update(b"i" if indexed else b"r")
+    digest.update(np.array(data.shape[:2], dtype=">u4").tobytes())
+    digest.update(data.data)
+    return digest.hexdigest()
+
+
+class TileStore:
+    """Local directory of document versions whose layers are stored as deduplicated tiles
+
+    Saving hashes every tile and writes only tiles the store does not hold yet, so a
+    new version costs the tiles that changed since any earlier version of any
+    document. Hashes of layers that were not written since the last save are
+    reused without reading their pixels again. Diffs compare hashes only.
+    """
+
+    def __init__(self, root: str, tile_size: int = 64, level: int = 6):
+        """Open a store, creating its directories if needed
+
+        Args:
+            root (str): Directory of the store
+            tile_size (int, optional): Width and height of the tiles of new versions. Defaults to 64.
+            level (int, optional): zlib level of new tiles, 1 is fastest. Defaults to 6.
+        """
+        if tile_size <= 0:
+            raise ValueError("Tile size must be positive")
+        self.root: str = root
+        self.tile_size: int = tile_size
+        self.level: int = level
+        os.makedirs(path.join(root, "tiles"), exist_ok=True)
+        os.makedirs(path.join(root, "versions"), exist_ok=True)
+
+        # Tiles known to be in the store, and the tiles written by the last save
+        self._stored: set[str] = set()
+        self.tiles_written: int = 0
+
+        # Layer -> (layer version, tile size, tile hashes) at its last save
+        self._layer_hashes: WeakKeyDictionary = WeakKeyDictionary()
+
+    # region Paths
+    def tile_path(self, tile_hash: str) -> str:
+        """Path of the file of a tile"""
+        return path.join(self.root, "tiles", tile_hash[:2], tile_hash[2:])
+
+    def _document_path(self, document: str) -> str:
+        """Internal Method, Directory of a document's versions"""
+        if (
+            not document
+            or document.startswith(".")
+            or any(separator in document for separator in ("/", "\\", os.sep))
+        ):
+            raise ValueError(f"Invalid document name '{document}'")
+        return path.join(self.root, "versions", document)
+
+    def _version_path(self, document: str, number: int) -> str:
+        """Internal Method, Path of the manifest of a version"""
+        return path.join(self._document_path(document), f"{number:06d}.json")
+
+    # endregion
+
+    # region Versions
+    def documents(self) -> list[str]:
+        """Names of the documents with at least one version"""
+        root = path.join(self.root, "versions")
+        return sorted(
+            name for name in os.listdir(root) if name[0] != "." and self.versions(name)
+        )
+
+    def versions(self, document: str) -> list[int]:
+        """Numbers of the versions of a document, oldest first"""
+        directory = self._document_path(document)
+        if not path.isdir(directory):
+            return []
+        return sorted(
+            int(name[:-5])
+            for name in os.listdir(directory)
+            if name.endswith(".json") and name[:-5].isdigit()
+        )
+
+    def read_version(self, document: str, number: int = None) -> TileVersion:
+        """Read the manifest of a version
+
+        Args:
+            document (str): Name of the document
+            number (int, optional): Version number. Defaults to the latest.
+
+        Returns:
+            TileVersion: The version
+        """
+        if number is None:
+            versions = self.versions(document)
+            if not versions:
+                raise ValueError(f"No versions of '{document}'")
+            number = versions[-1]
+        file_path = self._version_path(document, number)
+        if not path.exists(file_path):
+            raise ValueError(f"No version {number} of '{document}'")
+        with open(file_path, "r", encoding="utf-8") as file:
+            return TileVersion.from_json(document, number, json.load(file))
+
+    def save(
+        self, grid: ComputedLayeredGrid, document: str, message: str = ""
+    ) -> TileVersion:
+        """Save the layers of a grid as the next version of a document
+
+        Args:
+            grid (ComputedLayeredGrid): Grid to save
+            document (str): Name of the document
+            message (str, optional): Description of the version. Defaults to "".
+
+        Returns:
+            TileVersion: The new version, `tiles_written` holds how many tiles were new
+        """
+        versions = self.versions(document)
+        number = versions[-1] + 1 if versions else 1
+        self.tiles_written = 0
+
+        layers = []
+        for layer in grid.layers:
+            palette, palette_name = None, ""
+            if isinstance(layer, IndexedGrid):
+                palette = [tuple(color[:4]) for color in layer.palette.colors]
+                palette_name = layer.palette.name
+            layers.append(
+                TileLayer(
+                    layer.name,
+                    layer.visible,
+                    self._store_layer(layer),
+                    palette,
+                    palette_name,
+                )
+            )
+
+        version = TileVersion(
+            document,
+            number,
+            grid.width,
+            grid.height,
+            self.tile_size,
+            layers,
+            versions[-1] if versions else None,
+            message,
+            time.time(),
+        )
+        os.makedirs(self._document_path(document), exist_ok=True)
+        self._write_file(
+            self._version_path(document, number),
+            json.dumps(version.to_json(), separators=(",", ":")).encode("utf-8"),
+        )
+        return version
+
+    def load(self, document: str, number: int = None) -> ComputedLayeredGrid:
+        """Build a grid from a version, reading each distinct tile once
+
+        Args:
+            document (str): Name of the document
+            number (int, optional): Version number. Defaults to the latest.
+
+        Returns:
+            ComputedLayeredGrid: The version's layers, bottom to top
+        """
+        version = self.read_version(document, number)
+        tiles: dict[str, np.ndarray] = {}
+        layers = []
+        for stored in version.layers:
+            if stored.indexed:
+                palette = Palette(stored.palette_name, stored.palette, 0, 0, 160)
+                layer = IndexedGrid(version.width, version.height, palette)
+                target = layer.indices
+            else:
+                layer = Grid(
+                    version.width,
+                    version.height,
+                    pixels=np.empty((version.height, version.width, 4), np.uint8),
+                )
+                target = layer.pixels
+            for index, tile_hash in enumerate(stored.hashes):
+                x, y, width, height = version.tile_rect(index)
+                if tile_hash not in tiles:
+                    tiles[tile_hash] = self.read_tile(
+                        tile_hash, width, height, stored.indexed
+                    )
+                target[y : y + height, x : x + width] = tiles[tile_hash]
+            layer.name, layer.visible = stored.name, stored.visible
+            layers.append(layer)
+
+        grid = ComputedLayeredGrid(version.width, version.height)
+        grid.add_layers(layers)
+        return grid
+
+    def diff(self, document: str, old: int, new: int) -> list[tuple[int, Rect]]:
+        """Find the tiles that differ between two versions by their hashes alone
+
+        Args:
+            document (str): Name of the document
+            old (int): Version number to compare from
+            new (int): Version number to compare to
+
+        Returns:
+            list[tuple[int, Rect]]: Layer index and rectangle of every differing tile, all tiles of layers only one version has
+        """
+        before = self.read_version(document, old)
+        after = self.read_version(document, new)
+        if (before.width, before.height, before.tile_size) != (
+            after.width,
+            after.height,
+            after.tile_size,
+        ):
+            raise ValueError("Versions of different sizes or tile sizes")
+
+        changes = []
+        for index in range(max(len(before.layers), len(after.layers))):
+            old_hashes = (
+                before.layers[index].hashes if index < len(before.layers) else None
+            )
+            new_hashes = (
+                after.layers[index].hashes if index < len(after.layers) else None
+            )
+            if old_hashes is None or new_hashes is None:
+                changed = range(after.columns * after.rows)
+            else:
+                changed = np.nonzero(np.array(old_hashes) != np.array(new_hashes))[0]
+            changes += [(index, after.tile_rect(int(tile))) for tile in changed]
+        return changes
+
+    # endregion
+
+    # region Tiles
+    def read_tile(
+        self, tile_hash: str, width: int, height: int, indexed: bool = False
+    ) -> np.ndarray:
+        """Read and decompress one tile
+
+        Args:
+            tile_hash (str): Hash of the tile
+            width (int): Width of the tile
+            height (int): Height of the tile
+            indexed (bool, optional): Whether the tile holds indices instead of RGBA pixels. Defaults to False.
+
+        Returns:
+            np.ndarray: (height, width, 4) uint8 RGBA pixels, or (height, width) uint8 indices
+        """
+        file_path = self.tile_path(tile_hash)
+        if not path.exists(file_path):
+            raise ValueError(f"Tile {tile_hash} missing from the store")
+        with open(file_path, "rb") as file:
+            data = zlib.decompress(file.read())
+        shape = (height, width) if indexed else (height, width, 4)
+        if len(data) != np.prod(shape):
+            raise ValueError(f"Corrupt tile {tile_hash}, wrong size")
+        return np.frombuffer(data, dtype=np.uint8).reshape(shape)
+
+    def _store_layer(self, layer: Grid) -> list[str]:
+        """Internal Method, Hash every tile of a layer and write the ones not stored yet"""
+        cached = self._layer_hashes.get(layer)
+        if cached is not None and cached[:2] == (layer.version, self.tile_size):
+            return cached[2]
+
+        indexed = isinstance(layer, IndexedGrid)
+        source = layer.indices if indexed else layer.pixels
+        size = self.tile_size
+        hashes = []
+        for y in range(0, layer.height, size):
+            band = source[y : y + size]
+            for x in range(0, layer.width, size):
+                tile = np.ascontiguousarray(band[:, x : x + size])
+                tile_hash = _tile_hash(tile, indexed)
+                self._store_tile(tile_hash, tile)
+                hashes.append(tile_hash)
+
+        self._layer_hashes[layer] = (layer.version, size, hashes)
+        return hashes
+
+    def _store_tile(self, tile_hash: str, tile: np.ndarray):
+        """Internal Method, Write a tile unless the store already holds it"""
+        if tile_hash in self._stored:
+            return
+        file_path = self.tile_path(tile_hash)
+        if not path.exists(file_path):
+            os.makedirs(path.dirname(file_path), exist_ok=True)
+            self._write_file(file_path, zlib.compress(tile.data, self.level))
+            self.tiles_written += 1
+        self._stored.add(tile_hash)
+
+    def _write_file(self, file_path: str, data: bytes):
+        """Internal Method, Write a file under a temporary name and move it into place"""
+        temp_path = f"{file_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, file_path)
+        finally:
+            if path.exists(temp_path):
+                os.remove(temp_path)
+
+    def collect_garbage(self) -> int:
+        """Delete the tiles no version refers to
+
+        Returns:
+            int: Number of tiles deleted
+        """
+        referenced = set()
+        for document in self.documents():
+            for number in self.versions(document):
+                for layer in self.read_version(document, number).layers:
+                    referenced.update(layer.hashes)
+
+        removed = 0
+        tiles = path.join(self.root, "tiles")
+        for prefix in os.listdir(tiles):
+            for name in os.listdir(path.join(tiles, prefix)):
+                if name.endswith(".tmp") or prefix + name in referenced:
+                    continue
+                os.remove(path.join(tiles, prefix, name))
+                self._stored.discard(prefix + name)
+                removed += 1
+        # Cached hashes may name deleted tiles, the next save rewrites them
+        self._layer_hashes.clear()
+        return removed
+
+    # endregion
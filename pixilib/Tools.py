@@ -1,10 +1,11 @@
 from abc import ABC, abstractmethod
-from .Grid import Grid
+import numpy as np
+from .Grid import Grid, ComputedLayeredGrid
+from .FillCache import FillRegionCache
 from .Types import RGBA, BrushTypes
 from .Color import ColorSelector
-from .Helpers import flood_fill, line, chunks, rgba_to_hsva
+from .Helpers import line, rgba_to_hsva
 from collections import deque
-from concurrent.futures import ThreadPoolExecutor
 
 
 class Tool(ABC):
@@ -103,15 +104,10 @@ class PaintTool(Tool):
                             if 0 <= xi < grid.width and 0 <= yj < grid.height:
                                 coords_to_paint.append((xi, yj))
 
-        batch_size = 256 if radius >= 4 else 64
-
-        def paint_batch(batch):
-            for pos in batch:
+        with grid.batch("paintbrush"):
+            for pos in coords_to_paint:
                 grid[*pos] = color
 
-        with ThreadPoolExecutor() as executor:
-            executor.map(paint_batch, chunks(coords_to_paint, batch_size))
-
 
 class EraserTool(Tool):
     """Tool for erasing"""
@@ -160,9 +156,31 @@ class EraserTool(Tool):
 class FillTool(Tool):
     """Tool for filling an area with a color"""
 
+    # Shared between the hover preview and the actual fill
+    cache: FillRegionCache = FillRegionCache()
+
     def __str__():
         return "fill"
 
+    def region(grid: Grid, x: int, y: int, layer: int = 0, tolerance: int = 0):
+        """Get the region a fill from `(x,y)` would cover
+
+        Args:
+            grid (Grid): Grid to fill on
+            x (int): X coordinate to start filling from
+            y (int): Y coordinate to start filling from
+            layer (int, optional): Layer to fill on. Defaults to 0.
+            tolerance (int, optional): Max colour distance from the seed colour. Defaults to 0.
+
+        Returns:
+            np.ndarray | None: (height, width) boolean mask, None if out of bounds
+        """
+        if x < 0 or x >= grid.width or y < 0 or y >= grid.height:
+            return None
+        if isinstance(grid, ComputedLayeredGrid):
+            grid = grid.layers[layer]
+        return FillTool.cache.region(grid, x, y, tolerance)
+
     def run(
         grid: Grid,
         x: int,
@@ -173,9 +191,52 @@ class FillTool(Tool):
         *args,
         **kwargs,
     ):
-        flood_fill(
-            x, y, grid, color, grid[x, y, layer].value, layer=layer, tolerance=tolerance
-        )
+        mask = FillTool.region(grid, x, y, layer, tolerance)
+        if mask is None or grid[x, y, layer].value == color:
+            return
+
+        if not isinstance(grid, ComputedLayeredGrid):
+            grid.fill_mask(mask, color)
+            return
+
+        # Write the region's bounding box back at once, so history, the journal and
+        # compositing each see one rectangle instead of every pixel
+        rows, columns = np.any(mask, axis=1), np.any(mask, axis=0)
+        y0, y1 = np.flatnonzero(rows)[[0, -1]]
+        x0, x1 = np.flatnonzero(columns)[[0, -1]]
+        width, height = int(x1 - x0 + 1), int(y1 - y0 + 1)
+        target = grid.layers[layer]
+        pixels = target.read_rect(int(x0), int(y0), width, height)
+        box = mask[y0 : y1 + 1, x0 : x1 + 1, None]
+        pixels = np.where(box, np.array(color, dtype=np.uint8), pixels)
+        with grid.batch("fill"):
+            grid.write_rect(layer, int(x0), int(y0), pixels)
+
+    def preview(
+        grid: ComputedLayeredGrid,
+        overlay: Grid,
+        x: int,
+        y: int,
+        color: RGBA,
+        layer: int = 0,
+        tolerance: int = 0,
+        *args,
+        **kwargs,
+    ):
+        """Draw the region a fill from `(x,y)` would cover onto the overlay
+
+        Args:
+            grid (ComputedLayeredGrid): Grid that would be filled
+            overlay (Grid): Overlay grid to draw the preview on
+            x (int): X coordinate to start filling from
+            y (int): Y coordinate to start filling from
+            color (RGBA): Color to preview with
+            layer (int, optional): Layer that would be filled. Defaults to 0.
+            tolerance (int, optional): Max colour distance from the seed colour. Defaults to 0.
+        """
+        mask = FillTool.region(grid, x, y, layer, tolerance)
+        if mask is not None:
+            overlay.fill_mask(mask, color)
 
 
 class LineTool(Tool):
@@ -253,7 +314,8 @@ class ClearTool(Tool):
             grid (Grid): The grid to clear.
             color (RGBA): The color to fill the grid with.
         """
-        grid.clear(color)
+        with grid.batch("clear"):
+            grid.clear(color)
 
 
 class PanTool(Tool):
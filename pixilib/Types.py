@@ -6,6 +6,7 @@ type RGB = tuple[int, int, int]
 type HSV = tuple[int, int, int]
 
 type Vec2d = tuple[float, float]
+type Rect = tuple[int, int, int, int]
 # endregion
 
 # region Constants
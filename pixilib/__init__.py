@@ -1,11 +1,28 @@
+from .Autosave import *
+from .Batch import *
 from .Camera import *
 from .Cell import *
 from .Color import *
+from .ColorArrays import *
+from .ColorUsage import *
+from .Compositor import *
 from .DataObject import *
 from .DebugView import *
+from .FillCache import *
 from .Grid import *
 from .Helpers import *
+from .History import *
+from .ImageIO import *
 from .Images import *
+from .IndexedGrid import *
+from .PaletteIO import *
+from .PixiFile import *
+from .PixiProject import *
+from .Quantize import *
+from .Remap import *
+from .SharedEngine import *
+from .Thumbnails import *
+from .TileStore import *
 from .Tools import *
 from .Types import *
 from .UI import *
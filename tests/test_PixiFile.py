@@ -0,0 +1,22 @@
+import io
+import numpy as np
+import pytest
+from pixilib.Grid import Grid
+from pixilib.PixiFile import open_pixi_reader, write_pixi
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_random_access_between_bands(compression):
+    """Reading regions or samples between bands must not move the stream"""
+    pixels = np.random.default_rng(0).integers(0, 256, (300, 70, 4), dtype=np.uint8)
+    file = io.BytesIO()
+    write_pixi(Grid(70, 300, pixels=pixels), file, compression=compression)
+
+    file.seek(0)
+    reader = open_pixi_reader(file)
+    out = np.empty_like(pixels)
+    for y, band in reader.bands(rows=64):
+        out[y : y + len(band)] = band
+        assert (reader.read_rect(5, 290, 10, 10) == pixels[290:300, 5:15]).all()
+        assert (reader.sample([0, 299], [0, 69]) == pixels[[0, 299]][:, [0, 69]]).all()
+    assert (out == pixels).all()